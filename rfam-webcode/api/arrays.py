@@ -0,0 +1,35 @@
+"""
+Storage for release-built NumPy indexes.
+
+An index is a directory of .npy files, one per array, loaded with mmap so
+every worker process shares the same pages.
+"""
+import os
+import shutil
+from types import SimpleNamespace
+
+import numpy as np
+
+
+def save_arrays(path, arrays):
+    """
+    Write a dict of arrays to the directory `path`, replacing it atomically.
+    """
+    tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+    for name, array in arrays.items():
+        np.save(tmp_path / f'{name}.npy', array)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+def load_arrays(path):
+    """
+    Memory-map every array in the directory `path`, as attributes of a namespace.
+    """
+    return SimpleNamespace(**{
+        item.stem: np.load(item, mmap_mode='r')
+        for item in path.glob('*.npy')
+    })
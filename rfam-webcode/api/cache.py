@@ -0,0 +1,240 @@
+"""
+Release-namespaced caching on top of Django's cache framework.
+
+Every key is stored under the cache `version` of the current Rfam release, so
+entries from an older release are never read again once the release changes
+and the backend expires them on its own.
+"""
+import hashlib
+import math
+import random
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.response import Response
+
+from .release import current_release
+
+
+# Query parameters that only choose the output format
+FORMAT_PARAMS = {'output', 'format'}
+
+# Renderer formats whose output depends only on the response data (not, like
+# the browsable API, on the user or CSRF token) and can be cached as bytes
+RENDERED_FORMATS = {'json', 'xml'}
+
+# Longer keys, or keys with characters memcached rejects, are hashed
+MAX_KEY_LENGTH = 200
+
+# Stampede protection: how eagerly entries are refreshed before they expire
+# (the XFetch beta), how long a recompute lock is held at most, how long
+# requests wait for a value being computed by another, and how long the last
+# value of a key is kept to serve while it is being recomputed.
+XFETCH_BETA = 1.0
+RECOMPUTE_LOCK_TIMEOUT = 60
+RECOMPUTE_WAIT = 5
+RECOMPUTE_POLL_INTERVAL = 0.05
+STALE_TIMEOUT = 7 * 86400
+
+_MISSING = object()
+
+
+def get_cache():
+    """Get the cache backend used for release data."""
+    return caches[settings.RFAM_CACHE_ALIAS]
+
+
+def make_key(*parts):
+    """
+    Join key parts with ':', hashing the result if it is long or contains
+    whitespace or control characters.
+    """
+    key = ':'.join(str(part) for part in parts)
+    if len(key) > MAX_KEY_LENGTH or any(ord(c) <= 32 or ord(c) == 127 for c in key):
+        key = f'{parts[0]}:sha1:{hashlib.sha1(key.encode()).hexdigest()}'
+    return key
+
+
+def request_key(prefix, request, ignore=FORMAT_PARAMS):
+    """
+    Build a key from a request's path and its sorted query parameters,
+    leaving out the parameters in `ignore`.
+    """
+    params = sorted(
+        (name, value)
+        for name, values in request.query_params.lists() if name not in ignore
+        for value in values
+    )
+    return make_key(prefix, request.path, urlencode(params))
+
+
+def cache_get(key, default=None):
+    """Get a value cached for the current release."""
+    return get_cache().get(key, default, version=current_release())
+
+
+def cache_set(key, value, timeout=None):
+    """
+    Cache a value for the current release, for `timeout` seconds or the
+    backend's default.
+    """
+    if timeout is None:
+        get_cache().set(key, value, version=current_release())
+    else:
+        get_cache().set(key, value, timeout, version=current_release())
+
+
+def cache_get_or_set(key, builder, timeout=None):
+    """
+    Get a value cached for the current release, calling `builder()` to create
+    and cache it on a miss.
+    """
+    value = cache_get(key, _MISSING)
+    if value is _MISSING:
+        value = builder()
+        cache_set(key, value, timeout)
+    return value
+
+
+def cache_response_data(timeout=None):
+    """
+    Cache the data of successful responses from an APIView handler.
+
+    The key is the view, path and query parameters, without the format
+    parameters. So JSON and XML requests share one entry and only the
+    database queries and serialization are skipped on a hit.
+    """
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(view, request, *args, **kwargs):
+            key = request_key(f'data:{type(view).__name__}', request)
+            data = cache_get(key, _MISSING)
+            if data is not _MISSING:
+                return Response(data)
+
+            response = handler(view, request, *args, **kwargs)
+            if isinstance(response, Response) and response.status_code == 200:
+                cache_set(key, response.data, timeout)
+            return response
+        return wrapper
+    return decorator
+
+
+def _refresh_early(entry):
+    """
+    Decide whether to recompute an entry before it expires (XFetch).
+
+    The chance rises as expiry nears, scaled by how long the value took to
+    compute, so one request usually refreshes it before anyone sees a miss.
+    """
+    _, delta, expires_at = entry
+    return time.time() - delta * XFETCH_BETA * math.log(1.0 - random.random()) >= expires_at
+
+
+def _wait_for(cache, key, release):
+    """
+    Wait up to RECOMPUTE_WAIT seconds for another request to store `key`.
+    """
+    deadline = time.monotonic() + RECOMPUTE_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(RECOMPUTE_POLL_INTERVAL)
+        entry = cache.get(key, version=release)
+        if entry is not None:
+            return entry
+    return None
+
+
+def cache_get_or_recompute(key, builder, timeout=None):
+    """
+    Get a value cached for the current release, protected against stampedes.
+
+    `builder()` returns the value to cache, or None to cache nothing. On a
+    miss or an early refresh only the request that takes the recompute lock
+    calls it; the others keep serving the current value, or else the last
+    value stored for the key under any release. With nothing to serve they
+    wait briefly for the new value, and only compute it themselves if it
+    does not arrive.
+    """
+    cache = get_cache()
+    release = current_release()
+    entry = cache.get(key, version=release)
+    if entry is not None and not _refresh_early(entry):
+        return entry[0]
+
+    lock_key = make_key('lock', key)
+    stale_key = make_key('stale', key)
+    locked = cache.add(lock_key, 1, RECOMPUTE_LOCK_TIMEOUT, version=release)
+    if not locked:
+        if entry is None:
+            entry = cache.get(stale_key)
+        if entry is None:
+            entry = _wait_for(cache, key, release)
+        if entry is not None:
+            return entry[0]
+
+    try:
+        started = time.monotonic()
+        value = builder()
+        if value is not None:
+            if timeout is None:
+                timeout = cache.default_timeout
+            expires_at = math.inf if timeout is None else time.time() + timeout
+            entry = (value, time.monotonic() - started, expires_at)
+            cache.set(key, entry, None if timeout is None else timeout + STALE_TIMEOUT, version=release)
+            cache.set(stale_key, entry, STALE_TIMEOUT)
+    finally:
+        if locked:
+            cache.delete(lock_key, version=release)
+    return value
+
+
+def cache_rendered_response(timeout=None):
+    """
+    Cache the rendered bytes of successful responses from an APIView handler.
+
+    DRF has already chosen the renderer (`RfamContentNegotiation`) before the
+    handler runs, so the key is the view, path, query parameters and the
+    renderer format. A hit is returned as-is, without running any queries,
+    serializers or renderers. Entries are refreshed with
+    `cache_get_or_recompute()`, so an expiry or a new release makes one
+    request re-render while the others serve the previous bytes. The
+    compressed bodies of these responses are cached too (api/compression.py).
+    """
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(view, request, *args, **kwargs):
+            renderer_format = getattr(request.accepted_renderer, 'format', None)
+            if renderer_format not in RENDERED_FORMATS or ';' in (request.accepted_media_type or ''):
+                # Media type parameters such as `; indent=4` change the output
+                return handler(view, request, *args, **kwargs)
+
+            uncached = []
+
+            def render():
+                response = handler(view, request, *args, **kwargs)
+                if isinstance(response, Response) and response.status_code == 200:
+                    response = view.finalize_response(request, response, *args, **kwargs)
+                    response.render()
+                    return response['Content-Type'], response.content
+                uncached.append(response)
+                return None
+
+            key = request_key(f'rendered:{type(view).__name__}:{renderer_format}', request)
+            cached = cache_get_or_recompute(key, render, timeout)
+            if cached is None:
+                return uncached[0]
+            content_type, content = cached
+            response = HttpResponse(content, content_type=content_type)
+            # finalize_response() above takes DRF's pending `Vary: Accept`,
+            # so the response to a miss would go out without it
+            patch_vary_headers(response, ('Accept',))
+            # Let CompressionMiddleware store the compressed body as well
+            response.store_compressed = True
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,296 @@
+"""
+Content coding negotiation and compression of API responses.
+
+`CompressionMiddleware` (api/middleware.py) compresses responses with the
+best coding the client accepts: zstd or br when the `zstandard` or `brotli`
+packages are installed, and gzip always. Compressed bodies are kept so
+that a repeated request is never compressed again:
+
+- rendered responses from the release cache (`cache_rendered_response()`)
+  are stored in the cache once per coding, keyed by a digest of the body;
+- files served from RFAM_CACHE_DIR (GFF, exports) are written compressed
+  next to the original file while the first compressed copy is streamed,
+  and with X-Accel-Redirect the compressed copy is handed to nginx.
+
+Other streaming responses are compressed incrementally as they are sent.
+"""
+import hashlib
+import os
+import re
+import zlib
+from pathlib import Path
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from .cache import cache_get, cache_set, make_key
+from .filecache import accel_redirect_uri, write_through
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Codings in order of preference, for clients that accept several equally
+PREFERRED_CODINGS = ('zstd', 'br', 'gzip')
+
+# Compression levels for bodies compressed while they are streamed, and for
+# the stored copies, which are compressed once per release and worth more time
+STREAM_LEVELS = {'zstd': 3, 'br': 4, 'gzip': 6}
+STORED_LEVELS = {'zstd': 12, 'br': 9, 'gzip': 9}
+
+# Bodies shorter than this are sent as they are
+MIN_SIZE = 200
+
+# Streamed bodies are compressed and flushed to the client in pieces of
+# at least this many bytes
+CHUNK_SIZE = 64 * 1024
+
+# Content types that are already compressed
+COMPRESSED_TYPES = {
+    'application/gzip', 'application/x-gzip', 'application/zip', 'application/zstd',
+    'application/x-brotli', 'application/vnd.apache.parquet',
+}
+
+_coding_re = re.compile(r'^\s*([\w.*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+
+def encoding_qvalues(request):
+    """Get the codings of a request's Accept-Encoding with their q-values."""
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    qvalues = {}
+    for part in header.split(','):
+        match = _coding_re.match(part)
+        if match:
+            try:
+                qvalues[match.group(1).lower()] = float(match.group(2) or 1)
+            except ValueError:
+                pass
+    return qvalues
+
+
+def accepts_encoding(request, coding):
+    """
+    Check whether a request's Accept-Encoding allows `coding`, honouring
+    q-values and `*`.
+    """
+    qvalues = encoding_qvalues(request)
+    q = qvalues.get(coding, qvalues.get('*', 0))
+    return q > 0
+
+
+def available_codings():
+    """Get the codings that can be produced with the installed libraries."""
+    return [
+        coding for coding in PREFERRED_CODINGS
+        if (coding != 'br' or brotli is not None) and (coding != 'zstd' or zstandard is not None)
+    ]
+
+
+def negotiate_coding(request):
+    """
+    Get the available coding the client prefers, or None if it accepts none
+    of them.
+    """
+    qvalues = encoding_qvalues(request)
+    best, best_q = None, 0
+    for coding in available_codings():
+        q = qvalues.get(coding, qvalues.get('*', 0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class _GzipCompressor:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _BrotliCompressor:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class _ZstdCompressor:
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+_COMPRESSORS = {'gzip': _GzipCompressor, 'br': _BrotliCompressor, 'zstd': _ZstdCompressor}
+
+
+def compress(data, coding, level=None):
+    """Compress `data` (bytes) with `coding`."""
+    compressor = _COMPRESSORS[coding](STORED_LEVELS[coding] if level is None else level)
+    return compressor.compress(data) + compressor.finish()
+
+
+def compress_chunks(chunks, coding, level=None):
+    """
+    Compress an iterator of byte chunks with `coding` on the fly.
+
+    Input is gathered into pieces of CHUNK_SIZE bytes, each flushed as soon
+    as it is compressed, so clients receive a slow stream as it is produced.
+    """
+    compressor = _COMPRESSORS[coding](STREAM_LEVELS[coding] if level is None else level)
+    buffered = 0
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        buffered += len(chunk)
+        if buffered >= CHUNK_SIZE:
+            data += compressor.flush()
+            buffered = 0
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def stored_variant(content, coding):
+    """
+    Get `content` compressed with `coding` from the release cache,
+    compressing and storing it on a miss.
+    """
+    key = make_key('compressed', coding, hashlib.sha1(content).hexdigest())
+    compressed = cache_get(key)
+    if compressed is None:
+        compressed = compress(content, coding)
+        cache_set(key, compressed)
+    return compressed
+
+
+def cached_file(response):
+    """
+    Get the path of the RFAM_CACHE_DIR file a FileResponse streams, or None.
+    """
+    name = getattr(getattr(response, 'file_to_stream', None), 'name', None)
+    if not isinstance(name, str):
+        return None
+    path = Path(name).resolve()
+    if not path.is_relative_to(Path(settings.RFAM_CACHE_DIR).resolve()):
+        return None
+    return path
+
+
+def file_variant_path(path, coding):
+    """Get the path of the copy of a cached file compressed with `coding`."""
+    return path.with_name(f'{path.name}.{coding}')
+
+
+def is_compressible(response):
+    """
+    Check whether a response should be compressed: a successful response
+    without a Content-Encoding whose content type is not compressed already.
+    """
+    if response.status_code != 200 or response.has_header('Content-Encoding'):
+        return False
+    content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+    if content_type in COMPRESSED_TYPES:
+        return False
+    major_type = content_type.split('/')[0]
+    return major_type not in ('audio', 'video') and (major_type != 'image' or content_type == 'image/svg+xml')
+
+
+def _compressed_file_response(response, path, coding):
+    """
+    Compress a file handed to nginx (`response` has an X-Accel-Redirect):
+    hand over its compressed copy instead, or stream the file compressed
+    while the copy is written if there is none yet.
+    """
+    variant = file_variant_path(path, coding)
+    if variant.exists():
+        response['X-Accel-Redirect'] = accel_redirect_uri(variant)
+        return response
+
+    f = open(path, 'rb')
+    streaming = StreamingHttpResponse(
+        write_through(variant, compress_chunks(FileWrapper(f, CHUNK_SIZE), coding)),
+        status=response.status_code,
+    )
+    streaming._resource_closers.append(f.close)
+    for name, value in response.items():
+        if name.lower() not in ('x-accel-redirect', 'content-length'):
+            streaming[name] = value
+    return streaming
+
+
+def compress_response(response, coding):
+    """
+    Get `response` with its body replaced by its `coding` compressed form,
+    from a stored copy where there is one, or None if it should be sent as
+    it is.
+    """
+    accel_path = getattr(response, 'accel_path', None)
+    if accel_path is not None:
+        return _compressed_file_response(response, accel_path, coding)
+
+    if not response.streaming:
+        if len(response.content) < MIN_SIZE:
+            return None
+        if getattr(response, 'store_compressed', False):
+            content = stored_variant(response.content, coding)
+        else:
+            content = compress(response.content, coding, STREAM_LEVELS[coding])
+        if len(content) >= len(response.content):
+            return None
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        return response
+
+    path = cached_file(response)
+    if path is not None:
+        variant = file_variant_path(path, coding)
+        try:
+            f = open(variant, 'rb')
+        except FileNotFoundError:
+            response.streaming_content = write_through(
+                variant, compress_chunks(response.streaming_content, coding)
+            )
+        else:
+            response.streaming_content = FileWrapper(f, CHUNK_SIZE)
+            response._resource_closers.append(f.close)
+            response['Content-Length'] = str(os.fstat(f.fileno()).st_size)
+            response.range_file = f
+            return response
+    else:
+        response.streaming_content = compress_chunks(response.streaming_content, coding)
+
+    # Bodies compressed on the fly are always sent whole (api/ranges.py)
+    response.range_file = None
+
+    if response.has_header('Content-Length'):
+        del response['Content-Length']
+    return response
@@ -0,0 +1,136 @@
+"""
+Conditional GET support for release data.
+
+Responses only change with the Rfam release, so the ETag is derived from the
+release, path, query parameters and output format without rendering anything.
+A request whose If-None-Match matches gets a 304 before the view runs.
+"""
+import hashlib
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+from .cache import FORMAT_PARAMS, cache_get_or_set, make_key
+from .release import ReleaseCache, current_release
+
+
+_release_dates = ReleaseCache(maxsize=1)
+
+
+def release_date():
+    """Get the date of the current release, or None."""
+    from .models import DbVersion
+
+    def fetch():
+        return DbVersion.objects.filter(
+            rfam_release=float(current_release())
+        ).values_list('rfam_release_date', flat=True).first()
+
+    return _release_dates.get_or_build('date', fetch)
+
+
+def entry_updated(model, kwarg, *fields):
+    """
+    Build a `last_modified` function for `conditional_get()` that reads
+    `model.updated` for the entry named by the view argument `kwarg`, matched
+    against any of `fields`.
+
+    The value is cached for the release, so only the first request for an
+    entry queries it.
+    """
+    def fetch(value):
+        query = Q()
+        for field in fields:
+            query |= Q(**{field: value})
+        try:
+            return model.objects.filter(query).values_list('updated', flat=True).first()
+        except (TypeError, ValueError):
+            return None
+
+    def last_modified(request, *args, **kwargs):
+        value = str(kwargs.get(kwarg))
+        # Entries are matched case-insensitively, like the database collation
+        key = make_key('updated', model._meta.db_table, value.lower())
+        return cache_get_or_set(key, lambda: fetch(value))
+    return last_modified
+
+
+def release_etag(request):
+    """
+    Get the ETag for a request: a hash of the release, path, query parameters
+    (without the format parameters) and the output format: ?output= if
+    given, since it also selects non-renderer formats such as TSV, and the
+    negotiated renderer's format otherwise.
+
+    The ETag is weak, so it still matches once the body has been compressed.
+    """
+    renderer = getattr(request, 'accepted_renderer', None)
+    params = sorted(
+        (name, value)
+        for name, values in request.GET.lists() if name not in FORMAT_PARAMS
+        for value in values
+    )
+    digest = hashlib.sha1('\n'.join((
+        current_release(),
+        request.path,
+        urlencode(params),
+        request.GET.get('output', '').lower() or getattr(renderer, 'format', '') or '',
+    )).encode()).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+
+def _etag_matches(etag, header):
+    """Weak comparison of an ETag against an If-None-Match header."""
+    etags = parse_etags(header)
+    return '*' in etags or etag.removeprefix('W/') in (tag.removeprefix('W/') for tag in etags)
+
+
+def _not_modified(etag, modified=None):
+    response = HttpResponseNotModified()
+    response['ETag'] = etag
+    if modified is not None:
+        response['Last-Modified'] = http_date(modified.timestamp())
+    patch_cache_control(response, public=True, max_age=settings.RFAM_CACHE_MAX_AGE)
+    return response
+
+
+def conditional_get(last_modified=None):
+    """
+    Add ETag, Last-Modified and Cache-Control headers to successful responses
+    from an APIView handler, and answer matching conditional requests with 304.
+
+    If-None-Match is checked before the handler runs, so no query runs for a
+    match. `last_modified(request, *args, **kwargs)` gives the entry's
+    modification time; the release date is used without it, or when it
+    returns None.
+    """
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(view, request, *args, **kwargs):
+            etag = release_etag(request)
+            if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+            if if_none_match and _etag_matches(etag, if_none_match):
+                return _not_modified(etag)
+
+            modified = last_modified(request, *args, **kwargs) if last_modified else None
+            modified = modified or release_date()
+
+            if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+            if (not if_none_match and modified is not None and if_modified_since is not None
+                    and int(modified.timestamp()) <= if_modified_since):
+                return _not_modified(etag, modified)
+
+            response = handler(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                response['ETag'] = etag
+                if modified is not None:
+                    response['Last-Modified'] = http_date(modified.timestamp())
+                patch_cache_control(response, public=True, max_age=settings.RFAM_CACHE_MAX_AGE)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,67 @@
+"""
+Database helpers for streaming large result sets.
+"""
+from django.db import connections
+
+
+STREAM_CHUNK_SIZE = 2000
+
+
+def _fetch_chunks(cursor, chunk_size):
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield rows
+
+
+def _open_cursor(alias):
+    """
+    Open a cursor that fetches rows from the server as they are read.
+
+    On MySQL, Django's `QuerySet.iterator()` still buffers the whole result
+    set in the client, so an unbuffered pymysql SSCursor is used instead.
+    Other backends use a regular cursor, which SQLite already reads lazily.
+    """
+    connection = connections[alias]
+    if connection.vendor == 'mysql':
+        from pymysql.cursors import SSCursor
+
+        connection.ensure_connection()
+        return connection.connection.cursor(SSCursor)
+    return connection.cursor()
+
+
+def stream_sql(sql, params=None, using='default', chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Iterate over the rows of a raw SQL query through a server-side cursor.
+
+    The cursor holds the connection until the iterator is exhausted or closed,
+    so no other queries may run on it in the meantime.
+    """
+    cursor = _open_cursor(using)
+    try:
+        cursor.execute(sql, params or [])
+        for rows in _fetch_chunks(cursor, chunk_size):
+            yield from rows
+    finally:
+        cursor.close()
+
+
+def stream_rows(queryset, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Iterate over the rows of a `values_list()` queryset through a server-side cursor.
+
+    Rows are returned as tuples with the usual Django field conversions
+    applied. See `stream_sql()` for the connection caveats.
+    """
+    compiler = queryset.query.get_compiler(using=queryset.db)
+    sql, params = compiler.as_sql()
+    cursor = _open_cursor(queryset.db)
+    try:
+        cursor.execute(sql, params)
+        yield from compiler.results_iter(
+            results=_fetch_chunks(cursor, chunk_size), tuple_expected=True
+        )
+    finally:
+        cursor.close()
@@ -0,0 +1,217 @@
+"""
+Bulk table exports for the current Rfam release.
+
+/export/families, /export/clans, /export/genomes and /export/regions/<acc>
+dump every column of the underlying release table, in primary key order, as
+tab-separated text or, when pyarrow is installed, as an Arrow IPC file or a
+Parquet file. Rows are read through a server-side cursor and written in
+batches, so memory use does not grow with the table.
+
+Exports only change with the release, so each one is written once to
+RFAM_CACHE_DIR/<release>/export/ (on first request, or ahead of time with
+`manage.py build_exports`) and served from there afterwards. Only one
+request builds an Arrow or Parquet file (`lock_file()`); others asking for
+it meanwhile wait briefly for the file, and are then told to retry.
+"""
+import datetime
+import os
+import threading
+from itertools import islice
+
+from django.utils import timezone
+
+from .db import stream_rows
+from .filecache import batch_lines, cache_path, write_through
+from .models import Clan, Family, FullRegion, Genome
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+# Export formats as (file extension, content type)
+EXPORT_FORMATS = {
+    'tsv': ('tsv', 'text/tab-separated-values'),
+    'arrow': ('arrow', 'application/vnd.apache.arrow.file'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+# Formats that are written with pyarrow
+COLUMNAR_FORMATS = {'arrow', 'parquet'}
+
+# Whole-table exports as (model, ordering)
+TABLE_EXPORTS = {
+    'families': (Family, ('rfam_acc',)),
+    'clans': (Clan, ('clan_acc',)),
+    'genomes': (Genome, ('upid',)),
+}
+
+# Ordering of the per-family region exports
+REGION_ORDERING = ('rfamseq_acc', 'seq_start', 'seq_end')
+
+# Rows per Arrow record batch (and Parquet row group)
+RECORD_BATCH_SIZE = 50000
+
+# Characters escaped in TSV values, so that every row stays on one line
+_tsv_escapes = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def available_formats():
+    """Get the export formats that can be written with the installed libraries."""
+    return [name for name in EXPORT_FORMATS if pyarrow is not None or name not in COLUMNAR_FORMATS]
+
+
+def export_columns(model):
+    """
+    Get the concrete fields of a model that exist in the release database,
+    leaving out implicit `id` keys added by Django.
+    """
+    return [field for field in model._meta.concrete_fields if not field.auto_created]
+
+
+def export_source(name, rfam_acc=None):
+    """
+    Get (fields, queryset) for an export: `name` is a key of TABLE_EXPORTS,
+    or 'regions' with the family accession in `rfam_acc`.
+    """
+    if name == 'regions':
+        model = FullRegion
+        queryset = FullRegion.objects.filter(rfam_acc=rfam_acc).order_by(*REGION_ORDERING)
+    else:
+        model, ordering = TABLE_EXPORTS[name]
+        queryset = model.objects.order_by(*ordering)
+    fields = export_columns(model)
+    return fields, queryset.values_list(*(field.attname for field in fields))
+
+
+def export_filename(name, output_format, rfam_acc=None):
+    """Get the download filename of an export, e.g. `families.tsv` or `RF00005_regions.parquet`."""
+    extension = EXPORT_FORMATS[output_format][0]
+    if name == 'regions':
+        return f'{rfam_acc}_regions.{extension}'
+    return f'{name}.{extension}'
+
+
+def export_path(name, output_format, rfam_acc=None):
+    """Get the cache file of an export for the current release."""
+    return cache_path('export', export_filename(name, output_format, rfam_acc))
+
+
+def _tsv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value.translate(_tsv_escapes)
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, datetime.datetime):
+        if timezone.is_aware(value):
+            value = timezone.make_naive(value, datetime.timezone.utc)
+        return value.isoformat(' ')
+    return str(value)
+
+
+def tsv_lines(fields, rows):
+    """
+    Yield tab-separated lines for `rows`, after a commented header line of
+    column names. NULL is written as an empty value and backslashes, tabs
+    and line breaks inside values as `\\\\`, `\\t`, `\\n` and `\\r`.
+    """
+    yield '#' + '\t'.join(field.column for field in fields) + '\n'
+    for row in rows:
+        yield '\t'.join(map(_tsv_value, row)) + '\n'
+
+
+def _arrow_type(field):
+    """Get the Arrow type for a field."""
+    if field.is_relation:
+        field = field.target_field
+    internal_type = field.get_internal_type()
+    if 'Integer' in internal_type or 'AutoField' in internal_type:
+        return pyarrow.int64()
+    if internal_type == 'FloatField':
+        return pyarrow.float64()
+    if internal_type == 'BooleanField':
+        return pyarrow.bool_()
+    if internal_type == 'DateTimeField':
+        return pyarrow.timestamp('s', tz='UTC')
+    if internal_type == 'DateField':
+        return pyarrow.date32()
+    return pyarrow.string()
+
+
+def arrow_schema(fields):
+    """Get the Arrow schema for an export of `fields`."""
+    return pyarrow.schema([
+        pyarrow.field(field.column, _arrow_type(field)) for field in fields
+    ])
+
+
+def record_batches(schema, rows, size=RECORD_BATCH_SIZE):
+    """Group `rows` into Arrow record batches of up to `size` rows."""
+    rows = iter(rows)
+    string_columns = [
+        i for i, field in enumerate(schema) if pyarrow.types.is_string(field.type)
+    ]
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        columns = [list(column) for column in zip(*batch)]
+        for i in string_columns:
+            columns[i] = [None if value is None else str(value) for value in columns[i]]
+        yield pyarrow.record_batch(
+            [pyarrow.array(column, type=field.type) for column, field in zip(columns, schema)],
+            schema=schema,
+        )
+
+
+def _write_columnar(path, output_format, schema, batches):
+    """Write record batches to `path` as an Arrow IPC file or Parquet file, atomically."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    try:
+        if output_format == 'arrow':
+            writer = pyarrow.ipc.new_file(str(tmp_path), schema)
+        else:
+            writer = pyarrow.parquet.ParquetWriter(str(tmp_path), schema)
+        with writer:
+            for batch in batches:
+                writer.write_batch(batch)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def stream_tsv_export(name, rfam_acc=None):
+    """
+    Yield the TSV export as byte chunks, storing it in the export cache
+    once it has been read to the end.
+    """
+    fields, queryset = export_source(name, rfam_acc)
+    return write_through(
+        export_path(name, 'tsv', rfam_acc),
+        batch_lines(tsv_lines(fields, stream_rows(queryset))),
+    )
+
+
+def build_export(name, output_format, rfam_acc=None):
+    """
+    Write an export to the export cache, replacing any existing file, and
+    return its path.
+    """
+    path = export_path(name, output_format, rfam_acc)
+    if output_format == 'tsv':
+        for _ in stream_tsv_export(name, rfam_acc):
+            pass
+        return path
+
+    if pyarrow is None:
+        raise RuntimeError(f'{output_format} exports need pyarrow, which is not installed')
+    fields, queryset = export_source(name, rfam_acc)
+    schema = arrow_schema(fields)
+    _write_columnar(path, output_format, schema, record_batches(schema, stream_rows(queryset)))
+    return path
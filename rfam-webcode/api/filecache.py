@@ -0,0 +1,187 @@
+"""
+Release-scoped file cache for generated downloads.
+
+Files live under RFAM_CACHE_DIR/<release>/, so a new release never serves
+files generated from the previous one.
+
+With RFAM_ACCEL_REDIRECT_PREFIX set, cached files are not sent by Django:
+the view only resolves the file and answers with an empty response whose
+X-Accel-Redirect header names it under that prefix, and nginx sends the
+bytes from an `internal` location aliased to RFAM_CACHE_DIR.
+"""
+import os
+import threading
+import time
+import zlib
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.http import content_disposition_header
+
+from .cache import get_cache, make_key
+from .release import current_release
+
+
+# How long a request building a cached file holds its lock at most, how
+# long other requests for the file wait for it, and the Retry-After they
+# get when it is not ready by then
+BUILD_LOCK_TIMEOUT = 600
+BUILD_WAIT = 5
+BUILD_POLL_INTERVAL = 0.1
+BUILD_RETRY_AFTER = 30
+
+
+def cache_path(*parts):
+    """
+    Get the path of a cached file for the current release.
+    """
+    return Path(settings.RFAM_CACHE_DIR, current_release(), *parts)
+
+
+def accel_redirect_uri(path):
+    """
+    Get the X-Accel-Redirect URI of a file in RFAM_CACHE_DIR, or None if
+    RFAM_ACCEL_REDIRECT_PREFIX is not set or the file is outside the cache.
+    """
+    prefix = settings.RFAM_ACCEL_REDIRECT_PREFIX
+    if not prefix:
+        return None
+    try:
+        relative = Path(path).resolve().relative_to(Path(settings.RFAM_CACHE_DIR).resolve())
+    except ValueError:
+        return None
+    return prefix.rstrip('/') + '/' + quote(relative.as_posix())
+
+
+def cached_file_response(path, content_type, filename=None):
+    """
+    Serve a cached file, as an attachment named `filename` if given.
+
+    The file is handed to nginx with X-Accel-Redirect when that is set up
+    (see the module docstring), and streamed with FileResponse otherwise,
+    with support for Range requests.
+    """
+    uri = accel_redirect_uri(path)
+    if uri is None:
+        response = FileResponse(
+            open(path, 'rb'), content_type=content_type,
+            as_attachment=filename is not None, filename=filename or '',
+        )
+        # Range requests are answered from the file (api/ranges.py)
+        response.range_file = response.file_to_stream
+        return response
+
+    response = HttpResponse(content_type=content_type)
+    response['X-Accel-Redirect'] = uri
+    if filename is not None:
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+    response.accel_path = Path(path)
+    return response
+
+
+def write_through(path, chunks):
+    """
+    Yield `chunks` (bytes) while also writing them to `path`.
+
+    The data is written to a temporary file that is renamed into place only
+    once every chunk has been produced, so readers never see a partial file
+    and an aborted download leaves nothing behind.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    complete = False
+    try:
+        with open(tmp_path, 'wb') as fh:
+            for chunk in chunks:
+                fh.write(chunk)
+                yield chunk
+        os.replace(tmp_path, path)
+        complete = True
+    finally:
+        if not complete:
+            tmp_path.unlink(missing_ok=True)
+
+
+def lock_file(path):
+    """
+    Take the build lock of the cached file `path` for the current release,
+    so that only one request generates it.
+
+    Returns a function that releases it, or None if another request holds it.
+    """
+    cache = get_cache()
+    release = current_release()
+    key = make_key('lock', 'file', path)
+    if not cache.add(key, 1, BUILD_LOCK_TIMEOUT, version=release):
+        return None
+    return lambda: cache.delete(key, version=release)
+
+
+def wait_for_file(path, wait=BUILD_WAIT):
+    """Wait up to `wait` seconds for another request to build `path`."""
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(BUILD_POLL_INTERVAL)
+        if path.exists():
+            return True
+    return False
+
+
+class LockedChunks:
+    """
+    Chunks of a file being built, such as `write_through()` output, that
+    release the file's build lock once they are exhausted or closed.
+
+    Django closes streaming content with the response, so the lock is also
+    released when the response is never read.
+    """
+
+    def __init__(self, chunks, unlock):
+        self.chunks = chunks
+        self.unlock = unlock
+        self._unlocked = False
+
+    def __iter__(self):
+        try:
+            yield from self.chunks
+        finally:
+            self.close()
+
+    def close(self):
+        if hasattr(self.chunks, 'close'):
+            self.chunks.close()
+        if not self._unlocked:
+            self._unlocked = True
+            self.unlock()
+
+
+def gzip_chunks(chunks, level=6):
+    """
+    Compress an iterator of byte chunks into a gzip stream on the fly.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def batch_lines(lines, size=64 * 1024):
+    """
+    Join an iterator of text lines into byte chunks of roughly `size` bytes.
+    """
+    buffer = []
+    buffered = 0
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        buffered += len(data)
+        if buffered >= size:
+            yield b''.join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield b''.join(buffer)
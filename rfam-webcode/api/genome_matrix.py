@@ -0,0 +1,156 @@
+"""
+Genome x family presence matrix for comparative queries, built once per release.
+
+The matrix is stored in compressed sparse row (CSR) form, one row per genome
+(`Genome.upid`) listing the families (`Family.rfam_acc`) with hits in it,
+together with its transpose (CSC), one row per family listing its genomes.
+Set operations over thousands of genomes become counting over these arrays:
+an intersection of k rows is the set of columns that occur k times.
+"""
+import numpy as np
+
+from .arrays import load_arrays, save_arrays
+from .release import ReleaseCache, index_path
+
+
+INDEX_DIRNAME = 'genome_matrix'
+
+# Above this many selected rows, rows are picked with a mask over all entries
+# instead of slicing each row.
+SLICE_LIMIT = 64
+
+_matrices = ReleaseCache(maxsize=1)
+
+
+def _compress(row_ids, col_ids, num_rows):
+    """
+    Build CSR arrays from parallel row and column id arrays.
+
+    Returns (indptr, indices, rows), where `rows` holds the row of each entry.
+    """
+    order = np.lexsort((col_ids, row_ids))
+    indptr = np.zeros(num_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(row_ids, minlength=num_rows), out=indptr[1:])
+    return indptr, col_ids[order].astype(np.int32), row_ids[order].astype(np.int32)
+
+
+def _count_columns(indptr, indices, entry_rows, rows, num_columns):
+    """
+    Count how many of the selected CSR `rows` contain each column.
+    """
+    if len(rows) <= SLICE_LIMIT:
+        selected = np.concatenate([indices[indptr[r]:indptr[r + 1]] for r in rows])
+    else:
+        mask = np.zeros(len(indptr) - 1, dtype=bool)
+        mask[rows] = True
+        selected = indices[mask[entry_rows]]
+    return np.bincount(selected, minlength=num_columns)
+
+
+def build_matrix(path, pairs, family_ids):
+    """
+    Write a genome x family matrix to the directory `path`.
+
+    `pairs` is an iterable of (upid, rfam_acc) tuples and `family_ids` maps
+    rfam_acc to rfam_id.
+    """
+    pairs = list(pairs)
+    upids = np.array(sorted({upid for upid, _ in pairs}), dtype='U20')
+    accs = np.array(sorted({acc for _, acc in pairs}), dtype='U7')
+
+    rows = np.searchsorted(upids, np.array([upid for upid, _ in pairs], dtype='U20'))
+    cols = np.searchsorted(accs, np.array([acc for _, acc in pairs], dtype='U7'))
+
+    genome_indptr, genome_families, genome_rows = _compress(rows, cols, len(upids))
+    family_indptr, family_genomes, family_rows = _compress(cols, rows, len(accs))
+
+    save_arrays(path, {
+        'upids': upids,
+        'accs': accs,
+        'family_ids': np.array([family_ids.get(acc, '') for acc in accs.tolist()], dtype='U40'),
+        'genome_indptr': genome_indptr,
+        'genome_families': genome_families,
+        'genome_rows': genome_rows,
+        'family_indptr': family_indptr,
+        'family_genomes': family_genomes,
+        'family_rows': family_rows,
+    })
+    return len(pairs)
+
+
+class GenomeMatrix:
+    """
+    Read-only, memory-mapped genome x family matrix.
+    """
+
+    def __init__(self, path):
+        arrays = load_arrays(path)
+        self.upids = arrays.upids
+        self.accs = arrays.accs
+        self.family_ids = arrays.family_ids
+        self.genome_indptr = arrays.genome_indptr
+        self.genome_families = arrays.genome_families
+        self.genome_rows = arrays.genome_rows
+        self.family_indptr = arrays.family_indptr
+        self.family_genomes = arrays.family_genomes
+        self.family_rows = arrays.family_rows
+
+    @staticmethod
+    def _lookup(keys, values):
+        """
+        Get the indexes of `values` in the sorted array `keys`.
+
+        Returns the index array and the list of values that were not found.
+        """
+        original = np.asarray(values, dtype=str)
+        # Converting to the fixed-width key type cuts longer values short, so
+        # only values that survive it unchanged can match
+        values = original.astype(keys.dtype)
+        found = np.searchsorted(keys, values).clip(max=max(len(keys) - 1, 0))
+        known = (keys[found] == values) if len(keys) else np.zeros(len(values), dtype=bool)
+        known &= values == original
+        return found[known], original[~known].tolist()
+
+    def genomes_with_families(self, accs, require_all=True):
+        """
+        Get the upids of genomes with hits in all (or any) of the families `accs`.
+
+        Returns the sorted list of upids and the list of unknown accessions.
+        """
+        columns, unknown = self._lookup(self.accs, accs)
+        columns = np.unique(columns)
+        if unknown or not len(columns):
+            return [], unknown
+
+        counts = _count_columns(
+            self.family_indptr, self.family_genomes, self.family_rows, columns, len(self.upids)
+        )
+        matches = counts == len(columns) if require_all else counts > 0
+        return self.upids[matches].tolist(), []
+
+    def shared_families(self, upids):
+        """
+        Get the families with hits in every genome in `upids`.
+
+        Returns a list of (rfam_acc, rfam_id) tuples and the list of unknown upids.
+        """
+        rows, unknown = self._lookup(self.upids, upids)
+        rows = np.unique(rows)
+        if unknown or not len(rows):
+            return [], unknown
+
+        counts = _count_columns(
+            self.genome_indptr, self.genome_families, self.genome_rows, rows, len(self.accs)
+        )
+        shared = np.flatnonzero(counts == len(rows))
+        return list(zip(self.accs[shared].tolist(), self.family_ids[shared].tolist())), []
+
+
+def get_genome_matrix():
+    """
+    Get the genome x family matrix for the current release, or None if not built.
+    """
+    path = index_path(INDEX_DIRNAME)
+    if not path.exists():
+        return None
+    return _matrices.get_or_build(path, lambda: GenomeMatrix(path))
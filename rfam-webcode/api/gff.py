@@ -0,0 +1,81 @@
+"""
+GFF3 generation for the Rfam hits on a genome.
+"""
+from urllib.parse import quote
+
+from .db import stream_rows
+from .models import FullRegion, Genseq
+
+
+# Sequence Ontology feature types for the terms in Family.type, most specific first
+FEATURE_TYPES = [
+    ('tRNA', 'tRNA'),
+    ('rRNA', 'rRNA'),
+    ('snoRNA', 'snoRNA'),
+    ('snRNA', 'snRNA'),
+    ('miRNA', 'pre_miRNA'),
+    ('lncRNA', 'lnc_RNA'),
+    ('antisense', 'antisense_RNA'),
+    ('riboswitch', 'riboswitch'),
+    ('ribozyme', 'ribozyme'),
+    ('Intron', 'autocatalytically_spliced_intron'),
+    ('Cis-reg', 'cis_regulatory_element'),
+]
+
+
+def feature_type(family_type):
+    """
+    Map an Rfam family type such as 'Gene; snRNA; snoRNA; CD-box;' to a SO term.
+    """
+    terms = [term.strip() for term in (family_type or '').split(';')]
+    for name, so_term in FEATURE_TYPES:
+        if name in terms:
+            return so_term
+    return 'ncRNA'
+
+
+def _escape(value):
+    """
+    Escape a GFF3 attribute value, including the characters with a meaning
+    in column 9 (`;`, `=`, `&` and `,`, which separates multiple values).
+    """
+    return quote(str(value), safe=' :/()[]^*.|_-+\'"#!$@~`{}<>?')
+
+
+def genome_hits(upid):
+    """
+    Get a queryset of the significant hits on every sequence of a genome.
+    """
+    return FullRegion.objects.filter(
+        rfamseq_acc__in=Genseq.objects.filter(upid=upid).values('rfamseq_acc'),
+        is_significant=1,
+    ).order_by('rfamseq_acc', 'seq_start').values_list(
+        'rfamseq_acc', 'seq_start', 'seq_end', 'bit_score', 'evalue_score', 'truncated',
+        'rfam_acc', 'rfam_acc__rfam_id', 'rfam_acc__description', 'rfam_acc__type',
+    )
+
+
+def iter_gff3(upid):
+    """
+    Generate the GFF3 lines for a genome, one hit at a time.
+
+    Rows come straight off a server-side cursor, so memory use does not
+    depend on the size of the genome.
+    """
+    yield '##gff-version 3\n'
+    for (rfamseq_acc, seq_start, seq_end, bit_score, evalue, truncated,
+         rfam_acc, rfam_id, description, family_type) in stream_rows(genome_hits(upid)):
+        strand = '+' if seq_start <= seq_end else '-'
+        start, end = sorted((seq_start, seq_end))
+        attributes = ';'.join([
+            f'ID={_escape(f"{rfamseq_acc}_{seq_start}_{seq_end}")}',
+            f'Name={_escape(rfam_id)}',
+            f'Alias={rfam_acc}',
+            f'Note={_escape(description or "")}',
+            f'evalue={_escape(evalue)}',
+            f'truncated={_escape(truncated)}',
+        ])
+        yield (
+            f'{rfamseq_acc}\tRfam\t{feature_type(family_type)}\t{start}\t{end}\t'
+            f'{bit_score}\t{strand}\t.\t{attributes}\n'
+        )
@@ -0,0 +1,85 @@
+"""
+Interval index for coordinate overlap queries on sequence hits.
+"""
+from array import array
+from bisect import bisect_right
+
+
+class IntervalIndex:
+    """
+    Static interval tree over closed intervals.
+
+    Intervals are sorted by start and kept in flat arrays. The tree is the
+    implicit balanced binary tree over that order (each node is the midpoint
+    of its range), augmented with the largest end coordinate in its subtree,
+    so no per-node objects are allocated. Overlap queries visit
+    O(log n + k) nodes on hit data, where nesting is shallow, and
+    O(k log n) in the worst case.
+
+    Reverse-strand hits (start > end) are indexed by their lower and upper
+    coordinates; the payload keeps the original orientation.
+    """
+    __slots__ = ('starts', 'ends', 'max_ends', 'payloads')
+
+    def __init__(self, intervals):
+        """
+        Build the index from an iterable of (start, end, payload) tuples.
+        """
+        items = sorted(
+            ((min(start, end), max(start, end), payload) for start, end, payload in intervals),
+            key=lambda item: (item[0], item[1]),
+        )
+        self.starts = array('q', (item[0] for item in items))
+        self.ends = array('q', (item[1] for item in items))
+        self.payloads = [item[2] for item in items]
+        self.max_ends = array('q', self.ends)
+        if items:
+            self._augment(0, len(items))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _augment(self, lo, hi):
+        """Fill in max_ends for the subtree over [lo, hi), returning its maximum."""
+        mid = (lo + hi) // 2
+        highest = self.ends[mid]
+        if lo < mid:
+            highest = max(highest, self._augment(lo, mid))
+        if mid + 1 < hi:
+            highest = max(highest, self._augment(mid + 1, hi))
+        self.max_ends[mid] = highest
+        return highest
+
+    def overlapping(self, start, end):
+        """
+        Get the payloads of all intervals overlapping [start, end], ordered by start.
+        """
+        if start > end:
+            start, end = end, start
+
+        starts, ends, max_ends = self.starts, self.ends, self.max_ends
+        # Nothing at or after `limit` starts before `end`, so it cannot overlap.
+        limit = bisect_right(starts, end)
+        found = []
+        stack = [(0, len(starts))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi or lo >= limit:
+                continue
+            mid = (lo + hi) // 2
+            if max_ends[mid] < start:
+                continue
+            stack.append((lo, mid))
+            if mid < limit:
+                if ends[mid] >= start:
+                    found.append(mid)
+                stack.append((mid + 1, hi))
+
+        found.sort()
+        return [self.payloads[i] for i in found]
+
+    def overlapping_many(self, windows):
+        """
+        Answer a batch of (start, end) overlap queries against the same index.
+        """
+        return [self.overlapping(start, end) for start, end in windows]
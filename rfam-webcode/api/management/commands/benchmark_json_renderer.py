@@ -0,0 +1,67 @@
+"""
+Benchmark the JSON renderers on the full motif and clan list payloads.
+"""
+import json
+
+from django.test import RequestFactory, override_settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from api import renderers
+from api.renderers import RfamJSONRenderer
+from api.views import ClansListView, MotifsListView
+
+from .benchmark_xml_renderer import measure
+
+
+def handler_data(view_class):
+    """
+    Get the data of a GET / to an API view, calling its handler without its
+    response cache but with the DRF request (query params, negotiated
+    renderer) the view would build.
+    """
+    view = view_class()
+    wsgi_request = RequestFactory().get('/')
+    view.setup(wsgi_request)
+    request = view.initialize_request(wsgi_request)
+    view.format_kwarg = view.get_format_suffix()
+    request.accepted_renderer, request.accepted_media_type = view.perform_content_negotiation(request)
+    view.request = request
+    return view.get.__wrapped__(view, request).data
+
+
+class Command(BaseCommand):
+    help = 'Compare time and peak memory of DRF JSONRenderer and RfamJSONRenderer backends'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Number of timed runs, the best of which is reported (default: 20)',
+        )
+
+    def handle(self, *args, **options):
+        payloads = [
+            (name, handler_data(view_class))
+            for name, view_class in (('motifs', MotifsListView), ('clans', ClansListView))
+        ]
+
+        backends = [('drf', JSONRenderer(), 'stdlib'), ('stdlib', RfamJSONRenderer(), 'stdlib')]
+        if renderers.orjson is not None:
+            backends.append(('orjson', RfamJSONRenderer(), 'auto'))
+        else:
+            self.stdout.write('orjson is not installed; skipping it')
+
+        self.stdout.write(f'{"payload":<10} {"renderer":<10} {"time (ms)":>10} {"peak (KiB)":>11} {"output (KiB)":>13}')
+        for name, data in payloads:
+            expected = None
+            for label, renderer, backend in backends:
+                with override_settings(RFAM_JSON_BACKEND=backend):
+                    seconds, peak, output = measure(lambda: renderer.render(data), options['repeat'])
+                if expected is None:
+                    expected = output
+                elif (output != expected if label != 'orjson'
+                      else json.loads(output) != json.loads(expected)):
+                    raise CommandError(f'{label} output for {name} differs from DRF')
+                self.stdout.write(
+                    f'{name:<10} {label:<10} {seconds * 1000:>10.2f} {peak / 1024:>11.0f} {len(output) / 1024:>13.0f}'
+                )
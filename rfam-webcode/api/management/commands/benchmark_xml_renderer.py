@@ -0,0 +1,263 @@
+"""
+Benchmark the XML renderer against the ElementTree/minidom pretty-printing it replaced.
+"""
+import time
+import tracemalloc
+from types import SimpleNamespace
+from xml.dom import minidom
+from xml.etree.ElementTree import Element, SubElement, tostring
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import BaseRenderer
+
+from api.renderers import RfamXMLRenderer
+
+
+class MinidomXMLRenderer(BaseRenderer):
+    """
+    The XML renderer as it was before the incremental rewrite, kept verbatim:
+    builds an ElementTree, then pretty-prints it with minidom.
+    """
+    media_type = 'text/xml'
+    format = 'xml'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """
+        Render `data` into XML.
+        """
+        if data is None:
+            return ''
+
+        view = renderer_context.get('view') if renderer_context else None
+        entity_type = getattr(view, 'entity_type', 'entry')
+
+        # Create root element
+        root = Element('rfam')
+        root.set('xmlns:xsi', 'http://www.w3.org/2001/XMLSchema-instance')
+        root.set('xmlns', 'https://rfam.org/')
+        root.set('xsi:schemaLocation', 'https://rfam.org/ https://rfam.org/static/documents/schemas/entry.xsd')
+        root.set('release', str(data.get('release', {}).get('number', '')))
+        root.set('release_date', str(data.get('release', {}).get('date', '')))
+
+        if entity_type == 'family':
+            self._render_family(root, data)
+        elif entity_type == 'clan':
+            self._render_clan(root, data)
+        elif entity_type == 'motif':
+            self._render_motif(root, data)
+        else:
+            self._render_generic(root, data)
+
+        # Generate XML string
+        xml_string = tostring(root, encoding='unicode')
+        # Pretty print
+        try:
+            dom = minidom.parseString(xml_string)
+            return '<?xml version="1.0" encoding="UTF-8"?>\n' + dom.toprettyxml(indent="  ")[23:]  # Skip XML declaration from minidom
+        except Exception:
+            return '<?xml version="1.0" encoding="UTF-8"?>\n' + xml_string
+
+    def _render_family(self, root, data):
+        """Render family data to XML."""
+        rfam_data = data.get('rfam', data)
+
+        entry = SubElement(root, 'entry')
+        entry.set('entry_type', 'Rfam')
+        entry.set('accession', str(rfam_data.get('acc', '')))
+        entry.set('id', str(rfam_data.get('id', '')))
+
+        # Description
+        desc = SubElement(entry, 'description')
+        desc.text = rfam_data.get('description', '')
+
+        # Comment
+        comment = SubElement(entry, 'comment')
+        comment.text = rfam_data.get('comment', '')
+
+        # Curation details
+        curation = rfam_data.get('curation', {})
+        curation_elem = SubElement(entry, 'curation_details')
+
+        author = SubElement(curation_elem, 'author')
+        author.text = str(curation.get('author', ''))
+
+        seed_source = SubElement(curation_elem, 'seed_source')
+        seed_source.text = str(curation.get('seed_source', ''))
+
+        num_seqs = SubElement(curation_elem, 'num_seqs')
+        seed = SubElement(num_seqs, 'seed')
+        seed.text = str(curation.get('num_seed', 0))
+        full = SubElement(num_seqs, 'full')
+        full.text = str(curation.get('num_full', 0))
+
+        num_species = SubElement(curation_elem, 'num_species')
+        num_species.text = str(curation.get('num_species', 0))
+
+        type_elem = SubElement(curation_elem, 'type')
+        type_elem.text = str(curation.get('type', ''))
+
+        structure_source = SubElement(curation_elem, 'structure_source')
+        structure_source.text = str(curation.get('structure_source', ''))
+
+        # CM details
+        cm = rfam_data.get('cm', {})
+        cm_elem = SubElement(entry, 'cm_details')
+
+        build_cmd = SubElement(cm_elem, 'build_command')
+        build_cmd.text = str(cm.get('build_command', ''))
+
+        calibrate_cmd = SubElement(cm_elem, 'calibrate_command')
+        calibrate_cmd.text = str(cm.get('calibrate_command', ''))
+
+        search_cmd = SubElement(cm_elem, 'search_command')
+        search_cmd.text = str(cm.get('search_command', ''))
+
+        # Cutoffs
+        cutoffs = cm.get('cutoffs', {})
+        cutoffs_elem = SubElement(cm_elem, 'cutoffs')
+
+        gathering = SubElement(cutoffs_elem, 'gathering')
+        gathering.text = str(cutoffs.get('gathering', 0))
+
+        trusted = SubElement(cutoffs_elem, 'trusted')
+        trusted.text = str(cutoffs.get('trusted', 0))
+
+        noise = SubElement(cutoffs_elem, 'noise')
+        noise.text = str(cutoffs.get('noise', 0))
+
+    def _render_clan(self, root, data):
+        """Render clan data to XML."""
+        entry = SubElement(root, 'entry')
+        entry.set('entry_type', 'Clan')
+        entry.set('accession', str(data.get('acc', '')))
+        entry.set('id', str(data.get('id', '')))
+
+        desc = SubElement(entry, 'description')
+        desc.text = data.get('description', '')
+
+        members = SubElement(entry, 'members')
+        for member in data.get('members', []):
+            member_elem = SubElement(members, 'member')
+            member_elem.set('accession', member.get('acc', ''))
+            member_elem.set('id', member.get('id', ''))
+
+    def _render_motif(self, root, data):
+        """Render motif data to XML."""
+        entry = SubElement(root, 'entry')
+        entry.set('entry_type', 'Motif')
+        entry.set('accession', str(data.get('acc', '')))
+        entry.set('id', str(data.get('id', '')))
+
+        desc = SubElement(entry, 'description')
+        desc.text = data.get('description', '')
+
+    def _render_generic(self, root, data):
+        """Render generic data to XML."""
+        self._dict_to_xml(root, data)
+
+    def _dict_to_xml(self, parent, data):
+        """Convert a dictionary to XML elements."""
+        if isinstance(data, dict):
+            for key, value in data.items():
+                child = SubElement(parent, str(key))
+                self._dict_to_xml(child, value)
+        elif isinstance(data, list):
+            for item in data:
+                child = SubElement(parent, 'item')
+                self._dict_to_xml(child, item)
+        else:
+            parent.text = str(data) if data is not None else ''
+
+
+def sample_payloads(size):
+    """Get (name, data, entity_type) for generated list, family and clan payloads."""
+    families = [
+        {
+            'acc': f'RF{i:05d}',
+            'id': f'family_{i}',
+            'description': f'Family {i} <small> & "nucleolar" RNA',
+            'type': 'Gene; snRNA; snoRNA; CD-box;',
+            'num_seed': i % 97,
+            'num_full': i * 13,
+        }
+        for i in range(size)
+    ]
+    family = {
+        'rfam': {
+            'acc': 'RF00001',
+            'id': '5S_rRNA',
+            'description': '5S ribosomal RNA',
+            'comment': 'Long comment. ' * 200,
+            'curation': {'author': 'Griffiths-Jones SR', 'num_seed': 712, 'num_full': 139932, 'type': 'Gene; rRNA;'},
+            'cm': {'build_command': 'cmbuild -F CM SEED', 'cutoffs': {'gathering': 38.0, 'trusted': 38.0, 'noise': 37.9}},
+        },
+    }
+    clan = {
+        'acc': 'CL00001',
+        'id': 'tRNA',
+        'description': 'tRNA clan',
+        'members': [{'acc': f'RF{i:05d}', 'id': f'member_{i}'} for i in range(size)],
+    }
+    return [
+        ('families list', {'families': families}, 'entry'),
+        ('family', family, 'family'),
+        ('clan members', clan, 'clan'),
+    ]
+
+
+def measure(render, repeat):
+    """Get (best time in seconds, peak traced memory in bytes, output)."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = render()
+        best = min(best, time.perf_counter() - started)
+
+    tracemalloc.start()
+    output = render()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, output
+
+
+class Command(BaseCommand):
+    help = 'Compare time and peak memory of the XML renderer with minidom pretty-printing'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', type=int, default=5000,
+            help='Number of families in the list payload and of clan members (default: 5000)',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Number of timed runs, the best of which is reported (default: 5)',
+        )
+
+    def handle(self, *args, **options):
+        renderer = RfamXMLRenderer()
+        baseline = MinidomXMLRenderer()
+        self.stdout.write(
+            f'{"payload":<16} {"renderer":<10} {"time (ms)":>10} {"peak (KiB)":>11} {"output (KiB)":>13}'
+        )
+        for name, data, entity_type in sample_payloads(options['size']):
+            context = {'view': SimpleNamespace(entity_type=entity_type)}
+            results = {
+                'minidom': measure(lambda: baseline.render(data, renderer_context=context), options['repeat']),
+                'render': measure(lambda: renderer.render(data, renderer_context=context), options['repeat']),
+                'stream': measure(
+                    lambda: sum(len(chunk) for chunk in renderer.iter_render(data, context)),
+                    options['repeat'],
+                ),
+            }
+            expected = results['minidom'][2]
+            if results['render'][2] != expected:
+                raise CommandError(f'Rendered XML for {name} differs from minidom output')
+            if results['stream'][2] != len(expected):
+                raise CommandError(f'Streamed XML for {name} differs from minidom output')
+
+            for label, (seconds, peak, _) in results.items():
+                self.stdout.write(
+                    f'{name:<16} {label:<10} {seconds * 1000:>10.1f} {peak / 1024:>11.0f} '
+                    f'{len(expected) / 1024:>13.0f}'
+                )
@@ -0,0 +1,43 @@
+"""
+Pre-build the bulk table exports for the current Rfam release.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from api.export import EXPORT_FORMATS, TABLE_EXPORTS, available_formats, build_export
+from api.models import Family
+from api.release import current_release
+
+
+class Command(BaseCommand):
+    help = 'Write the /export downloads for the current release to the file cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format', dest='formats', action='append', choices=sorted(EXPORT_FORMATS),
+            help='Format to build; may be repeated (default: every format the installed libraries support)',
+        )
+        parser.add_argument(
+            '--regions', action='store_true',
+            help='Also build the per-family region exports',
+        )
+
+    def handle(self, *args, **options):
+        formats = options['formats'] or available_formats()
+        missing = set(formats) - set(available_formats())
+        if missing:
+            raise CommandError(f"Cannot build {', '.join(sorted(missing))} exports without pyarrow")
+
+        exports = [(name, None) for name in TABLE_EXPORTS]
+        if options['regions']:
+            exports += [
+                ('regions', rfam_acc)
+                for rfam_acc in Family.objects.order_by('rfam_acc').values_list('rfam_acc', flat=True)
+            ]
+
+        self.stdout.write(f'Building {len(exports)} exports for release {current_release()}...')
+        for name, rfam_acc in exports:
+            for output_format in formats:
+                path = build_export(name, output_format, rfam_acc)
+                if rfam_acc is None:
+                    self.stdout.write(f'  {path}')
+        self.stdout.write(self.style.SUCCESS(f'Built {len(exports) * len(formats)} export files'))
@@ -0,0 +1,31 @@
+"""
+Build the genome x family matrix for the current Rfam release.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from api.genome_matrix import INDEX_DIRNAME, build_matrix
+from api.release import current_release, index_path
+from api.summaries import SUMMARY_FILENAME, iter_summary
+
+
+class Command(BaseCommand):
+    help = 'Build the sparse genome x family matrix from the genome family summary'
+
+    def handle(self, *args, **options):
+        release = current_release()
+        summary_path = index_path(SUMMARY_FILENAME, release)
+        if not summary_path.exists():
+            raise CommandError(
+                f'No genome summary for release {release}; run build_genome_summary first'
+            )
+
+        self.stdout.write(f'Building genome x family matrix for release {release}...')
+        family_ids = {}
+        pairs = []
+        for upid, rfam_acc, rfam_id, _ in iter_summary(summary_path):
+            family_ids[rfam_acc] = rfam_id
+            pairs.append((upid, rfam_acc))
+
+        path = index_path(INDEX_DIRNAME, release)
+        count = build_matrix(path, pairs, family_ids)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {count} genome/family entries to {path}'))
@@ -0,0 +1,31 @@
+"""
+Build the per-genome family summary store for the current Rfam release.
+"""
+from django.core.management.base import BaseCommand
+
+from api.db import stream_sql
+from api.release import current_release, index_path
+from api.summaries import SUMMARY_FILENAME, write_summary
+
+
+GENOME_FAMILY_COUNTS = """
+    SELECT g.upid, fr.rfam_acc, f.rfam_id, COUNT(*)
+    FROM full_region fr
+    JOIN genseq g ON g.rfamseq_acc = fr.rfamseq_acc
+    JOIN family f ON f.rfam_acc = fr.rfam_acc
+    WHERE fr.is_significant = 1
+    GROUP BY g.upid, fr.rfam_acc, f.rfam_id
+    ORDER BY g.upid, fr.rfam_acc
+"""
+
+
+class Command(BaseCommand):
+    help = 'Materialise per-genome family hit counts into a local SQLite store'
+
+    def handle(self, *args, **options):
+        release = current_release()
+        path = index_path(SUMMARY_FILENAME, release)
+
+        self.stdout.write(f'Building genome family summary for release {release}...')
+        count = write_summary(path, stream_sql(GENOME_FAMILY_COUNTS))
+        self.stdout.write(self.style.SUCCESS(f'Wrote {count} genome/family rows to {path}'))
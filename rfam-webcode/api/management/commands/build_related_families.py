@@ -0,0 +1,30 @@
+"""
+Build the MinHash LSH index of related families for the current Rfam release.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from api.genome_matrix import get_genome_matrix
+from api.related import INDEX_DIRNAME, build_related
+from api.release import current_release, index_path
+
+
+class Command(BaseCommand):
+    help = 'Build MinHash signatures of family genome sets and their LSH buckets'
+
+    def handle(self, *args, **options):
+        release = current_release()
+        matrix = get_genome_matrix()
+        if matrix is None:
+            raise CommandError(
+                f'No genome matrix for release {release}; run build_genome_matrix first'
+            )
+
+        self.stdout.write(f'Building related families index for release {release}...')
+        member_sets = [
+            matrix.family_genomes[matrix.family_indptr[i]:matrix.family_indptr[i + 1]]
+            for i in range(len(matrix.accs))
+        ]
+
+        path = index_path(INDEX_DIRNAME, release)
+        count = build_related(path, matrix.accs.tolist(), matrix.family_ids.tolist(), member_sets)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} families in {path}'))
@@ -0,0 +1,37 @@
+"""
+Build the packed release index file for the current Rfam release.
+"""
+from django.core.management.base import BaseCommand
+
+from api.db import stream_rows
+from api.models import Clan, Family, Motif, Taxonomy
+from api.release import current_release, index_path
+from api.release_index import (
+    INDEX_FILENAME, entry_sections, family_sections, taxonomy_sections, write_index,
+)
+
+
+class Command(BaseCommand):
+    help = 'Write accession maps, family summaries and search tables to a memory-mappable file'
+
+    def handle(self, *args, **options):
+        release = current_release()
+        path = index_path(INDEX_FILENAME, release)
+        self.stdout.write(f'Building release index for release {release}...')
+
+        families = list(Family.objects.values_list(
+            'rfam_acc', 'rfam_id', 'description', 'type', 'num_seed', 'num_full'
+        ))
+        sections = family_sections(families)
+        sections.update(entry_sections('clan', Clan.objects.values_list('clan_acc', 'id')))
+        sections.update(entry_sections('motif', Motif.objects.values_list('motif_acc', 'motif_id')))
+
+        taxonomy = list(stream_rows(
+            Taxonomy.objects.order_by().values_list('ncbi_id', 'species', 'tax_string')
+        ))
+        sections.update(taxonomy_sections(taxonomy))
+
+        write_index(path, sections)
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {len(families)} families and {len(taxonomy)} taxa in {path}'
+        ))
@@ -0,0 +1,46 @@
+"""
+Build the species to families taxonomy index for the current Rfam release.
+"""
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from api.db import stream_sql
+from api.models import Family, Taxonomy
+from api.release import current_release, index_path
+from api.taxonomy_index import INDEX_DIRNAME, build_index, lineage
+
+
+FAMILY_SPECIES = """
+    SELECT DISTINCT fr.rfam_acc, rs.ncbi_id
+    FROM full_region fr
+    JOIN rfamseq rs ON rs.rfamseq_acc = fr.rfamseq_acc
+    WHERE fr.is_significant = 1
+"""
+
+
+class Command(BaseCommand):
+    help = 'Build the taxonomy subtree index of families with hits in each taxon'
+
+    def handle(self, *args, **options):
+        release = current_release()
+        path = index_path(INDEX_DIRNAME, release)
+
+        self.stdout.write(f'Building taxonomy index for release {release}...')
+        family_species = defaultdict(set)
+        for rfam_acc, ncbi_id in stream_sql(FAMILY_SPECIES):
+            family_species[rfam_acc].add(ncbi_id)
+
+        species = set().union(*family_species.values())
+        species_lineages = {
+            ncbi_id: lineage(tax_string, name)
+            for ncbi_id, name, tax_string in Taxonomy.objects.filter(
+                ncbi_id__in=species
+            ).values_list('ncbi_id', 'species', 'tax_string').iterator()
+        }
+        family_ids = dict(Family.objects.values_list('rfam_acc', 'rfam_id'))
+
+        count = build_index(path, species_lineages, family_species, family_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {count} family/species pairs over {len(species_lineages)} species in {path}'
+        ))
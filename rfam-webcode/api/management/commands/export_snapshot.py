@@ -0,0 +1,40 @@
+"""
+Export the current Rfam release into a read-only SQLite snapshot.
+"""
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from api.release import fetch_release, index_path
+from api.snapshot import SNAPSHOT_FILENAME, export_snapshot, snapshot_models
+
+
+class Command(BaseCommand):
+    help = 'Copy the release tables into an indexed SQLite file for RFAM_SNAPSHOT_PATH'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default='default',
+            help='Database to export from (default: "default")',
+        )
+        parser.add_argument(
+            '--output', type=Path,
+            help='Snapshot file to write (default: <RFAM_INDEX_DIR>/<release>/rfam.sqlite3)',
+        )
+        parser.add_argument(
+            '--all-tables', action='store_true',
+            help='Also export the large per-sequence and alignment tables',
+        )
+
+    def handle(self, *args, **options):
+        # The release of the database being exported, which need not be the default one
+        release = fetch_release(options['database'])
+        path = options['output'] or index_path(SNAPSHOT_FILENAME, release)
+        models = snapshot_models(include_large=options['all_tables'])
+
+        self.stdout.write(f'Exporting release {release} to {path}...')
+        export_snapshot(
+            path, models, using=options['database'],
+            progress=lambda table, count: self.stdout.write(f'  {table}: {count} rows'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Exported {len(models)} tables to {path}'))
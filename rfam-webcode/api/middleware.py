@@ -0,0 +1,124 @@
+"""
+Middleware for the Rfam API.
+"""
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from .compression import compress_response, is_compressible, negotiate_coding
+from .ranges import range_response
+from .release import acquire_generation, pin_generation, unpin_generation
+
+
+class ReleaseGenerationMiddleware:
+    """
+    Pin each request to the release generation current when it starts.
+
+    The generation counts the request until its response is closed, so a
+    replaced generation is only retired once its requests (including
+    streamed responses) have finished.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.RFAM_RELEASE_WATCHER:
+            from .watcher import start_watcher
+
+            start_watcher()
+
+        generation = acquire_generation()
+        if generation is None:
+            return self.get_response(request)
+
+        token = pin_generation(generation)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            generation.release_request()
+            raise
+        finally:
+            unpin_generation(token)
+
+        if response.streaming:
+            response.streaming_content = _ReleasingContent(response.streaming_content, generation)
+        else:
+            generation.release_request()
+        return response
+
+
+class _ReleasingContent:
+    """
+    Streamed content that releases its generation once it is exhausted or
+    closed, whichever comes first.
+
+    Django closes streaming content that has a `close()` along with the
+    response, which covers responses whose content is never read.
+    """
+
+    def __init__(self, content, generation):
+        self.content = content
+        self.generation = generation
+        self._released = False
+
+    def __iter__(self):
+        try:
+            yield from self.content
+        finally:
+            self.close()
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self.generation.release_request()
+
+
+class CompressionMiddleware:
+    """
+    Compress responses with the zstd, br or gzip coding the client prefers.
+
+    See api/compression.py for which compressed bodies are stored and
+    reused. Static files are left to WhiteNoise, which sits above this
+    middleware and serves its own precompressed copies.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not is_compressible(response):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = negotiate_coding(request)
+        compressed = compress_response(response, coding) if coding is not None else None
+        if compressed is None:
+            return response
+
+        compressed['Content-Encoding'] = coding
+        # The compressed body is not byte-for-byte the one a strong ETag names
+        etag = compressed.get('ETag')
+        if etag and etag.startswith('"'):
+            compressed['ETag'] = 'W/' + etag
+        return compressed
+
+
+class RangeMiddleware:
+    """
+    Answer Range requests for file-backed responses with 206 Partial
+    Content (see api/ranges.py).
+
+    Must sit above CompressionMiddleware, so that ranges are taken from the
+    bytes the full response would send.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.status_code != 200 or getattr(response, 'range_file', None) is None:
+            return response
+
+        return range_response(request, response) or response
@@ -193,6 +193,39 @@ class Genome(models.Model):
         return f"{self.upid} - {self.scientific_name}"
 
 
+class Rfamseq(models.Model):
+    """Sequence information for sequences in the Rfam sequence database."""
+    rfamseq_acc = models.CharField(max_length=25, primary_key=True)
+    accession = models.CharField(max_length=25)
+    version = models.IntegerField()
+    ncbi_id = models.PositiveIntegerField()
+    mol_type = models.CharField(max_length=15)
+    length = models.PositiveIntegerField(null=True, blank=True)
+    description = models.TextField()
+    previous_acc = models.TextField(null=True, blank=True)
+    source = models.CharField(max_length=20)
+
+    class Meta:
+        managed = False
+        db_table = 'rfamseq'
+
+    def __str__(self):
+        return self.rfamseq_acc
+
+
+class Genseq(models.Model):
+    """Genome to sequence mapping."""
+    upid = models.CharField(max_length=20)
+    rfamseq_acc = models.CharField(max_length=25, primary_key=True)
+    chromosome_name = models.CharField(max_length=100, null=True, blank=True)
+    chromosome_type = models.CharField(max_length=100, null=True, blank=True)
+    version = models.CharField(max_length=6, null=True, blank=True)
+
+    class Meta:
+        managed = False
+        db_table = 'genseq'
+
+
 class FullRegion(models.Model):
     """Full region hit information for families."""
     rfam_acc = models.ForeignKey(
@@ -29,5 +29,11 @@ class RfamContentNegotiation(DefaultContentNegotiation):
                 if renderer.format == 'json':
                     return (renderer, renderer.media_type)
 
+        if output_format == 'ndjson':
+            # Find NDJSON renderer
+            for renderer in renderers:
+                if renderer.format == 'ndjson':
+                    return (renderer, renderer.media_type)
+
         # Fall back to default content negotiation (Accept header)
         return super().select_renderer(request, renderers, format_suffix)
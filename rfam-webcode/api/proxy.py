@@ -0,0 +1,274 @@
+"""
+File cache for responses proxied from the production Rfam site.
+
+Successful upstream responses are kept under RFAM_CACHE_DIR/<release>/proxy/.
+Each URL has a metadata file, `<entry>.json`, with the status, headers,
+validators (ETag, Last-Modified) and the name of its body file,
+`<entry>.<version>`. A changed body is written under a new version and only
+then swapped in by replacing the metadata file, so readers always see a
+body with its own headers. The body it replaces is kept until the next
+change, for readers (and nginx) still sending it. Bodies are plain files so
+that they can be handed to nginx (see `cached_file_response()`). An entry
+is fresh for RFAM_PROXY_TTL seconds after it was last checked (the metadata
+file's mtime).
+After that the next request revalidates it with If-None-Match/
+If-Modified-Since, and an upstream 304 reuses the stored body, so only
+changed artifacts are downloaded again.
+
+Bodies are fetched and stored exactly as upstream sent them, gzip-encoded
+where upstream compresses, and are streamed to clients that accept the
+encoding without being decoded or recompressed. Only clients that do not
+accept it get them decoded.
+"""
+import hashlib
+import json
+import os
+import secrets
+import time
+import zlib
+from urllib.parse import urlencode
+from wsgiref.util import FileWrapper
+
+import requests
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from requests.structures import CaseInsensitiveDict
+
+from .compression import accepts_encoding
+from .filecache import accel_redirect_uri, cache_path, write_through
+
+
+# Upstream headers stored with each entry and replayed to the views
+STORED_HEADERS = ('Content-Type', 'Content-Encoding', 'ETag', 'Last-Modified')
+
+# Encodings requested from upstream; every client we proxy for accepts gzip,
+# so one stored copy serves nearly all of them as-is
+UPSTREAM_ACCEPT_ENCODING = 'gzip'
+
+# zlib window bits for decoding each content coding
+DECODE_WBITS = {'gzip': 31, 'x-gzip': 31, 'deflate': 15}
+
+CHUNK_SIZE = 64 * 1024
+
+class UpstreamResponse:
+    """
+    A proxied response, from upstream or the cache.
+
+    `chunks` iterates over the body as upstream encoded it and can only be
+    consumed once.
+    """
+
+    __slots__ = ('status_code', 'headers', 'chunks', 'length', 'path')
+
+    def __init__(self, status_code, headers, chunks=(), length=None, path=None):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.chunks = chunks
+        self.length = length
+        # The cached body file, for responses served from the cache
+        self.path = path
+
+    @property
+    def encoding(self):
+        """The upstream Content-Encoding, or None."""
+        encoding = self.headers.get('Content-Encoding', '').strip().lower()
+        return encoding if encoding and encoding != 'identity' else None
+
+    def close(self):
+        if hasattr(self.chunks, 'close'):
+            self.chunks.close()
+
+
+def proxy_cache_path(url, params=None):
+    """
+    Get the cache path of the entry for a URL and its query parameters, to
+    which the metadata and body file names are relative.
+    """
+    query = urlencode(sorted((params or {}).items()))
+    digest = hashlib.sha1(f'{url}?{query}'.encode()).hexdigest()
+    return cache_path('proxy', digest[:2], digest)
+
+
+def _meta_path(path):
+    return path.with_name(f'{path.name}.json')
+
+
+def _body_path(path, meta):
+    return path.with_name(meta['body'])
+
+
+def _open_entry(path):
+    """
+    Open the entry at `path`.
+
+    Returns (metadata, body file), or None.
+    """
+    # A body can be removed between reading the metadata and opening it, when
+    # two changes land in between; the metadata read again names a newer one
+    for _ in range(2):
+        try:
+            with open(_meta_path(path), 'rb') as f:
+                meta = json.load(f)
+            return meta, open(_body_path(path, meta), 'rb')
+        except (OSError, ValueError, KeyError):
+            continue
+    return None
+
+
+def _write_meta(path, meta):
+    """Store the metadata of the entry at `path`, replacing it atomically."""
+    for _ in write_through(_meta_path(path), [json.dumps(meta).encode()]):
+        pass
+
+
+def _is_fresh(path):
+    try:
+        return time.time() - _meta_path(path).stat().st_mtime < settings.RFAM_PROXY_TTL
+    except OSError:
+        return False
+
+
+def _cached_response(path, meta, f):
+    length = os.fstat(f.fileno()).st_size
+    return UpstreamResponse(
+        meta['status'], meta['headers'], FileWrapper(f, CHUNK_SIZE), length, _body_path(path, meta),
+    )
+
+
+def _stream_upstream(resp, path, meta, previous=None):
+    """
+    Yield the raw body of a streamed upstream response while storing it.
+
+    The body goes to a new file, and the metadata naming it is written once
+    the whole body has been stored, so an aborted download or a failed
+    metadata write leaves any previous entry as it was. `previous` is the
+    metadata being replaced: its body is kept, and the one before it removed.
+    """
+    meta['body'] = f'{path.name}.{secrets.token_hex(8)}'
+    if previous is not None:
+        meta['previous'] = previous['body']
+    try:
+        yield from write_through(
+            _body_path(path, meta), resp.raw.stream(CHUNK_SIZE, decode_content=False),
+        )
+        _write_meta(path, meta)
+    finally:
+        resp.close()
+    if previous is not None and previous.get('previous'):
+        path.with_name(previous['previous']).unlink(missing_ok=True)
+
+
+def fetch_upstream(url, params=None, timeout=30):
+    """
+    Get `url` from upstream, through the proxy cache.
+
+    Fresh entries are served without contacting upstream; stale ones are
+    revalidated. Only 200 responses are cached. If upstream cannot be
+    reached, a stale entry is served; without one the `requests` exception
+    is raised, as for `requests.get()`.
+    """
+    path = proxy_cache_path(url, params)
+    entry = _open_entry(path)
+    if entry is not None and _is_fresh(path):
+        return _cached_response(path, *entry)
+
+    headers = {'Accept-Encoding': UPSTREAM_ACCEPT_ENCODING}
+    if entry is not None:
+        meta = entry[0]
+        if meta['headers'].get('ETag'):
+            headers['If-None-Match'] = meta['headers']['ETag']
+        if meta['headers'].get('Last-Modified'):
+            headers['If-Modified-Since'] = meta['headers']['Last-Modified']
+
+    try:
+        resp = requests.get(url, params=params, headers=headers, timeout=timeout, stream=True)
+    except requests.RequestException:
+        if entry is None:
+            raise
+        return _cached_response(path, *entry)
+
+    if resp.status_code == 304 and entry is not None:
+        resp.close()
+        meta, f = entry
+        updated = {
+            name: resp.headers[name]
+            for name in ('ETag', 'Last-Modified') if name in resp.headers
+        }
+        if any(meta['headers'].get(name) != value for name, value in updated.items()):
+            meta['headers'].update(updated)
+            _write_meta(path, meta)
+        else:
+            try:
+                os.utime(_meta_path(path))
+            except OSError:
+                pass
+        return _cached_response(path, meta, f)
+
+    previous = None
+    if entry is not None:
+        previous, f = entry
+        f.close()
+
+    stored = {name: resp.headers[name] for name in STORED_HEADERS if name in resp.headers}
+    if resp.status_code != 200:
+        resp.close()
+        return UpstreamResponse(resp.status_code, stored)
+
+    length = resp.headers.get('Content-Length')
+    meta = {'url': resp.url, 'status': 200, 'headers': stored}
+    return UpstreamResponse(
+        200, stored, _stream_upstream(resp, path, meta, previous),
+        int(length) if length and length.isdigit() else None,
+    )
+
+
+def _decoded(chunks, encoding):
+    """Decode an iterator of `gzip` or `deflate` encoded byte chunks."""
+    decoder = zlib.decompressobj(DECODE_WBITS[encoding])
+    try:
+        for chunk in chunks:
+            data = decoder.decompress(chunk)
+            if data:
+                yield data
+        data = decoder.flush()
+        if data:
+            yield data
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def proxy_response(request, upstream, content_type=None):
+    """
+    Stream an upstream response to the client.
+
+    Encoded bodies are passed through untouched, with their
+    Content-Encoding, if the client accepts the encoding, and decoded
+    otherwise. Bodies passed through from the cache are handed to nginx
+    when X-Accel-Redirect is set up (see api/filecache.py).
+    """
+    content_type = content_type or upstream.headers.get('Content-Type', 'text/plain')
+    encoding = upstream.encoding
+    passthrough = encoding is None or accepts_encoding(request, encoding) or encoding not in DECODE_WBITS
+    uri = accel_redirect_uri(upstream.path) if passthrough and upstream.path is not None else None
+    if uri is not None:
+        upstream.close()
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = uri
+        if encoding is not None:
+            response['Content-Encoding'] = encoding
+    elif passthrough:
+        response = StreamingHttpResponse(upstream.chunks, content_type=content_type)
+        if encoding is not None:
+            response['Content-Encoding'] = encoding
+        if upstream.length is not None:
+            response['Content-Length'] = upstream.length
+        if upstream.path is not None:
+            # Range requests are answered from the cached body (api/ranges.py)
+            response.range_file = upstream.chunks.filelike
+    else:
+        response = StreamingHttpResponse(_decoded(upstream.chunks, encoding), content_type=content_type)
+    if encoding is not None:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    return response
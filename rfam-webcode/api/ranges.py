@@ -0,0 +1,127 @@
+"""
+Byte range requests for file-backed downloads.
+
+Responses that send a whole file set `response.range_file` to it:
+`cached_file_response()` (GFF, exports), proxied bodies served from the
+cache (alignments, regions, ...) and stored compressed copies of either.
+`RangeMiddleware` (api/middleware.py) advertises `Accept-Ranges: bytes` on
+them and answers `Range` requests with 206 Partial Content, seeking to the
+requested slice of the file instead of reading what comes before it.
+Their Last-Modified is the file's own mtime, so that an If-Range date tells
+apart a file rebuilt for a new release or fetched again from upstream.
+
+`RangeMiddleware` sits above `CompressionMiddleware`, so a range always
+refers to the bytes the full response would have sent: the file itself, or
+its stored compressed copy. Responses compressed on the fly have no
+`range_file` and are always sent whole.
+
+Files handed to nginx with X-Accel-Redirect get their ranges from nginx.
+"""
+import os
+import re
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+
+
+CHUNK_SIZE = 64 * 1024
+
+_range_re = re.compile(r'^\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$', re.IGNORECASE)
+
+
+def parse_range(header, size):
+    """
+    Get the (first, last) byte positions of a single-range `Range` header
+    for a body of `size` bytes.
+
+    Returns None for a header that is invalid or asks for several ranges,
+    which is answered with the whole body, and () if the range lies
+    outside the body (416).
+    """
+    match = _range_re.match(header)
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        length = int(last)
+        if length == 0:
+            return ()
+        return max(size - length, 0), size - 1
+    first = int(first)
+    if last and int(last) < first:
+        return None
+    if first >= size:
+        return ()
+    last = int(last) if last else size - 1
+    return first, min(last, size - 1)
+
+
+def if_range_matches(request, response, mtime):
+    """
+    Check the request's If-Range, if any, against the response's ETag or
+    the file's `mtime`. ETags are compared strongly, so a weak ETag never
+    matches.
+    """
+    if_range = request.META.get('HTTP_IF_RANGE', '').strip()
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        etag = response.get('ETag', '')
+        return not if_range.startswith('W/') and not etag.startswith('W/') and if_range == etag
+    return parse_http_date_safe(if_range) == int(mtime)
+
+
+def _file_slice(f, first, last):
+    f.seek(first)
+    remaining = last - first + 1
+    while remaining > 0:
+        data = f.read(min(CHUNK_SIZE, remaining))
+        if not data:
+            return
+        remaining -= len(data)
+        yield data
+
+
+def range_response(request, response):
+    """
+    Add Accept-Ranges and Last-Modified to a 200 response with a
+    `range_file`, and get the 206 or 416 response for a Range request on
+    it, or None if the whole response should be sent.
+    """
+    f = response.range_file
+    stat = os.fstat(f.fileno())
+    size = stat.st_size
+    response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = http_date(stat.st_mtime)
+
+    header = request.META.get('HTTP_RANGE')
+    if not header or request.method not in ('GET', 'HEAD'):
+        return None
+    if not if_range_matches(request, response, stat.st_mtime):
+        return None
+
+    byte_range = parse_range(header, size)
+    if byte_range is None:
+        return None
+
+    if not byte_range:
+        partial = HttpResponse(status=416)
+        partial['Content-Range'] = f'bytes */{size}'
+    else:
+        first, last = byte_range
+        partial = StreamingHttpResponse(_file_slice(f, first, last), status=206)
+        partial['Content-Range'] = f'bytes {first}-{last}/{size}'
+        partial['Content-Length'] = str(last - first + 1)
+
+    # The partial response takes over the file and its closers
+    partial._resource_closers.extend(response._resource_closers)
+    response._resource_closers.clear()
+    skipped = {'content-length', 'content-range'}
+    if partial.status_code == 416:
+        skipped |= {'content-type', 'content-encoding', 'content-disposition'}
+    for name, value in response.items():
+        if name.lower() not in skipped:
+            partial[name] = value
+    return partial
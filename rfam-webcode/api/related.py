@@ -0,0 +1,142 @@
+"""
+Related families by co-occurrence across genomes, built once per release.
+
+Each family gets a MinHash signature over the set of genomes it has hits in.
+The fraction of equal signature slots estimates the Jaccard similarity of
+two families' genome sets. Signatures are split into bands for locality
+sensitive hashing (LSH): families sharing any band bucket become candidates,
+so a query only looks at a handful of families instead of comparing all of
+them pairwise.
+"""
+import numpy as np
+
+from .arrays import load_arrays, save_arrays
+from .release import ReleaseCache, index_path
+
+
+INDEX_DIRNAME = 'related_families'
+
+NUM_HASHES = 128
+BAND_SIZE = 4
+MERSENNE_PRIME = (1 << 31) - 1
+
+_indexes = ReleaseCache(maxsize=1)
+
+
+def minhash_signatures(member_sets, num_hashes=NUM_HASHES, seed=1):
+    """
+    Compute a MinHash signature for each set of non-negative integer members.
+
+    Uses the universal hashes (a * x + b) mod p with p = 2^31 - 1, which stay
+    within uint64 arithmetic.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, MERSENNE_PRIME, size=num_hashes, dtype=np.uint64)[:, None]
+    b = rng.integers(0, MERSENNE_PRIME, size=num_hashes, dtype=np.uint64)[:, None]
+
+    signatures = np.full((len(member_sets), num_hashes), MERSENNE_PRIME, dtype=np.uint32)
+    for i, members in enumerate(member_sets):
+        members = np.asarray(members, dtype=np.uint64)
+        if len(members):
+            signatures[i] = ((a * members[None, :] + b) % MERSENNE_PRIME).min(axis=1)
+    return signatures
+
+
+def band_keys(signatures, band_size=BAND_SIZE):
+    """
+    Hash each band of `band_size` signature slots into one uint64 bucket key.
+
+    Returns an array of shape (num_bands, num_signatures).
+    """
+    num_bands = signatures.shape[1] // band_size
+    bands = signatures[:, :num_bands * band_size].reshape(len(signatures), num_bands, band_size)
+    keys = np.zeros((len(signatures), num_bands), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for slot in range(band_size):
+            keys = keys * np.uint64(0x100000001B3) ^ bands[:, :, slot].astype(np.uint64)
+    return keys.T.copy()
+
+
+def build_related(path, accs, family_ids, member_sets):
+    """
+    Write the MinHash signatures and LSH band buckets to the directory `path`.
+    """
+    signatures = minhash_signatures(member_sets)
+    keys = band_keys(signatures)
+    order = np.argsort(keys, axis=1, kind='stable')
+
+    save_arrays(path, {
+        'accs': np.array(accs, dtype='U7'),
+        'family_ids': np.array(family_ids, dtype='U40'),
+        'signatures': signatures,
+        'band_keys': keys,
+        'bucket_keys': np.take_along_axis(keys, order, axis=1),
+        'bucket_families': order.astype(np.int32),
+    })
+    return len(accs)
+
+
+class RelatedFamilies:
+    """
+    Read-only, memory-mapped MinHash LSH index.
+    """
+
+    def __init__(self, path):
+        arrays = load_arrays(path)
+        self.accs = arrays.accs
+        self.family_ids = arrays.family_ids
+        self.signatures = arrays.signatures
+        self.band_keys = arrays.band_keys
+        self.bucket_keys = arrays.bucket_keys
+        self.bucket_families = arrays.bucket_families
+
+    def find(self, rfam_acc):
+        """
+        Get the index of a family by accession, or None. Resolve ids and
+        differently cased accessions with `get_resolver()` first.
+        """
+        i = int(np.searchsorted(self.accs, rfam_acc))
+        if i < len(self.accs) and self.accs[i] == rfam_acc:
+            return i
+        return None
+
+    def related(self, family, min_similarity=0.0, limit=20):
+        """
+        Get the families sharing an LSH bucket with `family`, most similar first.
+
+        Returns a list of (rfam_acc, rfam_id, estimated Jaccard similarity).
+        """
+        candidates = set()
+        for band, key in enumerate(self.band_keys[:, family].tolist()):
+            keys = self.bucket_keys[band]
+            lo = np.searchsorted(keys, key, side='left')
+            hi = np.searchsorted(keys, key, side='right')
+            candidates.update(self.bucket_families[band, lo:hi].tolist())
+        candidates.discard(family)
+        if not candidates:
+            return []
+
+        candidates = np.fromiter(candidates, dtype=np.int64)
+        similarity = (self.signatures[candidates] == self.signatures[family]).mean(axis=1)
+        keep = similarity >= min_similarity
+        candidates, similarity = candidates[keep], similarity[keep]
+        best = np.argsort(-similarity, kind='stable')[:limit]
+
+        return [
+            (acc, rfam_id, round(score, 3))
+            for acc, rfam_id, score in zip(
+                self.accs[candidates[best]].tolist(),
+                self.family_ids[candidates[best]].tolist(),
+                similarity[best].tolist(),
+            )
+        ]
+
+
+def get_related_families():
+    """
+    Get the related families index for the current release, or None if not built.
+    """
+    path = index_path(INDEX_DIRNAME)
+    if not path.exists():
+        return None
+    return _indexes.get_or_build(path, lambda: RelatedFamilies(path))
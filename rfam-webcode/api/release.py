@@ -0,0 +1,243 @@
+"""
+Release tracking for per-release caches and indexes.
+
+Every Rfam release is immutable, so anything derived from the database can be
+cached until the release number in `db_version` changes.
+
+In web processes the release is held by a `Generation`. The release watcher
+(`api.watcher`) loads a new generation in the background when `db_version`
+changes and swaps it in atomically. Each request is pinned to the generation
+that was current when it started (`ReleaseGenerationMiddleware`), so it sees
+one release throughout. A replaced generation is retired once its last
+request finishes, dropping its cache entries.
+"""
+import contextvars
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+
+
+_release_lock = threading.Lock()
+_release = None
+_release_checked_at = 0.0
+
+_generation_lock = threading.Lock()
+_generation = None
+_retiring = []
+_pinned = contextvars.ContextVar('rfam_generation', default=None)
+
+_caches = weakref.WeakSet()
+
+
+def fetch_release(using=None):
+    """
+    Read the current Rfam release number, e.g. '15.00', from the database
+    (or the database alias `using`).
+    """
+    from .models import DbVersion
+
+    number = DbVersion.objects.using(using).order_by('-rfam_release').values_list(
+        'rfam_release', flat=True
+    ).first()
+    return f"{number:.2f}" if number is not None else '0.00'
+
+
+def current_release():
+    """
+    Get the current Rfam release number, e.g. '15.00'.
+
+    This is the release of the request's generation, or of the current
+    generation. Without a release watcher (e.g. in management commands) the
+    database is asked at most once every RFAM_RELEASE_CHECK_INTERVAL seconds
+    per process.
+    """
+    global _release, _release_checked_at
+
+    generation = _pinned.get() or _generation
+    if generation is not None:
+        return generation.release
+
+    now = time.monotonic()
+    if _release is not None and now - _release_checked_at < settings.RFAM_RELEASE_CHECK_INTERVAL:
+        return _release
+
+    with _release_lock:
+        if _release is None or now - _release_checked_at >= settings.RFAM_RELEASE_CHECK_INTERVAL:
+            _release = fetch_release()
+            _release_checked_at = now
+    return _release
+
+
+def index_path(name, release=None):
+    """
+    Get the path of a release-built index file, by default for the current release.
+    """
+    return Path(settings.RFAM_INDEX_DIR, release or current_release(), name)
+
+
+class Generation:
+    """
+    The data of one release, counted by the requests using it.
+    """
+
+    def __init__(self, release):
+        self.release = release
+        self.activated_at = None
+        self.retired_at = None
+        self._requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def requests(self):
+        return self._requests
+
+    def acquire(self):
+        with self._lock:
+            self._requests += 1
+
+    def release_request(self):
+        with self._lock:
+            self._requests -= 1
+            drained = self.retired_at is not None and self._requests == 0
+        if drained:
+            _drop_generation(self)
+
+    def retire(self):
+        with self._lock:
+            self.retired_at = datetime.now(timezone.utc)
+            drained = self._requests == 0
+        if drained:
+            _drop_generation(self)
+
+    def as_dict(self):
+        return {
+            'release': self.release,
+            'activated_at': self.activated_at.isoformat() if self.activated_at else None,
+            'retired_at': self.retired_at.isoformat() if self.retired_at else None,
+            'requests': self._requests,
+        }
+
+
+def current_generation():
+    """Get the current generation, or None without a release watcher."""
+    return _generation
+
+
+def acquire_generation():
+    """
+    Count a new request against the current generation and return it.
+
+    Returns None without a release watcher. Pass the generation to
+    `Generation.release_request()` when the request is done.
+    """
+    with _generation_lock:
+        generation = _generation
+        if generation is not None:
+            generation.acquire()
+    return generation
+
+
+def pin_generation(generation):
+    """
+    Make `generation` the current one for this thread or task.
+
+    Returns a token for `unpin_generation()`.
+    """
+    return _pinned.set(generation)
+
+
+def unpin_generation(token):
+    _pinned.reset(token)
+
+
+def activate_generation(generation):
+    """
+    Make `generation` current and retire the one it replaces.
+    """
+    global _generation
+
+    with _generation_lock:
+        previous = _generation
+        generation.activated_at = datetime.now(timezone.utc)
+        _generation = generation
+        if previous is not None and previous.release != generation.release:
+            _retiring.append(previous)
+    if previous is not None and previous.release != generation.release:
+        previous.retire()
+
+
+def _drop_generation(generation):
+    """Drop a drained generation and the cache entries for its release."""
+    with _generation_lock:
+        if generation in _retiring:
+            _retiring.remove(generation)
+        in_use = {g.release for g in _retiring}
+        if _generation is not None:
+            in_use.add(_generation.release)
+    if generation.release not in in_use:
+        for cache in list(_caches):
+            cache.drop(generation.release)
+
+
+def release_status():
+    """
+    Describe the current generation and the generations still draining.
+    """
+    with _generation_lock:
+        current = _generation
+        retiring = list(_retiring)
+    return {
+        'current': current.as_dict() if current else None,
+        'retiring': [generation.as_dict() for generation in retiring],
+    }
+
+
+class ReleaseCache:
+    """
+    Bounded LRU cache with separate entries for each release.
+
+    Entries for a release are dropped when its generation is retired, or,
+    without a release watcher, when the release changes.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = {}
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    def get_or_build(self, key, builder):
+        """
+        Get the value cached for `key`, calling `builder()` to create it on a miss.
+        """
+        release = current_release()
+        with self._lock:
+            if release not in self._data and _generation is None:
+                self._data.clear()
+            entries = self._data.setdefault(release, OrderedDict())
+            if key in entries:
+                entries.move_to_end(key)
+                return entries[key]
+
+        value = builder()
+
+        with self._lock:
+            entries = self._data.get(release)
+            if entries is not None:
+                entries[key] = value
+                if len(entries) > self.maxsize:
+                    entries.popitem(last=False)
+        return value
+
+    def drop(self, release):
+        with self._lock:
+            self._data.pop(release, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,369 @@
+"""
+Packed binary index of a release, written once by `manage.py build_release_index`.
+
+The index is a single file of named, 64-byte aligned array sections:
+
+    header    b'RFAMIDX1', then the offset and length of the table of contents
+    sections  raw array data
+    contents  JSON mapping each section name to [offset, dtype, shape]
+
+Readers mmap the file and view sections as NumPy arrays without copying, so
+every worker on a host (and every pod mounting the same index directory)
+shares one copy through the page cache, and opening it costs nothing.
+
+Strings are kept in packed tables (UTF-8 bytes plus an offsets array) and
+exact-match lookups go through sorted fixed-width key arrays holding row
+numbers, searched with `np.searchsorted`.
+"""
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from .release import ReleaseCache, index_path
+
+
+INDEX_FILENAME = 'release.idx'
+
+MAGIC = b'RFAMIDX1'
+HEADER = struct.Struct('<8sQQ')
+ALIGNMENT = 64
+
+# Stored in place of NULL integer columns
+NULL_INT = -1
+
+_indexes = ReleaseCache(maxsize=1)
+
+
+def pack_strings(name, strings):
+    """
+    Get the sections of a string table holding `strings`, which may include None.
+    """
+    data = bytearray()
+    offsets = [0]
+    nulls = []
+    for string in strings:
+        nulls.append(string is None)
+        data += (string or '').encode()
+        offsets.append(len(data))
+    return {
+        f'{name}.data': np.frombuffer(bytes(data), dtype=np.uint8),
+        f'{name}.offsets': np.array(offsets, dtype=np.int64),
+        f'{name}.nulls': np.array(nulls, dtype=bool),
+    }
+
+
+def _keys(strings):
+    """Get a fixed-width bytes array of `strings`."""
+    encoded = [string.encode() for string in strings]
+    width = max((len(key) for key in encoded), default=1) or 1
+    return np.array(encoded, dtype=f'S{width}')
+
+
+def entry_sections(kind, pairs):
+    """
+    Get the sections for (accession, id) pairs of families, clans or motifs.
+
+    Rows are numbered in accession order. `<kind>.id_rows` lists the rows in
+    case-insensitive id order, with `<kind>.id_keys` the matching lowercased ids.
+    """
+    pairs = sorted(pairs)
+    by_id = sorted(
+        (entry_id.lower(), row) for row, (_, entry_id) in enumerate(pairs) if entry_id
+    )
+    return {
+        f'{kind}.accs': _keys(acc for acc, _ in pairs),
+        f'{kind}.id_keys': _keys(key for key, _ in by_id),
+        f'{kind}.id_rows': np.array([row for _, row in by_id], dtype=np.int32),
+        **pack_strings(f'{kind}.ids', [entry_id for _, entry_id in pairs]),
+    }
+
+
+def family_sections(rows):
+    """
+    Get the sections for (rfam_acc, rfam_id, description, type, num_seed,
+    num_full) family rows: the entry maps, the summary columns and postings
+    of rows (as positions in `family.rank_rows`) for each distinct type.
+
+    `family.rank_rows` lists the rows as ORDER BY rfam_id does: families
+    without an id first, in accession order, then the others by id.
+    """
+    rows = sorted(rows)
+    sections = entry_sections('family', [(row[0], row[1]) for row in rows])
+
+    rank_rows = np.concatenate([
+        np.array([row for row, (_, rfam_id, *_) in enumerate(rows) if not rfam_id], dtype=np.int32),
+        sections['family.id_rows'],
+    ])
+    row_rank = np.empty(len(rows), dtype=np.int32)
+    row_rank[rank_rows] = np.arange(len(rows), dtype=np.int32)
+
+    postings = {}
+    for row, (_, _, _, family_type, _, _) in enumerate(rows):
+        postings.setdefault(family_type or '', []).append(int(row_rank[row]))
+    types = sorted(postings)
+    indptr = np.zeros(len(types) + 1, dtype=np.int64)
+    np.cumsum([len(postings[t]) for t in types], out=indptr[1:])
+
+    sections.update(pack_strings('family.descriptions', [row[2] for row in rows]))
+    sections.update(pack_strings('family.types', [row[3] for row in rows]))
+    sections.update(pack_strings('family.type_values', types))
+    sections.update({
+        'family.num_seed': np.array([NULL_INT if row[4] is None else row[4] for row in rows], dtype=np.int64),
+        'family.num_full': np.array([NULL_INT if row[5] is None else row[5] for row in rows], dtype=np.int64),
+        'family.rank_rows': rank_rows,
+        'family.type_indptr': indptr,
+        'family.type_ranks': np.array(
+            [rank for t in types for rank in sorted(postings[t])], dtype=np.int32
+        ),
+    })
+    return sections
+
+
+def taxonomy_sections(rows):
+    """
+    Get the sections for (ncbi_id, species, tax_string) taxonomy rows.
+
+    Rows are ordered by species, case-insensitively. `taxonomy.text` holds
+    each row's lowercased species and tax_string, each preceded by a NUL
+    byte, so a substring search over it finds exactly the rows where either
+    column contains the query.
+    """
+    rows = sorted(rows, key=lambda row: (row[1].lower(), row[0]))
+    text = bytearray()
+    starts = []
+    for _, species, tax_string in rows:
+        starts.append(len(text))
+        text += b'\0' + species.lower().encode() + b'\0' + (tax_string or '').lower().encode()
+    starts.append(len(text))
+
+    return {
+        'taxonomy.ncbi_ids': np.array([row[0] for row in rows], dtype=np.int64),
+        'taxonomy.text': np.frombuffer(bytes(text), dtype=np.uint8),
+        'taxonomy.text_starts': np.array(starts, dtype=np.int64),
+        **pack_strings('taxonomy.species', [row[1] for row in rows]),
+    }
+
+
+def write_index(path, sections):
+    """
+    Write a dict of named arrays to an index file at `path`, replacing it atomically.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+
+    contents = {}
+    with open(tmp_path, 'wb') as f:
+        f.write(b'\0' * HEADER.size)
+        for name, array in sections.items():
+            array = np.ascontiguousarray(array)
+            f.write(b'\0' * (-f.tell() % ALIGNMENT))
+            contents[name] = [f.tell(), array.dtype.str, list(array.shape)]
+            f.write(array.tobytes())
+
+        toc = json.dumps(contents).encode()
+        toc_offset = f.tell()
+        f.write(toc)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, toc_offset, len(toc)))
+
+    os.replace(tmp_path, path)
+    return len(contents)
+
+
+class StringTable:
+    """
+    Read-only view of a packed string table.
+    """
+
+    __slots__ = ('_data', '_offsets', '_nulls')
+
+    def __init__(self, index, name):
+        self._data = index.section(f'{name}.data')
+        self._offsets = index.section(f'{name}.offsets')
+        self._nulls = index.section(f'{name}.nulls')
+
+    def __len__(self):
+        return len(self._nulls)
+
+    def __getitem__(self, row):
+        if self._nulls[row]:
+            return None
+        return self._data[self._offsets[row]:self._offsets[row + 1]].tobytes().decode()
+
+
+def _find(keys, key):
+    """Get the position of `key` in the sorted fixed-width array `keys`, or None."""
+    key = key.encode()
+    if len(key) > keys.itemsize or not len(keys):
+        return None
+    i = int(np.searchsorted(keys, key))
+    if i < len(keys) and keys[i] == key:
+        return i
+    return None
+
+
+class IndexedEntries:
+    """
+    Accession and id lookups for one kind of entry, matched case-insensitively.
+
+    Same interface as `resolver.EntryMaps`.
+    """
+
+    __slots__ = ('_accs', '_id_keys', '_id_rows', '_ids')
+
+    def __init__(self, index, kind):
+        self._accs = index.section(f'{kind}.accs')
+        self._id_keys = index.section(f'{kind}.id_keys')
+        self._id_rows = index.section(f'{kind}.id_rows')
+        self._ids = StringTable(index, f'{kind}.ids')
+
+    def __len__(self):
+        return len(self._accs)
+
+    def row(self, entry):
+        """Get the row of an entry by accession or id, or None."""
+        row = _find(self._accs, entry.upper())
+        if row is None:
+            i = _find(self._id_keys, entry.lower())
+            row = None if i is None else int(self._id_rows[i])
+        return row
+
+    def resolve(self, entry):
+        """Get the accession for an accession or id, or None if unknown."""
+        row = self.row(entry)
+        return None if row is None else self._accs[row].decode()
+
+    def entry_id(self, acc):
+        """Get the id for an accession, or None if unknown."""
+        row = _find(self._accs, acc.upper())
+        return None if row is None else self._ids[row]
+
+
+class IndexedFamilies(IndexedEntries):
+    """
+    Family lookups plus the columns shown in family lists.
+    """
+
+    __slots__ = ('_descriptions', '_types', '_num_seed', '_num_full',
+                 '_rank_rows', '_type_values', '_type_indptr', '_type_ranks')
+
+    def __init__(self, index):
+        super().__init__(index, 'family')
+        self._descriptions = StringTable(index, 'family.descriptions')
+        self._types = StringTable(index, 'family.types')
+        self._num_seed = index.section('family.num_seed')
+        self._num_full = index.section('family.num_full')
+        self._rank_rows = index.section('family.rank_rows')
+        self._type_values = StringTable(index, 'family.type_values')
+        self._type_indptr = index.section('family.type_indptr')
+        self._type_ranks = index.section('family.type_ranks')
+
+    def summary(self, row):
+        """Get a family row as `FamilyListSerializer` renders it."""
+        num_seed = int(self._num_seed[row])
+        num_full = int(self._num_full[row])
+        return {
+            'acc': self._accs[row].decode(),
+            'id': self._ids[row],
+            'description': self._descriptions[row],
+            'type': self._types[row],
+            'num_seed': None if num_seed == NULL_INT else num_seed,
+            'num_full': None if num_full == NULL_INT else num_full,
+        }
+
+    def search_type(self, query, limit=50):
+        """
+        Get the families whose type contains `query`, case-insensitively,
+        ordered by id.
+        """
+        query = query.lower()
+        matches = [
+            self._type_ranks[self._type_indptr[i]:self._type_indptr[i + 1]]
+            for i in range(len(self._type_values))
+            if query in self._type_values[i].lower()
+        ]
+        if not matches:
+            return []
+        ranks = np.unique(np.concatenate(matches))[:limit]
+        return [self.summary(int(row)) for row in self._rank_rows[ranks]]
+
+
+class IndexedTaxonomy:
+    """
+    Species search over the taxonomy table.
+    """
+
+    __slots__ = ('_index', '_ncbi_ids', '_species', '_starts', '_text_start', '_text_end')
+
+    def __init__(self, index):
+        self._index = index
+        self._ncbi_ids = index.section('taxonomy.ncbi_ids')
+        self._species = StringTable(index, 'taxonomy.species')
+        self._starts = index.section('taxonomy.text_starts')
+        self._text_start, self._text_end = index.span('taxonomy.text')
+
+    def search(self, query, limit=50):
+        """
+        Get (ncbi_id, species) for the first `limit` species, in species order,
+        whose species name or tax_string contains `query`, case-insensitively.
+        """
+        needle = query.lower().replace('\0', '').encode()
+        results = []
+        pos = self._text_start
+        while len(results) < limit:
+            pos = self._index.find(needle, pos, self._text_end)
+            if pos < 0:
+                break
+            row = int(np.searchsorted(self._starts, pos - self._text_start, side='right')) - 1
+            results.append((int(self._ncbi_ids[row]), self._species[row]))
+            pos = self._text_start + int(self._starts[row + 1])
+        return results
+
+
+class ReleaseIndex:
+    """
+    Read-only, memory-mapped release index file.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, toc_offset, toc_length = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a release index')
+        self._contents = json.loads(self._mmap[toc_offset:toc_offset + toc_length])
+
+        self.families = IndexedFamilies(self)
+        self.clans = IndexedEntries(self, 'clan')
+        self.motifs = IndexedEntries(self, 'motif')
+        self.taxonomy = IndexedTaxonomy(self)
+
+    def section(self, name):
+        """Get a section as an array backed by the mapped file."""
+        offset, dtype, shape = self._contents[name]
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape, dtype=np.int64))
+        return np.frombuffer(self._mmap, dtype=dtype, count=count, offset=offset).reshape(shape)
+
+    def span(self, name):
+        """Get the (start, end) byte offsets of a section in the file."""
+        offset, dtype, shape = self._contents[name]
+        return offset, offset + int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+
+    def find(self, sub, start, end):
+        """Find bytes in the mapped file, like `bytes.find()`."""
+        return self._mmap.find(sub, start, end)
+
+
+def get_release_index():
+    """
+    Get the release index for the current release, or None if not built.
+    """
+    path = index_path(INDEX_FILENAME)
+    if not path.exists():
+        return None
+    return _indexes.get_or_build(path, lambda: ReleaseIndex(path))
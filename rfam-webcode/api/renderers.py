@@ -1,14 +1,338 @@
 """
 Custom renderers for Rfam API.
 """
-from rest_framework.renderers import BaseRenderer
-from xml.etree.ElementTree import Element, SubElement, tostring
+import math
+import re
+from functools import lru_cache
 from xml.dom import minidom
+from xml.parsers import expat
+
+from django.conf import settings
+from rest_framework.compat import INDENT_SEPARATORS, LONG_SEPARATORS, SHORT_SEPARATORS
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+ROOT_ATTRIBUTES = (
+    ('xmlns:xsi', 'http://www.w3.org/2001/XMLSchema-instance'),
+    ('xmlns', 'https://rfam.org/'),
+    ('xsi:schemaLocation', 'https://rfam.org/ https://rfam.org/static/documents/schemas/entry.xsd'),
+)
+
+INDENT = '  '
+
+# Size, in characters, of the chunks yielded by `RfamXMLRenderer.iter_render()`
+CHUNK_SIZE = 64 * 1024
+
+# Events describing a document: (START, tag, attributes), (TEXT, text), (END, tag)
+START, TEXT, END = range(3)
+
+# Characters XML 1.0 does not allow anywhere in a document
+_invalid_char_re = re.compile('[^\t\n\r\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]')
+
+
+def _minidom_escapes(text, attribute):
+    """Get how minidom's pretty-printer escapes `text`."""
+    document = minidom.Document()
+    element = document.createElement('e')
+    if attribute:
+        element.setAttribute('a', text)
+        return element.toxml()[6:-3]
+    element.appendChild(document.createTextNode(text))
+    return element.toxml()[3:-4]
+
+
+def _escaper(replacements):
+    replacements = [(char, escaped) for char, escaped in replacements if escaped != char]
+
+    def escape(text):
+        for char, escaped in replacements:
+            if char in text:
+                text = text.replace(char, escaped)
+        return text
+    return escape
+
+
+# Escaping as done by ElementTree (compact output) and by minidom (pretty
+# output), which escape different characters, and differently between Python
+# versions, so minidom is asked once how it escapes each one.
+_escape_attribute = _escaper(
+    [('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;'), ('"', '&quot;'),
+     ('\r', '&#13;'), ('\n', '&#10;'), ('\t', '&#09;')]
+)
+_escape_text = _escaper([('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;')])
+_pretty_attribute = _escaper([('&', '&amp;')] + [
+    (char, _minidom_escapes(char, True)) for char in '<>"\r\n\t'
+])
+_pretty_text = _escaper([('&', '&amp;')] + [
+    (char, _minidom_escapes(char, False)) for char in '<>"'
+])
+
+
+def _check_value(value):
+    """
+    Check whether a text or attribute value only holds characters XML allows,
+    raising TypeError, as ElementTree does, if it is not a string.
+    """
+    if not isinstance(value, str):
+        raise TypeError(f'cannot serialize {value!r} (type {type(value).__name__})')
+    return _invalid_char_re.search(value) is None
+
+
+@lru_cache(maxsize=1024)
+def _valid_tag(tag):
+    """Check whether `tag` parses as an element name inside an Rfam document."""
+    parser = expat.ParserCreate(namespace_separator=' ')
+    declarations = ' '.join(f'{name}="{value}"' for name, value in ROOT_ATTRIBUTES[:2])
+    try:
+        parser.Parse(f'<rfam {declarations}><{tag}/></rfam>', True)
+    except expat.ExpatError:
+        return False
+    return True
+
+
+def is_well_formed(events):
+    """
+    Check whether a document would survive being parsed back, as the
+    minidom pretty-printer required. Documents that would not are written
+    unindented instead.
+    """
+    well_formed = True
+    for event in events:
+        if event[0] == START:
+            well_formed &= _valid_tag(event[1])
+            for _, value in event[2]:
+                well_formed &= _check_value(value)
+        elif event[0] == TEXT and event[1]:
+            well_formed &= _check_value(event[1])
+    return well_formed
+
+
+def _attributes(attributes, escape):
+    return ''.join(f' {name}="{escape(value)}"' for name, value in attributes)
+
+
+def _chunked(parts):
+    """Join an iterator of strings into chunks of about CHUNK_SIZE characters."""
+    buffer = []
+    size = 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def pretty_xml(events):
+    """
+    Write events as indented XML, exactly as `minidom.toprettyxml()` prints
+    the document.
+
+    Leaf elements are written on one line with their text, empty elements
+    self-closed, and every other element opened and closed on lines of its
+    own. Line breaks in text are normalised as an XML parser does.
+    """
+    depth = 0
+    pending = None
+    for event in events:
+        kind = event[0]
+        if kind == START:
+            if pending is not None:
+                yield f'{INDENT * depth}<{pending[0]}{_attributes(pending[1], _pretty_attribute)}>\n'
+                depth += 1
+            pending = [event[1], event[2], None]
+        elif kind == TEXT:
+            if event[1]:
+                pending[2] = event[1]
+        elif pending is not None:
+            tag, attributes, text = pending
+            pending = None
+            if text is None:
+                yield f'{INDENT * depth}<{tag}{_attributes(attributes, _pretty_attribute)}/>\n'
+            else:
+                text = _pretty_text(text.replace('\r\n', '\n').replace('\r', '\n'))
+                yield f'{INDENT * depth}<{tag}{_attributes(attributes, _pretty_attribute)}>{text}</{tag}>\n'
+        else:
+            depth -= 1
+            yield f'{INDENT * depth}</{event[1]}>\n'
+
+
+def compact_xml(events):
+    """Write events as unindented XML, as `ElementTree.tostring()` does."""
+    pending = None
+    for event in events:
+        kind = event[0]
+        if kind == START:
+            if pending is not None:
+                yield f'<{pending[0]}{_attributes(pending[1], _escape_attribute)}>'
+            pending = [event[1], event[2], None]
+        elif kind == TEXT:
+            if event[1]:
+                pending[2] = event[1]
+        elif pending is not None:
+            tag, attributes, text = pending
+            pending = None
+            if text is None:
+                yield f'<{tag}{_attributes(attributes, _escape_attribute)} />'
+            else:
+                yield f'<{tag}{_attributes(attributes, _escape_attribute)}>{_escape_text(text)}</{tag}>'
+        else:
+            yield f'</{event[1]}>'
+
+
+@lru_cache(maxsize=None)
+def _json_encoder(indent, ensure_ascii, allow_nan, separators):
+    """
+    Get a shared DRF `JSONEncoder` for the given options.
+
+    Floats are written by the C encoder itself, and datetimes, Decimals and
+    the like by the encoder's `default()` as it meets them. Converting them
+    in a pass over the data beforehand was measured slower (16-19 ms
+    against 14 ms for 5000 rows), so the stdlib path does not.
+    """
+    return JSONEncoder(
+        indent=indent, ensure_ascii=ensure_ascii, allow_nan=allow_nan, separators=separators,
+    )
+
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z if orjson is not None else 0
+
+# Encodes the types JSON has no representation for (datetimes, Decimals,
+# lazy strings, ...) as DRF's encoder does
+_json_default = JSONEncoder().default
+
+
+def _has_non_finite(data):
+    """Check whether `data` contains a NaN or infinite float anywhere."""
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                return True
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return False
+
+
+class RfamJSONRenderer(JSONRenderer):
+    """
+    Renderer which serializes to JSON, with the output of DRF's `JSONRenderer`.
+
+    Compact output is written by orjson when it is installed (and
+    RFAM_JSON_BACKEND is not 'stdlib'), about an order of magnitude faster
+    than the standard library. orjson writes some floats in a different but
+    equal form (`0.00001` for `1e-05`, `1e16` for `1e+16`). Data it cannot
+    encode, such as integers beyond 64 bits, falls back to the standard
+    library, as does data with NaN or infinite floats, which orjson would
+    write as null, so they raise ValueError under DRF's STRICT_JSON (the
+    default) as with DRF's renderer. Indented output, as requested by
+    `; indent=` or the browsable API, always uses the standard library.
+    """
+
+    def use_orjson(self):
+        return (
+            orjson is not None
+            and settings.RFAM_JSON_BACKEND != 'stdlib'
+            and self.compact
+            and not self.ensure_ascii
+        )
+
+    def compact_encoder(self):
+        """
+        Get a function encoding data as compact JSON bytes, as `render()`
+        does without indentation.
+        """
+        separators = SHORT_SEPARATORS if self.compact else LONG_SEPARATORS
+        stdlib_encoder = _json_encoder(None, self.ensure_ascii, not self.strict, separators)
+
+        def encode_stdlib(data):
+            ret = stdlib_encoder.encode(data)
+            return ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
+
+        if not self.use_orjson():
+            return encode_stdlib
+
+        def encode(data):
+            try:
+                ret = orjson.dumps(data, default=_json_default, option=ORJSON_OPTIONS)
+            except orjson.JSONEncodeError:
+                return encode_stdlib(data)
+            # orjson writes NaN and infinities as null, so only output with a
+            # null can hold one
+            if b'null' in ret and _has_non_finite(data):
+                return encode_stdlib(data)
+            # As DRF does, keep the output a strict JavaScript subset
+            return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+        return encode
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """
+        Render `data` into JSON, returning a bytestring.
+        """
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        if indent is None:
+            return self.compact_encoder()(data)
+
+        ret = _json_encoder(indent, self.ensure_ascii, not self.strict, INDENT_SEPARATORS).encode(data)
+        return ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
+
+
+class NDJSONRenderer(RfamJSONRenderer):
+    """
+    Renderer which serializes to newline-delimited JSON: one compact JSON
+    value per line, for each item of a list or for the data as a whole.
+
+    List views stream their rows in this format instead (see `api.streaming`).
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def get_indent(self, accepted_media_type, renderer_context):
+        return None
+
+    def iter_lines(self, objects):
+        """Encode each of an iterator of objects as a line of JSON."""
+        encode = self.compact_encoder()
+        for obj in objects:
+            yield encode(obj) + b'\n'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return b''.join(self.iter_lines(data if isinstance(data, list) else [data]))
+
+
+def _leaf(tag, text, attributes=()):
+    return (START, tag, attributes), (TEXT, text), (END, tag)
 
 
 class RfamXMLRenderer(BaseRenderer):
     """
     Renderer which serializes to XML in Rfam format.
+
+    The document is produced incrementally from the data, as a stream of
+    start/text/end events written straight out as indented XML, so no tree
+    or intermediate string is built and large payloads can be streamed
+    with `iter_render()`.
     """
     media_type = 'text/xml'
     format = 'xml'
@@ -21,142 +345,134 @@ class RfamXMLRenderer(BaseRenderer):
         if data is None:
             return ''
 
+        events = list(self._events(data, renderer_context))
+        write = pretty_xml if is_well_formed(events) else compact_xml
+        return XML_DECLARATION + ''.join(write(events))
+
+    def iter_render(self, data, renderer_context=None):
+        """
+        Render `data` into XML as an iterator of string chunks, for
+        streaming responses.
+
+        The data is walked twice, once to check it and once to write it, so
+        only a chunk of output is held in memory at a time.
+        """
+        if data is None:
+            return
+        write = pretty_xml if is_well_formed(self._events(data, renderer_context)) else compact_xml
+        yield XML_DECLARATION
+        yield from _chunked(write(self._events(data, renderer_context)))
+
+    def _events(self, data, renderer_context):
+        """Generate the events of the document for `data`."""
         view = renderer_context.get('view') if renderer_context else None
         entity_type = getattr(view, 'entity_type', 'entry')
 
-        # Create root element
-        root = Element('rfam')
-        root.set('xmlns:xsi', 'http://www.w3.org/2001/XMLSchema-instance')
-        root.set('xmlns', 'https://rfam.org/')
-        root.set('xsi:schemaLocation', 'https://rfam.org/ https://rfam.org/static/documents/schemas/entry.xsd')
-        root.set('release', str(data.get('release', {}).get('number', '')))
-        root.set('release_date', str(data.get('release', {}).get('date', '')))
+        yield START, 'rfam', ROOT_ATTRIBUTES + (
+            ('release', str(data.get('release', {}).get('number', ''))),
+            ('release_date', str(data.get('release', {}).get('date', ''))),
+        )
 
         if entity_type == 'family':
-            self._render_family(root, data)
+            yield from self._render_family(data)
         elif entity_type == 'clan':
-            self._render_clan(root, data)
+            yield from self._render_clan(data)
         elif entity_type == 'motif':
-            self._render_motif(root, data)
+            yield from self._render_motif(data)
         else:
-            self._render_generic(root, data)
-
-        # Generate XML string
-        xml_string = tostring(root, encoding='unicode')
-        # Pretty print
-        try:
-            dom = minidom.parseString(xml_string)
-            return '<?xml version="1.0" encoding="UTF-8"?>\n' + dom.toprettyxml(indent="  ")[23:]  # Skip XML declaration from minidom
-        except Exception:
-            return '<?xml version="1.0" encoding="UTF-8"?>\n' + xml_string
-
-    def _render_family(self, root, data):
-        """Render family data to XML."""
-        rfam_data = data.get('rfam', data)
+            yield from self._render_generic(data)
 
-        entry = SubElement(root, 'entry')
-        entry.set('entry_type', 'Rfam')
-        entry.set('accession', str(rfam_data.get('acc', '')))
-        entry.set('id', str(rfam_data.get('id', '')))
+        yield END, 'rfam'
 
-        # Description
-        desc = SubElement(entry, 'description')
-        desc.text = rfam_data.get('description', '')
+    def _render_family(self, data):
+        """Render family data to XML."""
+        rfam_data = data.get('rfam', data)
 
-        # Comment
-        comment = SubElement(entry, 'comment')
-        comment.text = rfam_data.get('comment', '')
+        yield START, 'entry', (
+            ('entry_type', 'Rfam'),
+            ('accession', str(rfam_data.get('acc', ''))),
+            ('id', str(rfam_data.get('id', ''))),
+        )
+        yield from _leaf('description', rfam_data.get('description', ''))
+        yield from _leaf('comment', rfam_data.get('comment', ''))
 
         # Curation details
         curation = rfam_data.get('curation', {})
-        curation_elem = SubElement(entry, 'curation_details')
-
-        author = SubElement(curation_elem, 'author')
-        author.text = str(curation.get('author', ''))
-
-        seed_source = SubElement(curation_elem, 'seed_source')
-        seed_source.text = str(curation.get('seed_source', ''))
-
-        num_seqs = SubElement(curation_elem, 'num_seqs')
-        seed = SubElement(num_seqs, 'seed')
-        seed.text = str(curation.get('num_seed', 0))
-        full = SubElement(num_seqs, 'full')
-        full.text = str(curation.get('num_full', 0))
-
-        num_species = SubElement(curation_elem, 'num_species')
-        num_species.text = str(curation.get('num_species', 0))
-
-        type_elem = SubElement(curation_elem, 'type')
-        type_elem.text = str(curation.get('type', ''))
-
-        structure_source = SubElement(curation_elem, 'structure_source')
-        structure_source.text = str(curation.get('structure_source', ''))
+        yield START, 'curation_details', ()
+        yield from _leaf('author', str(curation.get('author', '')))
+        yield from _leaf('seed_source', str(curation.get('seed_source', '')))
+        yield START, 'num_seqs', ()
+        yield from _leaf('seed', str(curation.get('num_seed', 0)))
+        yield from _leaf('full', str(curation.get('num_full', 0)))
+        yield END, 'num_seqs'
+        yield from _leaf('num_species', str(curation.get('num_species', 0)))
+        yield from _leaf('type', str(curation.get('type', '')))
+        yield from _leaf('structure_source', str(curation.get('structure_source', '')))
+        yield END, 'curation_details'
 
         # CM details
         cm = rfam_data.get('cm', {})
-        cm_elem = SubElement(entry, 'cm_details')
-
-        build_cmd = SubElement(cm_elem, 'build_command')
-        build_cmd.text = str(cm.get('build_command', ''))
-
-        calibrate_cmd = SubElement(cm_elem, 'calibrate_command')
-        calibrate_cmd.text = str(cm.get('calibrate_command', ''))
-
-        search_cmd = SubElement(cm_elem, 'search_command')
-        search_cmd.text = str(cm.get('search_command', ''))
+        yield START, 'cm_details', ()
+        yield from _leaf('build_command', str(cm.get('build_command', '')))
+        yield from _leaf('calibrate_command', str(cm.get('calibrate_command', '')))
+        yield from _leaf('search_command', str(cm.get('search_command', '')))
 
         # Cutoffs
         cutoffs = cm.get('cutoffs', {})
-        cutoffs_elem = SubElement(cm_elem, 'cutoffs')
-
-        gathering = SubElement(cutoffs_elem, 'gathering')
-        gathering.text = str(cutoffs.get('gathering', 0))
-
-        trusted = SubElement(cutoffs_elem, 'trusted')
-        trusted.text = str(cutoffs.get('trusted', 0))
+        yield START, 'cutoffs', ()
+        yield from _leaf('gathering', str(cutoffs.get('gathering', 0)))
+        yield from _leaf('trusted', str(cutoffs.get('trusted', 0)))
+        yield from _leaf('noise', str(cutoffs.get('noise', 0)))
+        yield END, 'cutoffs'
+        yield END, 'cm_details'
 
-        noise = SubElement(cutoffs_elem, 'noise')
-        noise.text = str(cutoffs.get('noise', 0))
+        yield END, 'entry'
 
-    def _render_clan(self, root, data):
+    def _render_clan(self, data):
         """Render clan data to XML."""
-        entry = SubElement(root, 'entry')
-        entry.set('entry_type', 'Clan')
-        entry.set('accession', str(data.get('acc', '')))
-        entry.set('id', str(data.get('id', '')))
-
-        desc = SubElement(entry, 'description')
-        desc.text = data.get('description', '')
-
-        members = SubElement(entry, 'members')
+        yield START, 'entry', (
+            ('entry_type', 'Clan'),
+            ('accession', str(data.get('acc', ''))),
+            ('id', str(data.get('id', ''))),
+        )
+        yield from _leaf('description', data.get('description', ''))
+
+        yield START, 'members', ()
         for member in data.get('members', []):
-            member_elem = SubElement(members, 'member')
-            member_elem.set('accession', member.get('acc', ''))
-            member_elem.set('id', member.get('id', ''))
+            yield from _leaf('member', None, (
+                ('accession', member.get('acc', '')),
+                ('id', member.get('id', '')),
+            ))
+        yield END, 'members'
 
-    def _render_motif(self, root, data):
-        """Render motif data to XML."""
-        entry = SubElement(root, 'entry')
-        entry.set('entry_type', 'Motif')
-        entry.set('accession', str(data.get('acc', '')))
-        entry.set('id', str(data.get('id', '')))
+        yield END, 'entry'
 
-        desc = SubElement(entry, 'description')
-        desc.text = data.get('description', '')
-
-    def _render_generic(self, root, data):
+    def _render_motif(self, data):
+        """Render motif data to XML."""
+        yield START, 'entry', (
+            ('entry_type', 'Motif'),
+            ('accession', str(data.get('acc', ''))),
+            ('id', str(data.get('id', ''))),
+        )
+        yield from _leaf('description', data.get('description', ''))
+        yield END, 'entry'
+
+    def _render_generic(self, data):
         """Render generic data to XML."""
-        self._dict_to_xml(root, data)
+        return self._dict_to_xml(data)
 
-    def _dict_to_xml(self, parent, data):
-        """Convert a dictionary to XML elements."""
+    def _dict_to_xml(self, data):
+        """Convert a dictionary to XML events."""
         if isinstance(data, dict):
             for key, value in data.items():
-                child = SubElement(parent, str(key))
-                self._dict_to_xml(child, value)
+                tag = str(key)
+                yield START, tag, ()
+                yield from self._dict_to_xml(value)
+                yield END, tag
         elif isinstance(data, list):
             for item in data:
-                child = SubElement(parent, 'item')
-                self._dict_to_xml(child, item)
+                yield START, 'item', ()
+                yield from self._dict_to_xml(item)
+                yield END, 'item'
         else:
-            parent.text = str(data) if data is not None else ''
+            yield TEXT, str(data) if data is not None else ''
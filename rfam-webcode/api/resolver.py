@@ -0,0 +1,119 @@
+"""
+Accession <-> id lookups for families, clans and motifs.
+
+The maps are loaded once per release and kept as a few flat buffers per
+table rather than dicts of small strings, so a copy built in the gunicorn
+master before fork stays shared with every worker. When the release index
+file exists, its memory-mapped tables are used instead.
+"""
+from array import array
+from bisect import bisect_left
+
+from .release import ReleaseCache, current_release
+
+
+_resolvers = ReleaseCache(maxsize=1)
+
+
+def _pack(strings):
+    """Pack strings into one UTF-8 buffer and an array of end offsets."""
+    data = bytearray()
+    offsets = array('I', [0])
+    for string in strings:
+        data += string.encode()
+        offsets.append(len(data))
+    return bytes(data), offsets
+
+
+class PackedMap:
+    """
+    Immutable string to string map kept as sorted keys in packed buffers.
+
+    Lookups are a binary search over the packed keys.
+    """
+
+    __slots__ = ('_keys', '_key_offsets', '_values', '_value_offsets')
+
+    def __init__(self, items):
+        items = sorted(
+            ((key.encode(), value) for key, value in items if key and value),
+            key=lambda item: item[0],
+        )
+        self._keys, self._key_offsets = _pack(key.decode() for key, _ in items)
+        self._values, self._value_offsets = _pack(value for _, value in items)
+
+    def __len__(self):
+        return len(self._key_offsets) - 1
+
+    def _key(self, i):
+        return self._keys[self._key_offsets[i]:self._key_offsets[i + 1]]
+
+    def get(self, key, default=None):
+        key = key.encode()
+        i = bisect_left(range(len(self)), key, key=self._key)
+        if i < len(self) and self._key(i) == key:
+            return self._values[self._value_offsets[i]:self._value_offsets[i + 1]].decode()
+        return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+
+class EntryMaps:
+    """
+    Lookups between accessions and ids for one kind of entry.
+
+    Keys are matched case-insensitively, like the database collation.
+    """
+
+    __slots__ = ('_ids', '_accs')
+
+    def __init__(self, pairs):
+        pairs = list(pairs)
+        self._ids = PackedMap((acc.lower(), entry_id) for acc, entry_id in pairs)
+        self._accs = PackedMap(
+            [(acc.lower(), acc) for acc, _ in pairs]
+            + [(entry_id.lower(), acc) for acc, entry_id in pairs if entry_id]
+        )
+
+    def __len__(self):
+        return len(self._ids)
+
+    def resolve(self, entry):
+        """Get the accession for an accession or id, or None if unknown."""
+        return self._accs.get(entry.lower())
+
+    def entry_id(self, acc):
+        """Get the id for an accession, or None if unknown."""
+        return self._ids.get(acc.lower())
+
+
+class Resolver:
+    """
+    Entry maps for the families, clans and motifs of one release.
+    """
+
+    __slots__ = ('families', 'clans', 'motifs')
+
+    def __init__(self):
+        from .models import Clan, Family, Motif
+
+        self.families = EntryMaps(Family.objects.values_list('rfam_acc', 'rfam_id').iterator())
+        self.clans = EntryMaps(Clan.objects.values_list('clan_acc', 'id').iterator())
+        self.motifs = EntryMaps(Motif.objects.values_list('motif_acc', 'motif_id').iterator())
+
+
+def get_resolver():
+    """
+    Get the entry maps for the current release.
+
+    These come from the release index file when it has been built
+    (`manage.py build_release_index`), and are otherwise loaded from the
+    database on first use.
+    """
+    from .release_index import get_release_index
+
+    index = get_release_index()
+    if index is not None:
+        return index
+    return _resolvers.get_or_build(current_release(), Resolver)
@@ -8,7 +8,59 @@ from .models import (
 )
 
 
-class DbVersionSerializer(serializers.ModelSerializer):
+class SparseModelSerializer(serializers.ModelSerializer):
+    """
+    Model serializer that can be limited to some of its fields.
+
+    Pass `fields` (e.g. from ?fields=acc,id,num_full) to render only those
+    fields, in the serializer's own order. `project()` narrows a queryset to
+    the model columns they read, so the rest are not fetched either.
+    Method fields list the columns they read in `Meta.method_field_sources`.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def field_names(cls):
+        """Get the names of all the serializer's fields."""
+        return list(cls().fields)
+
+    @classmethod
+    def model_columns(cls, fields=None):
+        """
+        Get the model fields read to render `fields` (all by default), or
+        None if that is not known.
+        """
+        method_sources = getattr(cls.Meta, 'method_field_sources', {})
+        columns = []
+        for name, field in cls(fields=fields).fields.items():
+            if isinstance(field, serializers.SerializerMethodField):
+                if name not in method_sources:
+                    return None
+                columns.extend(method_sources[name])
+            elif field.source == '*':
+                return None
+            else:
+                columns.append(field.source.split('.')[0])
+        return list(dict.fromkeys(columns))
+
+    @classmethod
+    def project(cls, queryset, fields=None):
+        """
+        Limit `queryset` to the columns needed to render `fields`; the
+        primary key is always fetched.
+        """
+        if fields is None:
+            return queryset
+        columns = cls.model_columns(fields)
+        return queryset if columns is None else queryset.only(*columns)
+
+
+class DbVersionSerializer(SparseModelSerializer):
     """Serializer for database version information."""
     number = serializers.FloatField(source='rfam_release')
     date = serializers.DateTimeField(source='rfam_release_date', format='%Y-%m-%d')
@@ -114,7 +166,7 @@ class FamilyDetailSerializer(serializers.ModelSerializer):
         return {'acc': None, 'id': None}
 
 
-class FamilyListSerializer(serializers.ModelSerializer):
+class FamilyListSerializer(SparseModelSerializer):
     """Simplified serializer for family list views."""
     acc = serializers.CharField(source='rfam_acc')
     id = serializers.CharField(source='rfam_id')
@@ -124,7 +176,7 @@ class FamilyListSerializer(serializers.ModelSerializer):
         fields = ['acc', 'id', 'description', 'type', 'num_seed', 'num_full']
 
 
-class ClanDetailSerializer(serializers.ModelSerializer):
+class ClanDetailSerializer(SparseModelSerializer):
     """Detailed serializer for clan."""
     acc = serializers.CharField(source='clan_acc')
     members = serializers.SerializerMethodField()
@@ -132,6 +184,7 @@ class ClanDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = Clan
         fields = ['acc', 'id', 'description', 'author', 'comment', 'members']
+        method_field_sources = {'members': ['clan_acc']}
 
     def get_members(self, obj):
         memberships = ClanMembership.objects.filter(clan_acc=obj.clan_acc).select_related('rfam_acc')
@@ -145,7 +198,7 @@ class ClanDetailSerializer(serializers.ModelSerializer):
         ]
 
 
-class ClanListSerializer(serializers.ModelSerializer):
+class ClanListSerializer(SparseModelSerializer):
     """Simplified serializer for clan list views."""
     acc = serializers.CharField(source='clan_acc')
 
@@ -154,7 +207,7 @@ class ClanListSerializer(serializers.ModelSerializer):
         fields = ['acc', 'id', 'description']
 
 
-class MotifDetailSerializer(serializers.ModelSerializer):
+class MotifDetailSerializer(SparseModelSerializer):
     """Detailed serializer for motif."""
     acc = serializers.CharField(source='motif_acc')
     id = serializers.CharField(source='motif_id')
@@ -164,7 +217,7 @@ class MotifDetailSerializer(serializers.ModelSerializer):
         fields = ['acc', 'id', 'description', 'author', 'type', 'num_seed']
 
 
-class MotifListSerializer(serializers.ModelSerializer):
+class MotifListSerializer(SparseModelSerializer):
     """Simplified serializer for motif list views."""
     acc = serializers.CharField(source='motif_acc')
     id = serializers.CharField(source='motif_id')
@@ -174,7 +227,7 @@ class MotifListSerializer(serializers.ModelSerializer):
         fields = ['acc', 'id', 'description']
 
 
-class GenomeDetailSerializer(serializers.ModelSerializer):
+class GenomeDetailSerializer(SparseModelSerializer):
     """Detailed serializer for genome."""
 
     class Meta:
@@ -186,7 +239,7 @@ class GenomeDetailSerializer(serializers.ModelSerializer):
         ]
 
 
-class GenomeListSerializer(serializers.ModelSerializer):
+class GenomeListSerializer(SparseModelSerializer):
     """Simplified serializer for genome list views."""
 
     class Meta:
@@ -194,7 +247,7 @@ class GenomeListSerializer(serializers.ModelSerializer):
         fields = ['upid', 'ncbi_id', 'scientific_name', 'kingdom', 'num_rfam_regions']
 
 
-class TaxonomySerializer(serializers.ModelSerializer):
+class TaxonomySerializer(SparseModelSerializer):
     """Serializer for taxonomy information."""
 
     class Meta:
@@ -202,7 +255,7 @@ class TaxonomySerializer(serializers.ModelSerializer):
         fields = ['ncbi_id', 'species', 'tax_string']
 
 
-class PdbSerializer(serializers.ModelSerializer):
+class PdbSerializer(SparseModelSerializer):
     """Serializer for PDB structures."""
 
     class Meta:
@@ -0,0 +1,187 @@
+"""
+Read-only SQLite snapshots of an Rfam release.
+
+A release never changes once published, so the tables behind the unmanaged
+models can be copied into a local SQLite file by `manage.py export_snapshot`
+and served from there (see `RFAM_SNAPSHOT_PATH` in settings) instead of
+querying the public MySQL server over the network.
+"""
+import datetime
+import decimal
+import os
+import sqlite3
+
+from django.apps import apps
+from django.utils import timezone
+
+from .db import stream_rows
+
+
+SNAPSHOT_FILENAME = 'rfam.sqlite3'
+
+# Tables holding per-sequence data or alignment blobs, which are much larger
+# than everything else together and only exported on request.
+LARGE_TABLES = {'full_region', 'seed_region', 'rfamseq', 'genseq', 'alignment_and_tree'}
+
+# Indexes for lookups on columns that are neither keys nor foreign keys.
+EXTRA_INDEXES = {
+    'family': [('rfam_id',)],
+    'clan': [('id',)],
+    'motif': [('motif_id',)],
+    'genome': [('ncbi_id',), ('assembly_acc',)],
+    'rfamseq': [('accession',)],
+    'genseq': [('upid', 'rfamseq_acc')],
+    'full_region': [
+        ('rfamseq_acc', 'is_significant', 'seq_start', 'seq_end', 'rfam_acc',
+         'bit_score', 'evalue_score', 'cm_start', 'cm_end', 'truncated', 'type'),
+    ],
+    'pdb_full_region': [('pdb_id',)],
+}
+
+# SQLite column types for fields that are not stored as integers or text
+COLUMN_TYPES = {
+    'FloatField': 'real',
+    'DecimalField': 'decimal',
+    'BooleanField': 'bool',
+    'DateTimeField': 'datetime',
+    'DateField': 'date',
+    'TimeField': 'time',
+    'BinaryField': 'blob',
+}
+
+INSERT_BATCH_SIZE = 5000
+
+
+def snapshot_models(include_large=False):
+    """
+    Get the unmanaged models backed by release tables, in table name order.
+    """
+    models = [
+        model for model in apps.get_app_config('api').get_models()
+        if not model._meta.managed and (include_large or model._meta.db_table not in LARGE_TABLES)
+    ]
+    return sorted(models, key=lambda model: model._meta.db_table)
+
+
+def _columns(model):
+    """
+    Get the concrete fields of a model that exist in the release database.
+
+    Implicit `id` primary keys added by Django for tables without a declared
+    key do not exist in the release schema and are left out.
+    """
+    return [field for field in model._meta.concrete_fields if not field.auto_created]
+
+
+def _column_type(field):
+    """Get the SQLite column type for a field."""
+    if field.is_relation:
+        field = field.target_field
+    internal_type = field.get_internal_type()
+    if 'Integer' in internal_type or 'AutoField' in internal_type:
+        return 'integer'
+    return COLUMN_TYPES.get(internal_type, 'text')
+
+
+def _adapt(value):
+    """
+    Convert a value read from the release database into the form Django's
+    SQLite backend stores it in.
+    """
+    if isinstance(value, datetime.datetime):
+        if timezone.is_aware(value):
+            value = timezone.make_naive(value, datetime.timezone.utc)
+        return value.isoformat(' ')
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def _create_table(conn, model):
+    """Create the table for a model, without any indexes."""
+    conn.execute('CREATE TABLE "{}" ({})'.format(
+        model._meta.db_table,
+        ', '.join(f'"{field.column}" {_column_type(field)}' for field in _columns(model)),
+    ))
+
+
+def _create_indexes(conn, model):
+    """
+    Index a model's keys, foreign keys and the columns in `EXTRA_INDEXES`.
+
+    Several models declare a primary key on a column that is not unique in
+    the release schema (e.g. `full_region.rfam_acc`), so keys are indexed
+    without a uniqueness constraint.
+    """
+    table = model._meta.db_table
+    fields = _columns(model)
+    indexes = [
+        (field.column,) for field in fields
+        if field.primary_key or field.is_relation or field.db_index
+    ]
+    indexes.extend(EXTRA_INDEXES.get(table, []))
+    for columns in dict.fromkeys(indexes):
+        name = '_'.join((table,) + columns)[:60] + '_idx'
+        conn.execute('CREATE INDEX "{}" ON "{}" ({})'.format(
+            name, table, ', '.join(f'"{column}"' for column in columns)
+        ))
+
+
+def _copy_rows(conn, model, using):
+    """Copy every row of a model's table from the database `using`."""
+    fields = _columns(model)
+    queryset = model.objects.using(using).order_by().values_list(
+        *[field.attname for field in fields]
+    )
+    insert = 'INSERT INTO "{}" VALUES ({})'.format(
+        model._meta.db_table, ', '.join('?' * len(fields))
+    )
+
+    count = 0
+    batch = []
+    for row in stream_rows(queryset):
+        batch.append(tuple(_adapt(value) for value in row))
+        if len(batch) >= INSERT_BATCH_SIZE:
+            conn.executemany(insert, batch)
+            count += len(batch)
+            batch = []
+    conn.executemany(insert, batch)
+    return count + len(batch)
+
+
+def export_snapshot(path, models, using='default', progress=None):
+    """
+    Copy the tables of `models` from the database `using` into a new SQLite
+    file at `path`.
+
+    Each table is filled before it is indexed, and the file is analysed at
+    the end so SQLite's planner has statistics.
+    The file is built under a temporary name and renamed into place.
+    `progress` is called with (table, row count) as each table completes.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    tmp_path.unlink(missing_ok=True)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        for model in models:
+            _create_table(conn, model)
+            count = _copy_rows(conn, model, using)
+            _create_indexes(conn, model)
+            conn.commit()
+            if progress:
+                progress(model._meta.db_table, count)
+        conn.execute('ANALYZE')
+        conn.commit()
+        conn.execute('PRAGMA journal_mode = DELETE')
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, path)
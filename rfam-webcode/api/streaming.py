@@ -0,0 +1,78 @@
+"""
+Streaming responses for list views.
+
+With `?output=ndjson` (or `Accept: application/x-ndjson`) a list view streams
+every row of its query, uncapped, as one JSON object per line. Rows are read
+from a server-side cursor and encoded as they arrive, so memory use does not
+grow with the size of the result.
+"""
+from django.http import StreamingHttpResponse
+
+from .db import stream_rows
+from .renderers import NDJSONRenderer
+
+
+# Size, in bytes, of the chunks written to the client
+CHUNK_SIZE = 64 * 1024
+
+
+def wants_stream(request):
+    """Check whether the negotiated format is NDJSON."""
+    renderer = getattr(request, 'accepted_renderer', None)
+    return getattr(renderer, 'format', None) == NDJSONRenderer.format
+
+
+def _chunks(lines):
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def serialized_rows(queryset, serializer_class, fields=None):
+    """
+    Iterate over the rows of `queryset` as `serializer_class` would render
+    its instances, limited to `fields` if given, reading only those fields
+    from the database.
+
+    The serializer's fields must map directly onto model fields; a
+    ValueError is raised here otherwise, before any row is read or any
+    response started.
+    """
+    fields = list(serializer_class(fields=fields).fields.items())
+    for name, field in fields:
+        if '.' in field.source or field.source == '*':
+            raise ValueError(f'{serializer_class.__name__}.{name} is not a model field')
+
+    columns = [field.source for _, field in fields]
+    converters = [(name, field.to_representation) for name, field in fields]
+    return _converted_rows(stream_rows(queryset.values_list(*columns)), converters)
+
+
+def _converted_rows(rows, converters):
+    for row in rows:
+        yield {
+            name: None if value is None else convert(value)
+            for (name, convert), value in zip(converters, row)
+        }
+
+
+def stream_ndjson(objects):
+    """Stream an iterator of JSON-serializable objects as NDJSON."""
+    lines = NDJSONRenderer().iter_lines(objects)
+    return StreamingHttpResponse(_chunks(lines), content_type=NDJSONRenderer.media_type)
+
+
+def stream_list(queryset, serializer_class, fields=None):
+    """
+    Stream the rows of `queryset`, serialized by `serializer_class` and
+    limited to `fields` if given, as NDJSON.
+    """
+    return stream_ndjson(serialized_rows(queryset, serializer_class, fields))
@@ -0,0 +1,112 @@
+"""
+Per-genome family summaries, precomputed at release time.
+
+The summary store is a SQLite file built by `manage.py build_genome_summary`
+with one row per (genome, family) pair, so a genome's breakdown is a single
+primary key range read instead of a scan over `full_region`.
+"""
+import os
+import sqlite3
+import threading
+
+from .release import index_path
+
+
+SUMMARY_FILENAME = 'genome_families.sqlite3'
+
+SCHEMA = """
+CREATE TABLE genome_family (
+    upid TEXT NOT NULL,
+    rfam_acc TEXT NOT NULL,
+    rfam_id TEXT NOT NULL,
+    num_hits INTEGER NOT NULL,
+    PRIMARY KEY (upid, rfam_acc)
+) WITHOUT ROWID
+"""
+
+_local = threading.local()
+
+
+def write_summary(path, rows):
+    """
+    Write (upid, rfam_acc, rfam_id, num_hits) rows to a new summary store at `path`.
+
+    The file is built under a temporary name and renamed into place.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    tmp_path.unlink(missing_ok=True)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute(SCHEMA)
+        count = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= 10000:
+                conn.executemany('INSERT INTO genome_family VALUES (?, ?, ?, ?)', batch)
+                count += len(batch)
+                batch = []
+        conn.executemany('INSERT INTO genome_family VALUES (?, ?, ?, ?)', batch)
+        count += len(batch)
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, path)
+    return count
+
+
+def _connection():
+    """
+    Get this thread's read-only connection to the current release's store.
+
+    Returns None if the store has not been built for the current release.
+    """
+    path = index_path(SUMMARY_FILENAME)
+    cached = getattr(_local, 'summary', None)
+    if cached and cached[0] == path:
+        return cached[1]
+
+    if cached:
+        cached[1].close()
+        _local.summary = None
+    if not path.exists():
+        return None
+
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, check_same_thread=False)
+    _local.summary = (path, conn)
+    return conn
+
+
+def genome_families(upid):
+    """
+    Get the families with hits in a genome and the number of hits for each.
+
+    Returns None when no summary has been built for the current release.
+    """
+    conn = _connection()
+    if conn is None:
+        return None
+
+    rows = conn.execute(
+        'SELECT rfam_acc, rfam_id, num_hits FROM genome_family WHERE upid = ? ORDER BY rfam_acc',
+        (upid,),
+    )
+    return [{'acc': acc, 'id': rfam_id, 'num_hits': num_hits} for acc, rfam_id, num_hits in rows]
+
+
+def iter_summary(path):
+    """
+    Iterate over the (upid, rfam_acc, rfam_id, num_hits) rows of a summary store.
+    """
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        yield from conn.execute(
+            'SELECT upid, rfam_acc, rfam_id, num_hits FROM genome_family ORDER BY upid, rfam_acc'
+        )
+    finally:
+        conn.close()
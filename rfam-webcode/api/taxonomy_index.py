@@ -0,0 +1,150 @@
+"""
+Species to families index over the taxonomy tree, built once per release.
+
+Species with Rfam hits are numbered in depth-first order of their lineage
+(`Taxonomy.tax_string` followed by the species name), so every taxon, e.g.
+'Archaea' or 'Drosophila', covers a contiguous range of species positions.
+
+Each family's set of species is a bitset over those positions, stored
+sparsely as sorted positions (like the array containers of a roaring
+bitmap). All families are packed into one sorted int64 key array of
+`family_index * num_species + position`. Taking the union of the bitsets
+under a subtree is then a range test per family, and two vectorised binary
+searches answer it for every family at once.
+"""
+import numpy as np
+
+from .arrays import load_arrays, save_arrays
+from .release import ReleaseCache, index_path
+
+
+INDEX_DIRNAME = 'taxonomy'
+
+_indexes = ReleaseCache(maxsize=1)
+
+
+def lineage(tax_string, species):
+    """
+    Split a tax_string such as 'Eukaryota; Metazoa; ... Drosophila.' into
+    its ranks, ending with the species name.
+    """
+    ranks = [rank.strip() for rank in (tax_string or '').rstrip('. ').split(';')]
+    return tuple(rank for rank in ranks if rank) + (species,)
+
+
+def build_index(path, species_lineages, family_species, family_ids):
+    """
+    Write a taxonomy index to the directory `path`.
+
+    `species_lineages` maps ncbi_id to a lineage tuple, `family_species` maps
+    rfam_acc to an iterable of ncbi_ids with hits and `family_ids` maps
+    rfam_acc to rfam_id.
+    """
+    ordered = sorted(species_lineages, key=lambda ncbi_id: species_lineages[ncbi_id])
+    position = {ncbi_id: i for i, ncbi_id in enumerate(ordered)}
+    num_species = len(ordered)
+
+    # Every lineage prefix is a taxon covering a contiguous run of positions.
+    spans = {}
+    for i, ncbi_id in enumerate(ordered):
+        ranks = species_lineages[ncbi_id]
+        for depth in range(len(ranks)):
+            node = ranks[:depth + 1]
+            if node in spans:
+                spans[node][1] = i + 1
+            else:
+                spans[node] = [i, i + 1]
+    nodes = sorted((node[-1].lower(), lo, hi) for node, (lo, hi) in spans.items())
+
+    accs = sorted(family_species)
+    keys = []
+    for family_index, acc in enumerate(accs):
+        positions = sorted({position[n] for n in family_species[acc] if n in position})
+        keys.extend(family_index * num_species + p for p in positions)
+
+    save_arrays(path, {
+        'family_accs': np.array(accs, dtype='U7'),
+        'family_ids': np.array([family_ids.get(acc, '') for acc in accs], dtype='U40'),
+        'keys': np.array(keys, dtype=np.int64),
+        'node_names': np.array([name for name, _, _ in nodes], dtype=str),
+        'node_lo': np.array([lo for _, lo, _ in nodes], dtype=np.int64),
+        'node_hi': np.array([hi for _, _, hi in nodes], dtype=np.int64),
+        'num_species': np.array([num_species], dtype=np.int64),
+    })
+    return len(keys)
+
+
+class TaxonomyIndex:
+    """
+    Read-only view of a taxonomy index directory.
+
+    Arrays are memory-mapped, so every worker shares the same pages.
+    """
+
+    def __init__(self, path):
+        arrays = load_arrays(path)
+        self.family_accs = arrays.family_accs
+        self.family_ids = arrays.family_ids
+        self.keys = arrays.keys
+        self.node_names = arrays.node_names
+        self.node_lo = arrays.node_lo
+        self.node_hi = arrays.node_hi
+        self.num_species = int(arrays.num_species[0])
+
+    def taxon_ranges(self, name):
+        """
+        Get the position ranges covered by every taxon called `name`.
+
+        Nested taxa with the same name (e.g. a genus and its subgenus) are
+        merged so no species is counted twice.
+        """
+        name = name.lower()
+        first = np.searchsorted(self.node_names, name, side='left')
+        last = np.searchsorted(self.node_names, name, side='right')
+
+        ranges = []
+        for lo, hi in sorted(zip(self.node_lo[first:last].tolist(), self.node_hi[first:last].tolist())):
+            if ranges and lo <= ranges[-1][1]:
+                ranges[-1][1] = max(ranges[-1][1], hi)
+            else:
+                ranges.append([lo, hi])
+        return ranges
+
+    def families_in_taxon(self, name):
+        """
+        Get the families with hits in any species under the taxon `name`.
+
+        Returns a list of dicts with the family accession, id and the number
+        of species in the taxon that it has hits in.
+        """
+        ranges = self.taxon_ranges(name)
+        if not ranges:
+            return []
+
+        offsets = np.arange(len(self.family_accs), dtype=np.int64) * self.num_species
+        counts = np.zeros(len(self.family_accs), dtype=np.int64)
+        for lo, hi in ranges:
+            counts += (
+                np.searchsorted(self.keys, offsets + hi, side='left')
+                - np.searchsorted(self.keys, offsets + lo, side='left')
+            )
+
+        matches = np.flatnonzero(counts)
+        return [
+            {'acc': acc, 'id': rfam_id, 'num_species': num_species}
+            for acc, rfam_id, num_species in zip(
+                self.family_accs[matches].tolist(),
+                self.family_ids[matches].tolist(),
+                counts[matches].tolist(),
+            )
+        ]
+
+
+def get_taxonomy_index():
+    """
+    Get the taxonomy index for the current release, or None if not built.
+    """
+    path = index_path(INDEX_DIRNAME)
+    if not path.exists():
+        return None
+    return _indexes.get_or_build(path, lambda: TaxonomyIndex(path))
@@ -1,3 +1,452 @@
-from django.test import TestCase
+import datetime
+import gzip
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+from urllib.parse import unquote
 
-# Create your tests here.
+import numpy as np
+from django.core.management import call_command
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from rest_framework.request import Request
+
+from . import release, views
+from .cache import get_cache
+from .compression import compress_chunks, negotiate_coding
+from .export import export_columns, tsv_lines
+from .filecache import LockedChunks, cached_file_response, lock_file
+from .genome_matrix import GenomeMatrix
+from .gff import _escape
+from .intervals import IntervalIndex
+from .middleware import ReleaseGenerationMiddleware
+from .models import Clan, Family, Motif
+from .ranges import parse_range, range_response
+from .release_index import ReleaseIndex, entry_sections, family_sections, taxonomy_sections, write_index
+from .release import Generation, activate_generation
+from .renderers import RfamJSONRenderer, RfamXMLRenderer
+from .serializers import ClanDetailSerializer, ClanListSerializer, FamilyListSerializer
+from .streaming import CHUNK_SIZE, _chunks, serialized_rows, stream_list
+from .views import MAX_RELATED, MAX_WINDOWS, _parse_related_params, _parse_windows
+
+
+class IntervalIndexTests(SimpleTestCase):
+    """Overlap queries against the sequence hit interval index."""
+
+    def setUp(self):
+        self.index = IntervalIndex([
+            (100, 220, 'a'),
+            (5000, 4880, 'reverse'),
+            (300, 376, 'b'),
+            (1000, 2500, 'long'),
+            (1200, 1300, 'nested'),
+        ])
+
+    def test_overlapping_returns_hits_in_start_order(self):
+        self.assertEqual(self.index.overlapping(150, 1250), ['a', 'b', 'long', 'nested'])
+
+    def test_reverse_strand_hits_are_found(self):
+        self.assertEqual(self.index.overlapping(4900, 4950), ['reverse'])
+        self.assertEqual(self.index.overlapping(4950, 4900), ['reverse'])
+
+    def test_touching_boundaries_overlap(self):
+        self.assertEqual(self.index.overlapping(220, 220), ['a'])
+        self.assertEqual(self.index.overlapping(2501, 4879), [])
+
+    def test_batched_windows(self):
+        self.assertEqual(
+            self.index.overlapping_many([(1, 99), (1250, 1250)]),
+            [[], ['long', 'nested']],
+        )
+
+    def test_empty_index(self):
+        self.assertEqual(IntervalIndex([]).overlapping(1, 10), [])
+
+
+class RfamJSONRendererTests(SimpleTestCase):
+    """JSON output matching DRF's JSONRenderer."""
+
+    def test_non_finite_floats_fail_as_with_drf(self):
+        renderer = RfamJSONRenderer()
+        self.assertEqual(renderer.render({'n': None, 'score': 1.5}), b'{"n":null,"score":1.5}')
+        for value in (float('nan'), float('inf')):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                renderer.render({'families': [{'gathering_cutoff': value}]})
+
+
+class WindowParsingTests(SimpleTestCase):
+    """Coordinate windows given to /accession/{acc}."""
+
+    def windows(self, **params):
+        return _parse_windows(Request(RequestFactory().get('/accession/X', params)))
+
+    def test_windows(self):
+        self.assertEqual(self.windows(windows='1-100, 500-900,'), [(1, 100), (500, 900)])
+        self.assertEqual(self.windows(seq_start='10'), [(10, 10)])
+        self.assertIsNone(self.windows())
+
+    def test_invalid_windows_are_rejected(self):
+        for windows in ('100', '9-1', '1-2-3', 'a-b', ','.join(['1-2'] * (MAX_WINDOWS + 1))):
+            with self.subTest(windows=windows[:20]), self.assertRaises(ValueError):
+                self.windows(windows=windows)
+
+
+class RelatedParamsTests(SimpleTestCase):
+    """Query parameters of /family/{acc}/related."""
+
+    def params(self, **params):
+        return _parse_related_params(Request(RequestFactory().get('/family/X/related', params)))
+
+    def test_params(self):
+        self.assertEqual(self.params(), (0.0, 20))
+        self.assertEqual(self.params(min_similarity='0.5', limit='5'), (0.5, 5))
+        self.assertEqual(self.params(limit='1000'), (0.0, MAX_RELATED))
+
+    def test_invalid_params_are_rejected(self):
+        for params in ({'limit': '0'}, {'limit': '-1'}, {'limit': 'x'},
+                       {'min_similarity': 'nan'}, {'min_similarity': 'inf'}):
+            with self.subTest(**params), self.assertRaises(ValueError):
+                self.params(**params)
+
+
+class GenomesListTests(SimpleTestCase):
+    """Comparative queries on /genomes."""
+
+    def get(self, query, kingdom=None):
+        matrix = mock.Mock(**{'shared_families.return_value': ([('RF00001', '5S_rRNA')], [])})
+        with mock.patch.object(views, 'get_genome_matrix', return_value=matrix):
+            request = RequestFactory().get(f'/genomes?{query}')
+            return views.GenomesListView.as_view()(request, kingdom=kingdom)
+
+    def test_shared_with_ignores_fields(self):
+        response = self.get('shared_with=UP1,UP2&fields=nonsense')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['families'], [{'acc': 'RF00001', 'id': '5S_rRNA'}])
+
+    def test_shared_with_cannot_be_combined_with_genome_filters(self):
+        self.assertEqual(self.get('shared_with=UP1&families=RF00001').status_code, 400)
+        self.assertEqual(self.get('shared_with=UP1', kingdom='bacteria').status_code, 400)
+
+
+class RfamXMLRendererTests(SimpleTestCase):
+    """Output of the incremental XML renderer."""
+
+    ROOT = (
+        '<rfam xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns="https://rfam.org/" '
+        'xsi:schemaLocation="https://rfam.org/ https://rfam.org/static/documents/schemas/entry.xsd" '
+        'release="15.0" release_date=""'
+    )
+
+    def setUp(self):
+        self.renderer = RfamXMLRenderer()
+
+    def test_generic_data_is_indented_like_minidom(self):
+        data = {'release': {'number': '15.0'}, 'families': [{'id': 'a "b" & <c>\r\n', 'num': None}, {}]}
+        self.assertEqual(self.renderer.render(data), (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'{self.ROOT}>\n'
+            '  <release>\n'
+            '    <number>15.0</number>\n'
+            '  </release>\n'
+            '  <families>\n'
+            '    <item>\n'
+            '      <id>a &quot;b&quot; &amp; &lt;c&gt;\n</id>\n'
+            '      <num/>\n'
+            '    </item>\n'
+            '    <item/>\n'
+            '  </families>\n'
+            '</rfam>\n'
+        ))
+
+    def test_documents_that_do_not_parse_are_not_indented(self):
+        data = {'release': {'number': '15.0'}, 'bad key': 'x\x01'}
+        self.assertEqual(
+            self.renderer.render(data),
+            f'<?xml version="1.0" encoding="UTF-8"?>\n{self.ROOT}>'
+            '<release><number>15.0</number></release><bad key>x\x01</bad key></rfam>',
+        )
+
+    def test_iter_render_matches_render(self):
+        data = {'release': {'number': '15.0'}, 'items': [{'n': i} for i in range(20000)]}
+        self.assertEqual(''.join(self.renderer.iter_render(data)), self.renderer.render(data))
+
+
+class GFFTests(SimpleTestCase):
+    """GFF3 attribute escaping."""
+
+    def test_reserved_characters_are_escaped(self):
+        self.assertEqual(
+            _escape('tRNA, mitochondrial; a=b & c\t100%'),
+            'tRNA%2C mitochondrial%3B a%3Db %26 c%09100%25',
+        )
+
+
+class ExportTests(SimpleTestCase):
+    """TSV lines written by the bulk table exports."""
+
+    def test_rows_stay_on_one_line(self):
+        fields = export_columns(Clan)[:3]
+        rows = [('CL00001', 'a\tb', 'line 1\r\nline 2 \\n'), ('CL00002', None, True)]
+        self.assertEqual(list(tsv_lines(fields, rows)), [
+            '#clan_acc\tid\tprevious_id\n',
+            'CL00001\ta\\tb\tline 1\\r\\nline 2 \\\\n\n',
+            'CL00002\t\t1\n',
+        ])
+
+    def test_datetimes_are_written_in_utc(self):
+        fields = export_columns(Clan)[-1:]
+        updated = datetime.datetime(2024, 1, 1, 12, tzinfo=datetime.timezone(datetime.timedelta(hours=2)))
+        self.assertEqual(list(tsv_lines(fields, [(updated,)]))[1], '2024-01-01 10:00:00\n')
+
+
+class BuildLockTests(SimpleTestCase):
+    """Build locks for cached files generated on request."""
+
+    def setUp(self):
+        patcher = mock.patch('api.filecache.current_release', return_value='15.0')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(get_cache().clear)
+        self.path = Path('/cache/15.0/export/families.parquet')
+
+    def test_one_request_holds_the_build_lock(self):
+        unlock = lock_file(self.path)
+        self.assertIsNotNone(unlock)
+        self.assertIsNone(lock_file(self.path))
+        self.assertIsNotNone(lock_file(self.path.with_name('clans.parquet')))
+        unlock()
+        self.assertIsNotNone(lock_file(self.path))
+
+    def test_streamed_build_releases_the_lock(self):
+        chunks = LockedChunks(iter([b'a', b'b']), lock_file(self.path))
+        self.assertEqual(b''.join(chunks), b'ab')
+        self.assertIsNotNone(lock_file(self.path))
+
+    def test_unread_build_releases_the_lock_on_close(self):
+        path = self.path.with_name('UP1.gff3')
+        LockedChunks(iter([b'a']), lock_file(path)).close()
+        self.assertIsNotNone(lock_file(path))
+
+
+class SparseFieldsTests(SimpleTestCase):
+    """Serializers limited to the fields asked for with ?fields=."""
+
+    def setUp(self):
+        self.family = Family(rfam_acc='RF00001', rfam_id='5S_rRNA', description='5S', num_full=712)
+
+    def test_fields_keep_serializer_order(self):
+        serializer = FamilyListSerializer([self.family], many=True, fields=['num_full', 'acc'])
+        self.assertEqual(serializer.data, [{'acc': 'RF00001', 'num_full': 712}])
+
+    def test_model_columns_follow_sources(self):
+        self.assertEqual(FamilyListSerializer.model_columns(['id', 'num_full']), ['rfam_id', 'num_full'])
+        self.assertEqual(ClanDetailSerializer.model_columns(['id', 'members']), ['id', 'clan_acc'])
+
+
+class StreamingTests(SimpleTestCase):
+    """NDJSON streaming of list views."""
+
+    def test_chunks_group_lines(self):
+        lines = [b'x' * 1000 + b'\n'] * 150
+        chunks = list(_chunks(iter(lines)))
+        self.assertEqual(b''.join(chunks), b''.join(lines))
+        self.assertTrue(all(len(chunk) >= CHUNK_SIZE for chunk in chunks[:-1]))
+        self.assertEqual(list(_chunks(iter([]))), [])
+
+    def test_rows_are_converted_like_the_serializer(self):
+        queryset = mock.Mock()
+        rows = [('CL00001', 'tRNA'), ('CL00002', None)]
+        with mock.patch('api.streaming.stream_rows', return_value=iter(rows)):
+            result = list(serialized_rows(queryset, ClanListSerializer, ['acc', 'description']))
+        queryset.values_list.assert_called_once_with('clan_acc', 'description')
+        self.assertEqual(result, [
+            {'acc': 'CL00001', 'description': 'tRNA'},
+            {'acc': 'CL00002', 'description': None},
+        ])
+
+    def test_non_model_fields_fail_before_streaming(self):
+        with mock.patch('api.streaming.stream_rows') as stream_rows:
+            with self.assertRaises(ValueError):
+                stream_list(mock.Mock(), ClanDetailSerializer)
+        stream_rows.assert_not_called()
+
+
+class CompressionTests(SimpleTestCase):
+    """Content coding negotiation and incremental compression."""
+
+    def coding(self, accept_encoding):
+        return negotiate_coding(RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding))
+
+    def test_negotiation_honours_q_values(self):
+        self.assertEqual(self.coding('deflate, gzip;q=0.5'), 'gzip')
+        self.assertIsNone(self.coding('gzip;q=0, deflate'))
+        self.assertIsNone(self.coding(''))
+
+    def test_streamed_chunks_decompress_to_input(self):
+        chunks = [f'line {i}\n'.encode() * 50 for i in range(500)]
+        self.assertEqual(gzip.decompress(b''.join(compress_chunks(chunks, 'gzip'))), b''.join(chunks))
+
+
+class AccelRedirectTests(SimpleTestCase):
+    """Cached files handed to nginx with X-Accel-Redirect."""
+
+    PREFIX = '/protected-cache/'
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache_dir = Path(tmp.name)
+        self.path = self.cache_dir / '15.0' / 'gff' / 'UP 1.gff3'
+        self.path.parent.mkdir(parents=True)
+        self.path.write_bytes(b'##gff-version 3\n')
+
+    def nginx_file(self, response):
+        """Resolve X-Accel-Redirect as the `internal` location aliased to the cache does."""
+        uri = response['X-Accel-Redirect']
+        self.assertTrue(uri.startswith(self.PREFIX))
+        return self.cache_dir / unquote(uri[len(self.PREFIX):])
+
+    def test_cached_file_is_handed_to_nginx(self):
+        with override_settings(RFAM_CACHE_DIR=self.cache_dir, RFAM_ACCEL_REDIRECT_PREFIX=self.PREFIX):
+            response = cached_file_response(self.path, 'text/x-gff3', 'UP 1.gff3')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-cache/15.0/gff/UP%201.gff3')
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="UP 1.gff3"')
+        self.assertEqual(self.nginx_file(response).read_bytes(), b'##gff-version 3\n')
+
+    def test_files_are_streamed_without_prefix_or_outside_the_cache(self):
+        outside = tempfile.NamedTemporaryFile(suffix='.gff3')
+        self.addCleanup(outside.close)
+        for prefix, path in (('', self.path), (self.PREFIX, Path(outside.name))):
+            with override_settings(RFAM_CACHE_DIR=self.cache_dir, RFAM_ACCEL_REDIRECT_PREFIX=prefix):
+                response = cached_file_response(path, 'text/x-gff3', 'UP1.gff3')
+            self.addCleanup(response.close)
+            self.assertFalse(response.has_header('X-Accel-Redirect'))
+            self.assertTrue(response.streaming)
+
+
+class RangeTests(SimpleTestCase):
+    """Range requests on file-backed downloads."""
+
+    def setUp(self):
+        tmp = tempfile.NamedTemporaryFile(suffix='.tsv')
+        self.addCleanup(tmp.close)
+        tmp.write(b'0123456789' * 10)
+        tmp.flush()
+        self.path = tmp.name
+
+    def get(self, **headers):
+        with override_settings(RFAM_ACCEL_REDIRECT_PREFIX=''):
+            response = cached_file_response(self.path, 'text/tab-separated-values', 'families.tsv')
+        self.addCleanup(response.close)
+        request = RequestFactory().get('/export/families', **headers)
+        return range_response(request, response) or response
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=10-19', 100), (10, 19))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-5', 100), (95, 99))
+        self.assertEqual(parse_range('bytes=95-200', 100), (95, 99))
+        self.assertEqual(parse_range('bytes=100-', 100), ())
+        self.assertIsNone(parse_range('bytes=0-1, 5-6', 100))
+        self.assertIsNone(parse_range('bytes=9-1', 100))
+        self.assertIsNone(parse_range('lines=1-2', 100))
+
+    def test_slice_is_read_from_the_file(self):
+        response = self.get(HTTP_RANGE='bytes=25-34')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 25-34/100')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="families.tsv"')
+        self.assertEqual(b''.join(response.streaming_content), b'5678901234')
+
+    def test_unsatisfiable_range(self):
+        response = self.get(HTTP_RANGE='bytes=100-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+
+    def test_if_range_needs_the_file_date(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        last_modified = response['Last-Modified']
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=last_modified).status_code, 206)
+        self.assertEqual(
+            self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='Mon, 01 Jan 2024 00:00:00 GMT').status_code, 200,
+        )
+
+
+class ReleaseGenerationTests(SimpleTestCase):
+    """Requests counted against the release generation they started on."""
+
+    def setUp(self):
+        patcher = mock.patch.object(release, '_generation', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.generation = Generation('15.0')
+        activate_generation(self.generation)
+
+    def respond(self):
+        middleware = ReleaseGenerationMiddleware(lambda request: StreamingHttpResponse(iter([b'a', b'b'])))
+        with override_settings(RFAM_RELEASE_WATCHER=False):
+            return middleware(RequestFactory().get('/'))
+
+    def test_streamed_response_holds_generation_until_read(self):
+        response = self.respond()
+        self.assertEqual(self.generation.requests, 1)
+        self.assertEqual(b''.join(response.streaming_content), b'ab')
+        self.assertEqual(self.generation.requests, 0)
+        response.close()
+        self.assertEqual(self.generation.requests, 0)
+
+    def test_unread_response_releases_generation_on_close(self):
+        response = self.respond()
+        response.close()
+        self.assertEqual(self.generation.requests, 0)
+
+
+
+class BenchmarkCommandTests(SimpleTestCase):
+    """Smoke tests for the renderer benchmark commands."""
+
+    def test_json_benchmark_runs_list_handlers(self):
+        out = StringIO()
+        with mock.patch.object(Clan, 'objects'), mock.patch.object(Motif, 'objects'):
+            call_command('benchmark_json_renderer', repeat=1, stdout=out)
+        self.assertIn('clans', out.getvalue())
+        self.assertIn('motifs', out.getvalue())
+
+
+class GenomeMatrixLookupTests(SimpleTestCase):
+    """Accession lookups in the genome x family matrix."""
+
+    def test_longer_values_are_not_truncated_into_matches(self):
+        keys = np.array(['RF00001', 'RF00005'], dtype='U7')
+        found, unknown = GenomeMatrix._lookup(keys, ['RF00001XYZ', 'RF00005', 'RF9'])
+        self.assertEqual(found.tolist(), [1])
+        self.assertEqual(unknown, ['RF00001XYZ', 'RF9'])
+
+
+class ReleaseIndexTests(SimpleTestCase):
+    """Building and reading the memory-mapped release index."""
+
+    def test_families_without_an_id_are_searchable_by_type(self):
+        sections = family_sections([
+            ('RF00002', '5_8S_rRNA', '5.8S ribosomal RNA', 'Gene; rRNA;', 10, 20),
+            ('RF00003', '', 'No id yet', 'Gene; rRNA;', None, None),
+            ('RF00001', '5S_rRNA', '5S ribosomal RNA', 'Gene; rRNA;', 30, 40),
+        ])
+        self.assertEqual(sorted(sections['family.type_ranks'].tolist()), [0, 1, 2])
+        sections.update(entry_sections('clan', []))
+        sections.update(entry_sections('motif', []))
+        sections.update(taxonomy_sections([]))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'release.idx'
+            write_index(path, sections)
+            index = ReleaseIndex(path)
+            results = index.families.search_type('rrna')
+            self.assertEqual([r['acc'] for r in results], ['RF00003', 'RF00002', 'RF00001'])
+            self.assertEqual(results[0]['id'], '')
+            del results, index
@@ -26,15 +26,16 @@ urlpatterns = [
     path('family/<str:entry>/regions', views.FamilyRegionsView.as_view(), name='family-regions'),
     path('family/<str:entry>/refseq', views.FamilyRegionsView.as_view(), name='family-refseq'),
     path('family/<str:entry>/structures', views.FamilyStructuresView.as_view(), name='family-structures'),
+    path('family/<str:entry>/related', views.FamilyRelatedView.as_view(), name='family-related'),
     path('family/<str:entry>/thumbnail', views.FamilyThumbnailView.as_view(), name='family-thumbnail'),
     path('family/<str:entry>/image/<str:image_type>', views.FamilyImageView.as_view(), name='family-image'),
 
     # Families browse
     path('families', views.FamiliesListView.as_view(), name='families'),
     path('families/', views.FamiliesListView.as_view(), name='families-slash'),
-    path('families/<str:letter>', views.FamiliesListView.as_view(), name='families-letter'),
     path('families/with_structure', views.FamiliesWithStructureView.as_view(), name='families-with-structure'),
     path('families/top20', views.FamiliesTop20View.as_view(), name='families-top20'),
+    path('families/<str:letter>', views.FamiliesListView.as_view(), name='families-letter'),
 
     # Clan endpoints
     path('clan/<str:entry>', views.ClanView.as_view(), name='clan'),
@@ -60,6 +61,12 @@ urlpatterns = [
     path('genomes/', views.GenomesListView.as_view(), name='genomes-slash'),
     path('genomes/<str:kingdom>', views.GenomesListView.as_view(), name='genomes-kingdom'),
 
+    # Bulk exports
+    path('export/families', views.FamiliesExportView.as_view(), name='export-families'),
+    path('export/clans', views.ClansExportView.as_view(), name='export-clans'),
+    path('export/genomes', views.GenomesExportView.as_view(), name='export-genomes'),
+    path('export/regions/<str:entry>', views.RegionsExportView.as_view(), name='export-regions'),
+
     # Sequence endpoints
     path('sequence', views.SequenceView.as_view(), name='sequence'),
     path('sequence/', views.SequenceView.as_view(), name='sequence-slash'),
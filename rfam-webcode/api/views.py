@@ -1,18 +1,27 @@
 """
 Views for the Rfam API endpoints.
 """
+import math
+import os
+import re
+from itertools import groupby
+from operator import itemgetter
+
 from django.shortcuts import get_object_or_404, render, redirect
-from django.http import Http404, HttpResponse
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.db.models import Q
 from django.conf import settings
 from django.core.mail import EmailMessage
+from django.utils.http import content_disposition_header
 from rest_framework import status
+from rest_framework.exceptions import ParseError
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.renderers import JSONRenderer, TemplateHTMLRenderer
 
 from .models import (
-    Family, Clan, ClanMembership, Motif, Genome, Taxonomy, DbVersion, Pdb
+    Family, Clan, ClanMembership, Motif, Genome, Taxonomy, DbVersion, Pdb,
+    FullRegion, Rfamseq,
 )
 from .serializers import (
     FamilyDetailSerializer, FamilyListSerializer,
@@ -22,6 +31,35 @@ from .serializers import (
 )
 from .renderers import RfamXMLRenderer
 from .forms import AlignmentSubmissionForm
+from .cache import cache_rendered_response, cache_response_data
+from .conditional import conditional_get, entry_updated
+from .export import (
+    EXPORT_FORMATS, available_formats, build_export, export_filename, export_path,
+    stream_tsv_export,
+)
+from .filecache import (
+    BUILD_RETRY_AFTER, LockedChunks, batch_lines, cache_path, cached_file_response, gzip_chunks,
+    lock_file, wait_for_file, write_through,
+)
+from .genome_matrix import get_genome_matrix
+from .gff import iter_gff3
+from .intervals import IntervalIndex
+from .proxy import fetch_upstream, proxy_response
+from .related import get_related_families
+from .release import ReleaseCache, release_status
+from .release_index import get_release_index
+from .resolver import get_resolver
+from .streaming import stream_list, wants_stream
+from .summaries import genome_families
+from .taxonomy_index import get_taxonomy_index
+from .warmup import memory_usage
+from .watcher import watcher_status
+
+
+_family_updated = entry_updated(Family, 'entry', 'rfam_acc', 'rfam_id')
+_clan_updated = entry_updated(Clan, 'entry', 'clan_acc', 'id')
+_motif_updated = entry_updated(Motif, 'entry', 'motif_acc', 'motif_id')
+_genome_updated = entry_updated(Genome, 'ncbi_id', 'ncbi_id')
 
 
 class FamilyView(APIView):
@@ -32,6 +70,7 @@ class FamilyView(APIView):
     """
     entity_type = 'family'
 
+    @conditional_get(_family_updated)
     def get(self, request, entry):
         """
         Get family by accession (RF00001) or ID (5S_rRNA).
@@ -46,12 +85,12 @@ class FamilyView(APIView):
         params = {'content-type': content_type}
 
         try:
-            resp = requests_lib.get(url, params=params, timeout=30)
+            resp = fetch_upstream(url, params=params, timeout=30)
             if resp.status_code == 200:
                 if 'xml' in content_type:
-                    return HttpResponse(resp.content, content_type='text/xml')
+                    return proxy_response(request, resp, 'text/xml')
                 else:
-                    return HttpResponse(resp.content, content_type='application/json')
+                    return proxy_response(request, resp, 'application/json')
             elif resp.status_code == 404:
                 raise Http404(f"Family '{entry}' not found")
             else:
@@ -65,6 +104,7 @@ class FamiliesListView(APIView):
     View for listing/browsing families.
     """
 
+    @cache_rendered_response()
     def get(self, request, letter=None):
         """
         List families, optionally filtered by starting letter.
@@ -74,9 +114,13 @@ class FamiliesListView(APIView):
         if letter:
             families = families.filter(rfam_id__istartswith=letter)
 
-        families = families.order_by('rfam_id')[:100]  # Limit for performance
+        fields = _requested_fields(request, FamilyListSerializer)
+        families = families.order_by('rfam_id')
+        if wants_stream(request):
+            return stream_list(families, FamilyListSerializer, fields)
+        families = FamilyListSerializer.project(families, fields)[:100]  # Limit for performance
 
-        serializer = FamilyListSerializer(families, many=True)
+        serializer = FamilyListSerializer(families, many=True, fields=fields)
         return Response({'families': serializer.data})
 
 
@@ -85,12 +129,17 @@ class FamiliesWithStructureView(APIView):
     View for listing families with 3D structures.
     """
 
+    @cache_rendered_response()
     def get(self, request):
+        fields = _requested_fields(request, FamilyListSerializer)
         families = Family.objects.filter(
             number_3d_structures__gt=0
-        ).order_by('-number_3d_structures')[:100]
+        ).order_by('-number_3d_structures')
+        if wants_stream(request):
+            return stream_list(families, FamilyListSerializer, fields)
+        families = FamilyListSerializer.project(families, fields)[:100]
 
-        serializer = FamilyListSerializer(families, many=True)
+        serializer = FamilyListSerializer(families, many=True, fields=fields)
         return Response({'families': serializer.data})
 
 
@@ -99,10 +148,15 @@ class FamiliesTop20View(APIView):
     View for listing top 20 largest families by number of sequences.
     """
 
+    @cache_rendered_response()
     def get(self, request):
+        fields = _requested_fields(request, FamilyListSerializer)
         families = Family.objects.order_by('-num_full')[:20]
+        if wants_stream(request):
+            return stream_list(families, FamilyListSerializer, fields)
 
-        serializer = FamilyListSerializer(families, many=True)
+        families = FamilyListSerializer.project(families, fields)
+        serializer = FamilyListSerializer(families, many=True, fields=fields)
         return Response({'families': serializer.data})
 
 
@@ -113,6 +167,7 @@ class FamilyAlignmentView(APIView):
     Supports multiple formats: stockholm (default), pfam, fasta, fastau
     """
 
+    @conditional_get(_family_updated)
     def get(self, request, entry, aln_format=None):
         """
         Get family alignment in various formats.
@@ -135,11 +190,11 @@ class FamilyAlignmentView(APIView):
             params['gzip'] = '1'
 
         try:
-            resp = requests_lib.get(url, params=params, timeout=60)
+            resp = fetch_upstream(url, params=params, timeout=60)
             if resp.status_code == 200:
                 # Determine content type from response
                 resp_content_type = resp.headers.get('content-type', 'text/plain')
-                return HttpResponse(resp.content, content_type=resp_content_type)
+                return proxy_response(request, resp, resp_content_type)
             elif resp.status_code == 404:
                 raise Http404(f"Alignment not found for '{entry}'")
             else:
@@ -154,6 +209,7 @@ class FamilyTreeView(APIView):
     Returns Newick format tree proxied from production.
     """
 
+    @conditional_get(_family_updated)
     def get(self, request, entry, subtype=None):
         import requests as requests_lib
 
@@ -167,9 +223,9 @@ class FamilyTreeView(APIView):
         # Proxy tree from production
         try:
             url = f'https://rfam.org/family/{family.rfam_acc}/tree/'
-            resp = requests_lib.get(url, timeout=30)
+            resp = fetch_upstream(url, timeout=30)
             if resp.status_code == 200:
-                return HttpResponse(resp.content, content_type='text/plain')
+                return proxy_response(request, resp, 'text/plain')
             else:
                 raise Http404(f"Tree not found for {family.rfam_acc}")
 
@@ -182,6 +238,7 @@ class FamilyCMView(APIView):
     View for family covariance model download.
     """
 
+    @conditional_get(_family_updated)
     def get(self, request, entry):
         family = Family.objects.filter(
             Q(rfam_acc=entry) | Q(rfam_id=entry)
@@ -202,6 +259,7 @@ class FamilyRegionsView(APIView):
     Proxies from production to ensure exact matching.
     """
 
+    @conditional_get(_family_updated)
     def get(self, request, entry):
         import requests as requests_lib
 
@@ -215,12 +273,12 @@ class FamilyRegionsView(APIView):
             params['content-type'] = content_type_param
 
         try:
-            resp = requests_lib.get(url, params=params, timeout=60)
+            resp = fetch_upstream(url, params=params, timeout=60)
             if resp.status_code == 200:
                 if 'xml' in content_type_param:
-                    return HttpResponse(resp.content, content_type='text/xml')
+                    return proxy_response(request, resp, 'text/xml')
                 else:
-                    return HttpResponse(resp.content, content_type='text/plain')
+                    return proxy_response(request, resp, 'text/plain')
             elif resp.status_code == 404:
                 raise Http404(f"Family '{entry}' not found")
             else:
@@ -235,6 +293,7 @@ class FamilyStructuresView(APIView):
     Proxies from production to ensure exact matching.
     """
 
+    @conditional_get(_family_updated)
     def get(self, request, entry):
         import requests as requests_lib
 
@@ -246,12 +305,12 @@ class FamilyStructuresView(APIView):
         params = {'content-type': content_type_param}
 
         try:
-            resp = requests_lib.get(url, params=params, timeout=30)
+            resp = fetch_upstream(url, params=params, timeout=30)
             if resp.status_code == 200:
                 if 'xml' in content_type_param:
-                    return HttpResponse(resp.content, content_type='text/xml')
+                    return proxy_response(request, resp, 'text/xml')
                 else:
-                    return HttpResponse(resp.content, content_type='application/json')
+                    return proxy_response(request, resp, 'application/json')
             elif resp.status_code == 404:
                 raise Http404(f"Family '{entry}' not found")
             else:
@@ -265,6 +324,7 @@ class FamilyThumbnailView(APIView):
     View for family thumbnail image.
     """
 
+    @conditional_get(_family_updated)
     def get(self, request, entry):
         family = Family.objects.filter(
             Q(rfam_acc=entry) | Q(rfam_id=entry)
@@ -283,15 +343,14 @@ class FamilyAccView(APIView):
     Returns just the accession as plain text.
     """
 
+    @conditional_get(_family_updated)
     def get(self, request, entry):
-        family = Family.objects.filter(
-            Q(rfam_acc=entry) | Q(rfam_id=entry)
-        ).first()
+        rfam_acc = get_resolver().families.resolve(entry)
 
-        if not family:
+        if not rfam_acc:
             raise Http404(f"Family '{entry}' not found")
 
-        return HttpResponse(family.rfam_acc, content_type='text/plain')
+        return HttpResponse(rfam_acc, content_type='text/plain')
 
 
 class FamilyIdView(APIView):
@@ -300,15 +359,73 @@ class FamilyIdView(APIView):
     Returns just the ID as plain text.
     """
 
+    @conditional_get(_family_updated)
     def get(self, request, entry):
-        family = Family.objects.filter(
-            Q(rfam_acc=entry) | Q(rfam_id=entry)
-        ).first()
+        families = get_resolver().families
+        rfam_acc = families.resolve(entry)
 
-        if not family:
+        if not rfam_acc:
             raise Http404(f"Family '{entry}' not found")
 
-        return HttpResponse(family.rfam_id, content_type='text/plain')
+        return HttpResponse(families.entry_id(rfam_acc), content_type='text/plain')
+
+
+MAX_RELATED = 100
+
+
+def _parse_related_params(request):
+    """
+    Get the (min_similarity, limit) requested for related families.
+
+    Raises ValueError with a message for the client if they are invalid.
+    """
+    try:
+        min_similarity = float(request.query_params.get('min_similarity', 0.0))
+        limit = int(request.query_params.get('limit', 20))
+    except ValueError:
+        raise ValueError('Invalid min_similarity or limit') from None
+    if not math.isfinite(min_similarity):
+        raise ValueError('min_similarity must be a finite number')
+    if limit < 1:
+        raise ValueError('limit must be at least 1')
+    return min_similarity, min(limit, MAX_RELATED)
+
+
+class FamilyRelatedView(APIView):
+    """
+    View for families that co-occur with a family across genomes.
+    Answered from the release's MinHash LSH index
+    (`manage.py build_related_families`) with estimated Jaccard similarity.
+    """
+
+    @conditional_get(_family_updated)
+    def get(self, request, entry):
+        index = get_related_families()
+        if index is None:
+            return Response(
+                {'error': 'Related families are not available for this release'},
+                status=503,
+            )
+
+        rfam_acc = get_resolver().families.resolve(entry)
+        family = index.find(rfam_acc) if rfam_acc else None
+        if family is None:
+            raise Http404(f"Family '{entry}' not found")
+
+        try:
+            min_similarity, limit = _parse_related_params(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+
+        related = index.related(family, min_similarity=min_similarity, limit=limit)
+        return Response({
+            'acc': str(index.accs[family]),
+            'id': str(index.family_ids[family]),
+            'related': [
+                {'acc': acc, 'id': rfam_id, 'similarity': similarity}
+                for acc, rfam_id, similarity in related
+            ],
+        })
 
 
 class FamilyImageView(APIView):
@@ -317,6 +434,7 @@ class FamilyImageView(APIView):
     Proxies images from the production Rfam server.
     """
 
+    @conditional_get(_family_updated)
     def get(self, request, entry, image_type):
         import requests as requests_lib
 
@@ -337,9 +455,9 @@ class FamilyImageView(APIView):
         url = f'https://rfam.org/family/{family.rfam_acc}/image/{image_type}'
 
         try:
-            resp = requests_lib.get(url, timeout=30)
+            resp = fetch_upstream(url, timeout=30)
             if resp.status_code == 200:
-                return HttpResponse(resp.content, content_type='image/svg+xml')
+                return proxy_response(request, resp, 'image/svg+xml')
             else:
                 raise Http404(f"Image not found for {family.rfam_acc}")
         except Exception:
@@ -352,6 +470,7 @@ class FamilyTreeImageView(APIView):
     Proxies from production Rfam server.
     """
 
+    @conditional_get(_family_updated)
     def get(self, request, entry, label):
         import requests as requests_lib
 
@@ -366,9 +485,9 @@ class FamilyTreeImageView(APIView):
         url = f'https://rfam.org/family/{family.rfam_acc}/tree/label/{label}/image'
 
         try:
-            resp = requests_lib.get(url, timeout=30)
+            resp = fetch_upstream(url, timeout=30)
             if resp.status_code == 200:
-                return HttpResponse(resp.content, content_type='image/svg+xml')
+                return proxy_response(request, resp, 'image/svg+xml')
             else:
                 raise Http404(f"Tree image not found for {family.rfam_acc}")
         except Exception:
@@ -381,6 +500,7 @@ class FamilyTreeMapView(APIView):
     Proxies from production Rfam server.
     """
 
+    @conditional_get(_family_updated)
     def get(self, request, entry, label):
         import requests as requests_lib
 
@@ -395,9 +515,9 @@ class FamilyTreeMapView(APIView):
         url = f'https://rfam.org/family/{family.rfam_acc}/tree/label/{label}/map'
 
         try:
-            resp = requests_lib.get(url, timeout=30)
+            resp = fetch_upstream(url, timeout=30)
             if resp.status_code == 200:
-                return HttpResponse(resp.content, content_type='text/html')
+                return proxy_response(request, resp, 'text/html')
             else:
                 raise Http404(f"Tree map not found for {family.rfam_acc}")
         except Exception:
@@ -410,18 +530,21 @@ class ClanView(APIView):
     """
     entity_type = 'clan'
 
+    @conditional_get(_clan_updated)
+    @cache_response_data()
     def get(self, request, entry):
         """
         Get clan by accession (CL00001) or ID (tRNA).
         """
-        clan = Clan.objects.filter(
+        fields = _requested_fields(request, ClanDetailSerializer)
+        clan = ClanDetailSerializer.project(Clan.objects.filter(
             Q(clan_acc=entry) | Q(id=entry)
-        ).first()
+        ), fields).first()
 
         if not clan:
             raise Http404(f"Clan '{entry}' not found")
 
-        serializer = ClanDetailSerializer(clan)
+        serializer = ClanDetailSerializer(clan, fields=fields)
         return Response(serializer.data)
 
 
@@ -430,10 +553,15 @@ class ClansListView(APIView):
     View for listing clans.
     """
 
+    @cache_rendered_response()
     def get(self, request):
+        fields = _requested_fields(request, ClanListSerializer)
         clans = Clan.objects.all().order_by('id')
+        if wants_stream(request):
+            return stream_list(clans, ClanListSerializer, fields)
 
-        serializer = ClanListSerializer(clans, many=True)
+        clans = ClanListSerializer.project(clans, fields)
+        serializer = ClanListSerializer(clans, many=True, fields=fields)
         return Response({'clans': serializer.data})
 
 
@@ -442,6 +570,7 @@ class ClanStructuresView(APIView):
     View for clan structures.
     """
 
+    @conditional_get(_clan_updated)
     def get(self, request, entry):
         clan = Clan.objects.filter(
             Q(clan_acc=entry) | Q(id=entry)
@@ -459,18 +588,21 @@ class MotifView(APIView):
     """
     entity_type = 'motif'
 
+    @conditional_get(_motif_updated)
+    @cache_response_data()
     def get(self, request, entry):
         """
         Get motif by accession (RM00001) or ID (KINK-TURN).
         """
-        motif = Motif.objects.filter(
+        fields = _requested_fields(request, MotifDetailSerializer)
+        motif = MotifDetailSerializer.project(Motif.objects.filter(
             Q(motif_acc=entry) | Q(motif_id=entry)
-        ).first()
+        ), fields).first()
 
         if not motif:
             raise Http404(f"Motif '{entry}' not found")
 
-        serializer = MotifDetailSerializer(motif)
+        serializer = MotifDetailSerializer(motif, fields=fields)
         return Response(serializer.data)
 
 
@@ -479,18 +611,27 @@ class MotifsListView(APIView):
     View for listing motifs.
     """
 
+    @cache_rendered_response()
     def get(self, request):
+        fields = _requested_fields(request, MotifListSerializer)
         motifs = Motif.objects.all().order_by('motif_id')
+        if wants_stream(request):
+            return stream_list(motifs, MotifListSerializer, fields)
 
-        serializer = MotifListSerializer(motifs, many=True)
+        motifs = MotifListSerializer.project(motifs, fields)
+        serializer = MotifListSerializer(motifs, many=True, fields=fields)
         return Response({'motifs': serializer.data})
 
 
 class GenomeView(APIView):
     """
     View for individual genome data.
+    Includes the per-family hit breakdown when the release's genome summary
+    has been built with `manage.py build_genome_summary`.
     """
 
+    @conditional_get(_genome_updated)
+    @cache_response_data()
     def get(self, request, ncbi_id):
         """
         Get genome by NCBI taxonomy ID.
@@ -500,57 +641,362 @@ class GenomeView(APIView):
         except ValueError:
             raise Http404(f"Invalid NCBI ID: {ncbi_id}")
 
-        genome = Genome.objects.filter(ncbi_id=ncbi_id_int).first()
+        fields = _requested_fields(request, GenomeDetailSerializer, extra=('families',))
+        genome = GenomeDetailSerializer.project(Genome.objects.filter(ncbi_id=ncbi_id_int), fields).first()
 
         if not genome:
             raise Http404(f"Genome with NCBI ID '{ncbi_id}' not found")
 
-        serializer = GenomeDetailSerializer(genome)
-        return Response(serializer.data)
+        serializer = GenomeDetailSerializer(genome, fields=fields)
+        data = serializer.data
+
+        families = genome_families(genome.upid) if fields is None or 'families' in fields else None
+        if families is not None:
+            data['families'] = families
+
+        return Response(data)
+
+
+def _split_param(request, name):
+    """Get a comma-separated query parameter as a list of non-empty values."""
+    return [value.strip() for value in request.query_params.get(name, '').split(',') if value.strip()]
+
+
+def _requested_fields(request, serializer_class, extra=()):
+    """
+    Get the field names asked for with ?fields=, or None for all of them.
+    Names that are neither fields of `serializer_class` nor in `extra` are
+    rejected with a 400.
+    """
+    fields = _split_param(request, 'fields')
+    if not fields:
+        return None
+    known = serializer_class.field_names() + list(extra)
+    unknown = [name for name in fields if name not in known]
+    if unknown:
+        raise ParseError(f"Unknown fields: {', '.join(unknown)} (available: {', '.join(known)})")
+    return fields
 
 
 class GenomesListView(APIView):
     """
     View for listing genomes, optionally filtered by kingdom.
+
+    Comparative queries are answered from the release's genome x family
+    matrix (`manage.py build_genome_matrix`):
+      ?families=RF00001,RF00005  genomes with hits in all listed families
+                                 (any of them with &match=any)
+      ?shared_with=UP1,UP2       families with hits in all listed genomes
+                                 (a list of families, so it cannot be
+                                 combined with the genome filters)
     """
 
     def get(self, request, kingdom=None):
+        families = _split_param(request, 'families')
+        shared_with = _split_param(request, 'shared_with')
+
+        if shared_with and (families or kingdom):
+            return Response(
+                {'error': 'shared_with cannot be combined with families or a kingdom'},
+                status=400,
+            )
+
+        fields = None if shared_with else _requested_fields(request, GenomeListSerializer)
+
+        if families or shared_with:
+            matrix = get_genome_matrix()
+            if matrix is None:
+                return Response(
+                    {'error': 'Genome comparisons are not available for this release'},
+                    status=503,
+                )
+
+        if shared_with:
+            shared, unknown = matrix.shared_families(shared_with)
+            if unknown:
+                return Response({'error': f"Unknown genomes: {', '.join(unknown)}"}, status=400)
+            return Response({
+                'genomes': shared_with,
+                'families': [{'acc': acc, 'id': rfam_id} for acc, rfam_id in shared],
+                'count': len(shared),
+            })
+
         genomes = Genome.objects.all()
 
         if kingdom:
             genomes = genomes.filter(kingdom__iexact=kingdom)
 
-        genomes = genomes.order_by('scientific_name')[:100]
+        if families:
+            require_all = request.query_params.get('match', 'all').lower() != 'any'
+            upids, unknown = matrix.genomes_with_families(families, require_all=require_all)
+            if unknown:
+                return Response({'error': f"Unknown families: {', '.join(unknown)}"}, status=400)
+            genomes = genomes.filter(upid__in=upids)
+
+        genomes = genomes.order_by('scientific_name')
+        if wants_stream(request):
+            return stream_list(genomes, GenomeListSerializer, fields)
+        genomes = GenomeListSerializer.project(genomes, fields)[:100]
 
-        serializer = GenomeListSerializer(genomes, many=True)
+        serializer = GenomeListSerializer(genomes, many=True, fields=fields)
         return Response({'genomes': serializer.data})
 
 
 class GenomeGFFView(APIView):
     """
     View for genome GFF download.
+    Streams GFF3 for the Rfam hits on the genome's sequences, gzipped with
+    ?gzip=1. Generated files are cached for the rest of the release.
     """
 
+    @conditional_get(_genome_updated)
     def get(self, request, ncbi_id, auto_genome=None):
         try:
             ncbi_id_int = int(ncbi_id)
         except ValueError:
             raise Http404(f"Invalid NCBI ID: {ncbi_id}")
 
-        genome = Genome.objects.filter(ncbi_id=ncbi_id_int).first()
+        genomes = Genome.objects.filter(ncbi_id=ncbi_id_int)
+        if auto_genome:
+            genomes = genomes.filter(upid=auto_genome)
+        genome = genomes.order_by('-is_reference', 'upid').first()
 
         if not genome:
             raise Http404(f"Genome with NCBI ID '{ncbi_id}' not found")
 
-        return Response({
-            'message': 'GFF data would be served here',
-            'ncbi_id': ncbi_id,
-        })
+        gzip_output = request.query_params.get('gzip', '0') == '1'
+        filename = f'{genome.upid}.gff3.gz' if gzip_output else f'{genome.upid}.gff3'
+        content_type = 'application/gzip' if gzip_output else 'text/x-gff3'
+
+        path = cache_path('gff', filename)
+        if path.exists():
+            return cached_file_response(path, content_type, filename)
+
+        # One request generates the file while streaming it; others wait for it
+        unlock = lock_file(path)
+        if unlock is None:
+            if not wait_for_file(path):
+                return _building_response('This GFF file')
+            return cached_file_response(path, content_type, filename)
+        if path.exists():
+            unlock()
+            return cached_file_response(path, content_type, filename)
+
+        chunks = batch_lines(iter_gff3(genome.upid))
+        if gzip_output:
+            chunks = gzip_chunks(chunks)
+
+        response = StreamingHttpResponse(
+            LockedChunks(write_through(path, chunks), unlock), content_type=content_type,
+        )
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+        return response
+
+
+def _building_response(what):
+    """Get the 503 for a cached file that another request is still building."""
+    response = Response({'error': f'{what} is being built, please try again shortly'}, status=503)
+    response['Retry-After'] = str(BUILD_RETRY_AFTER)
+    return response
+
+
+class ExportView(APIView):
+    """
+    Base view for bulk table exports.
+    Streams the whole table as TSV, or with ?output=arrow or ?output=parquet
+    serves it as an Arrow IPC or Parquet file when pyarrow is installed.
+    Exports are cached for the rest of the release.
+    """
+    export_name = None
+
+    def export_response(self, request, rfam_acc=None):
+        output_format = request.query_params.get('output', 'tsv').lower()
+        formats = available_formats()
+        if output_format not in formats:
+            return Response(
+                {'error': f"Unsupported export format '{output_format}', use one of: {', '.join(formats)}"},
+                status=400,
+            )
+
+        filename = export_filename(self.export_name, output_format, rfam_acc)
+        content_type = EXPORT_FORMATS[output_format][1]
+        path = export_path(self.export_name, output_format, rfam_acc)
+        if not path.exists():
+            if output_format == 'tsv':
+                response = StreamingHttpResponse(
+                    stream_tsv_export(self.export_name, rfam_acc), content_type=content_type
+                )
+                response['Content-Disposition'] = content_disposition_header(True, filename)
+                return response
+            # Arrow and Parquet files end with a footer, so they are built
+            # in full before being sent, by one request at a time
+            unlock = lock_file(path)
+            if unlock is None:
+                if not wait_for_file(path):
+                    return _building_response('This export')
+            else:
+                try:
+                    if not path.exists():
+                        build_export(self.export_name, output_format, rfam_acc)
+                finally:
+                    unlock()
+
+        return cached_file_response(path, content_type, filename)
+
+
+class FamiliesExportView(ExportView):
+    """
+    View for the export of all families.
+    """
+    export_name = 'families'
+
+    @conditional_get()
+    def get(self, request):
+        return self.export_response(request)
+
+
+class ClansExportView(ExportView):
+    """
+    View for the export of all clans.
+    """
+    export_name = 'clans'
+
+    @conditional_get()
+    def get(self, request):
+        return self.export_response(request)
+
+
+class GenomesExportView(ExportView):
+    """
+    View for the export of all genomes.
+    """
+    export_name = 'genomes'
+
+    @conditional_get()
+    def get(self, request):
+        return self.export_response(request)
+
+
+class RegionsExportView(ExportView):
+    """
+    View for the export of every full region of a family.
+    """
+    export_name = 'regions'
+
+    @conditional_get(_family_updated)
+    def get(self, request, entry):
+        rfam_acc = get_resolver().families.resolve(entry)
+
+        if not rfam_acc:
+            raise Http404(f"Family '{entry}' not found")
+
+        return self.export_response(request, rfam_acc)
+
+
+# Columns returned for each sequence hit, as (output name, FullRegion lookup).
+SEQUENCE_HIT_COLUMNS = [
+    ('rfamseq_acc', 'rfamseq_acc'),
+    ('seq_start', 'seq_start'),
+    ('seq_end', 'seq_end'),
+    ('rfam_acc', 'rfam_acc'),
+    ('rfam_id', 'rfam_acc__rfam_id'),
+    ('description', 'rfam_acc__description'),
+    ('bit_score', 'bit_score'),
+    ('evalue_score', 'evalue_score'),
+    ('cm_start', 'cm_start'),
+    ('cm_end', 'cm_end'),
+    ('truncated', 'truncated'),
+    ('type', 'type'),
+]
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def _sequence_filter(accession):
+    """
+    Build a filter matching a sequence accession with or without version.
+
+    ``AJ634207`` matches every version (``AJ634207.1``, ``AJ634207.2``). The
+    versions are selected with an explicit key range rather than ``LIKE`` so
+    MySQL always answers it as an index range scan ('/' sorts after '.').
+    """
+    if '.' in accession:
+        return Q(rfamseq_acc=accession)
+    return Q(rfamseq_acc=accession) | Q(
+        rfamseq_acc__gt=f'{accession}.', rfamseq_acc__lt=f'{accession}/'
+    )
+
+
+def _paginate(request, queryset):
+    """
+    Slice a queryset using the ``page`` and ``per_page`` query parameters.
+
+    Returns the rows for the requested page and a dict of pagination details.
+    """
+    try:
+        page = max(int(request.query_params.get('page', 1)), 1)
+        per_page = int(request.query_params.get('per_page', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        page, per_page = 1, DEFAULT_PAGE_SIZE
+    per_page = min(max(per_page, 1), MAX_PAGE_SIZE)
+
+    total = queryset.count()
+    offset = (page - 1) * per_page
+    rows = list(queryset[offset:offset + per_page])
+
+    return rows, {
+        'count': total,
+        'page': page,
+        'per_page': per_page,
+        'num_pages': (total + per_page - 1) // per_page,
+    }
+
+
+def _tsv_response(columns, rows):
+    """
+    Render a list of dicts as tab-separated text with a commented header line.
+    """
+    lines = ['#' + '\t'.join(columns)]
+    for row in rows:
+        lines.append('\t'.join('' if row[c] is None else str(row[c]) for c in columns))
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/tab-separated-values')
+
+
+def _sequence_hits(request, accession):
+    """
+    Get one page of significant Rfam hits on a sequence.
+
+    The lookup is a point query on ``full_region.rfamseq_acc``. On the Rfam
+    database this is answered entirely from the covering index
+
+        CREATE INDEX full_region_rfamseq_hits ON full_region
+            (rfamseq_acc, is_significant, seq_start, seq_end, rfam_acc,
+             bit_score, evalue_score, cm_start, cm_end, truncated, type);
+
+    so neither the filter, the ordering nor the projection touches the
+    table rows; the family id and description come from primary key lookups
+    on ``family``.
+    """
+    hits = FullRegion.objects.filter(
+        _sequence_filter(accession), is_significant=1
+    ).order_by('rfamseq_acc', 'seq_start').values(
+        *[lookup for _, lookup in SEQUENCE_HIT_COLUMNS]
+    )
+
+    rows, pagination = _paginate(request, hits)
+    rows = [
+        {name: row[lookup] for name, lookup in SEQUENCE_HIT_COLUMNS}
+        for row in rows
+    ]
+    return rows, pagination
 
 
 class SequenceView(APIView):
     """
     View for sequence information.
+    Returns the sequence details with its Rfam hits grouped by sequence
+    version. Supports ?output=tsv for tab-separated hits.
     """
 
     def get(self, request, accession=None):
@@ -560,38 +1006,131 @@ class SequenceView(APIView):
         if not accession:
             raise Http404("Sequence accession required")
 
-        return Response({
-            'accession': accession,
-            'message': 'Sequence data would be served here'
-        })
+        rows, pagination = _sequence_hits(request, accession)
+        if request.query_params.get('output', '').lower() == 'tsv':
+            return _tsv_response([name for name, _ in SEQUENCE_HIT_COLUMNS], rows)
+
+        sequences = {
+            seq['rfamseq_acc']: dict(seq, hits=[])
+            for seq in Rfamseq.objects.filter(_sequence_filter(accession)).values(
+                'rfamseq_acc', 'ncbi_id', 'mol_type', 'length', 'description', 'source'
+            ).order_by('rfamseq_acc')
+        }
+
+        if not sequences and not rows:
+            raise Http404(f"Sequence '{accession}' not found")
+
+        for rfamseq_acc, hits in groupby(rows, key=itemgetter('rfamseq_acc')):
+            sequence = sequences.setdefault(rfamseq_acc, {'rfamseq_acc': rfamseq_acc, 'hits': []})
+            sequence['hits'].extend(hits)
+
+        return Response(dict(
+            {'accession': accession, 'sequences': list(sequences.values())},
+            **pagination
+        ))
 
 
 class SequenceHitsView(APIView):
     """
     View for sequence hits.
+    Returns a page of hits ordered by sequence and start coordinate.
+    Supports ?output=tsv for tab-separated output.
     """
 
     def get(self, request, accession):
-        return Response({
-            'accession': accession,
-            'hits': []
-        })
+        rows, pagination = _sequence_hits(request, accession)
+        if request.query_params.get('output', '').lower() == 'tsv':
+            return _tsv_response([name for name, _ in SEQUENCE_HIT_COLUMNS], rows)
+
+        return Response(dict({'accession': accession, 'hits': rows}, **pagination))
+
+
+_interval_indexes = ReleaseCache(maxsize=settings.RFAM_INTERVAL_CACHE_SIZE)
+
+
+def _sequence_interval_index(accession):
+    """
+    Get the interval index over all significant hits on a sequence.
+
+    Indexes are built on first use and kept for the rest of the release.
+    """
+    def build():
+        hits = FullRegion.objects.filter(
+            _sequence_filter(accession), is_significant=1
+        ).values_list(*[lookup for _, lookup in SEQUENCE_HIT_COLUMNS])
+        return IntervalIndex((hit[1], hit[2], hit) for hit in hits)
+
+    return _interval_indexes.get_or_build(accession, build)
+
+
+# Most windows a single ?windows= request may ask for
+MAX_WINDOWS = 100
+
+_window_re = re.compile(r'^(\d+)-(\d+)$')
+
+
+def _parse_windows(request):
+    """
+    Get the coordinate windows requested with ?seq_start=&seq_end= or with
+    ?windows=start-end,start-end,... for batched lookups.
+
+    Raises ValueError with a message for the client if they are invalid.
+    """
+    windows = request.query_params.get('windows')
+    if windows:
+        windows = [window.strip() for window in windows.split(',') if window.strip()]
+        if len(windows) > MAX_WINDOWS:
+            raise ValueError(f'At most {MAX_WINDOWS} windows can be requested at once')
+        parsed = []
+        for window in windows:
+            match = _window_re.match(window)
+            if not match or int(match[1]) > int(match[2]):
+                raise ValueError(f"Invalid window '{window}': expected start-end with start <= end")
+            parsed.append((int(match[1]), int(match[2])))
+        return parsed
+
+    seq_start = request.query_params.get('seq_start')
+    seq_end = request.query_params.get('seq_end')
+    if seq_start is None and seq_end is None:
+        return None
+    try:
+        return [(int(seq_start or seq_end), int(seq_end or seq_start))]
+    except ValueError:
+        raise ValueError('Coordinates must be integers') from None
 
 
 class AccessionView(APIView):
     """
     View for accession lookup with coordinates.
+    Returns the Rfam hits overlapping a coordinate window on a sequence,
+    or a list of windows with ?windows=1-100,500-900.
     """
 
     def get(self, request, accession):
-        seq_start = request.query_params.get('seq_start')
-        seq_end = request.query_params.get('seq_end')
+        try:
+            windows = _parse_windows(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
 
-        return Response({
-            'accession': accession,
-            'seq_start': seq_start,
-            'seq_end': seq_end,
-        })
+        index = _sequence_interval_index(accession)
+        columns = [name for name, _ in SEQUENCE_HIT_COLUMNS]
+
+        if windows is None:
+            hits = [dict(zip(columns, hit)) for hit in index.payloads]
+            return Response({'accession': accession, 'hits': hits, 'count': len(hits)})
+
+        results = [
+            {
+                'seq_start': seq_start,
+                'seq_end': seq_end,
+                'hits': [dict(zip(columns, hit)) for hit in hits],
+            }
+            for (seq_start, seq_end), hits in zip(windows, index.overlapping_many(windows))
+        ]
+
+        if 'windows' in request.query_params:
+            return Response({'accession': accession, 'windows': results})
+        return Response(dict({'accession': accession}, **results[0]))
 
 
 class StructureView(APIView):
@@ -686,6 +1225,8 @@ class KeywordSearchView(APIView):
 class TaxonomySearchView(APIView):
     """
     View for taxonomy search.
+    Returns matching species and, once `manage.py build_taxonomy_index` has
+    been run for the release, the families with hits under a taxon name.
     """
 
     def get(self, request):
@@ -694,21 +1235,31 @@ class TaxonomySearchView(APIView):
         if not query:
             return Response({'results': [], 'query': ''})
 
-        taxonomies = Taxonomy.objects.filter(
-            Q(species__icontains=query) |
-            Q(tax_string__icontains=query)
-        ).order_by('species')[:50]
+        release_index = get_release_index()
+        if release_index is not None:
+            taxonomies = release_index.taxonomy.search(query, limit=50)
+        else:
+            taxonomies = Taxonomy.objects.filter(
+                Q(species__icontains=query) |
+                Q(tax_string__icontains=query)
+            ).order_by('species').values_list('ncbi_id', 'species')[:50]
 
         results = [
-            {'ncbi_id': t.ncbi_id, 'species': t.species}
-            for t in taxonomies
+            {'ncbi_id': ncbi_id, 'species': species}
+            for ncbi_id, species in taxonomies
         ]
 
-        return Response({
+        data = {
             'query': query,
             'results': results,
             'count': len(results)
-        })
+        }
+
+        index = get_taxonomy_index()
+        if index is not None:
+            data['families'] = index.families_in_taxon(query.strip())
+
+        return Response(data)
 
 
 class TypeSearchView(APIView):
@@ -722,15 +1273,19 @@ class TypeSearchView(APIView):
         if not query:
             return Response({'results': [], 'query': ''})
 
-        families = Family.objects.filter(
-            type__icontains=query
-        ).order_by('rfam_id')[:50]
+        index = get_release_index()
+        if index is not None:
+            results = index.families.search_type(query, limit=50)
+        else:
+            families = Family.objects.filter(
+                type__icontains=query
+            ).order_by('rfam_id')[:50]
+            results = FamilyListSerializer(families, many=True).data
 
-        serializer = FamilyListSerializer(families, many=True)
         return Response({
             'query': query,
-            'results': serializer.data,
-            'count': len(serializer.data)
+            'results': results,
+            'count': len(results)
         })
 
 
@@ -762,38 +1317,23 @@ class JumpView(APIView):
         if not entry:
             return Response({'error': 'Entry required'}, status=400)
 
-        # Check if it's a family accession
-        if entry.upper().startswith('RF'):
-            family = Family.objects.filter(
-                Q(rfam_acc=entry.upper()) | Q(rfam_id=entry)
-            ).first()
-            if family:
-                from django.shortcuts import redirect
-                return redirect(f'/family/{family.rfam_acc}')
-
-        # Check if it's a clan accession
-        if entry.upper().startswith('CL'):
-            clan = Clan.objects.filter(
-                Q(clan_acc=entry.upper()) | Q(id=entry)
-            ).first()
-            if clan:
-                from django.shortcuts import redirect
-                return redirect(f'/clan/{clan.clan_acc}')
-
-        # Check if it's a motif accession
-        if entry.upper().startswith('RM'):
-            motif = Motif.objects.filter(
-                Q(motif_acc=entry.upper()) | Q(motif_id=entry)
-            ).first()
-            if motif:
-                from django.shortcuts import redirect
-                return redirect(f'/motif/{motif.motif_acc}')
+        resolver = get_resolver()
+
+        # Check if it's a family, clan or motif accession
+        for prefix, entries, url in (
+            ('RF', resolver.families, '/family/'),
+            ('CL', resolver.clans, '/clan/'),
+            ('RM', resolver.motifs, '/motif/'),
+        ):
+            if entry.upper().startswith(prefix):
+                acc = entries.resolve(entry)
+                if acc:
+                    return redirect(f'{url}{acc}')
 
         # Try to find by ID
-        family = Family.objects.filter(rfam_id=entry).first()
-        if family:
-            from django.shortcuts import redirect
-            return redirect(f'/family/{family.rfam_acc}')
+        rfam_acc = resolver.families.resolve(entry)
+        if rfam_acc:
+            return redirect(f'/family/{rfam_acc}')
 
         return Response({'error': f"Entry '{entry}' not found"}, status=404)
 
@@ -839,6 +1379,8 @@ class StatusView(APIView):
             'status': 'ok' if db_status == 'connected' else 'error',
             'database': db_status,
             'rfam_version': db_version,
+            'worker': {'pid': os.getpid(), 'memory_kb': memory_usage()},
+            'release': {**release_status(), 'watcher': watcher_status()},
         })
 
 
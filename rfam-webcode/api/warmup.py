@@ -0,0 +1,94 @@
+"""
+Warm start for preloading gunicorn masters.
+
+`warm_start()` loads the per-release structures in the master process before
+workers are forked, so every worker starts with them already in memory and
+shares the pages copy-on-write instead of building its own copy on its first
+requests.
+"""
+import gc
+import logging
+
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+
+def memory_usage():
+    """
+    Get the memory used by this process in kB, from /proc.
+
+    Returns a dict with 'rss' and, where the kernel provides smaps_rollup,
+    'pss' (RSS with shared pages divided among the processes sharing them)
+    and 'shared'. Empty on platforms without /proc.
+    """
+    usage = {}
+    fields = {'Rss:': 'rss', 'Pss:': 'pss', 'Shared_Clean:': 'shared', 'Shared_Dirty:': 'shared'}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                name, value = line.split()[:2]
+                if name in fields:
+                    key = fields[name]
+                    usage[key] = usage.get(key, 0) + int(value)
+    except OSError:
+        try:
+            with open('/proc/self/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        usage['rss'] = int(line.split()[1])
+        except OSError:
+            pass
+    return usage
+
+
+def load_release_data():
+    """
+    Load the entry maps and release indexes for the current release.
+
+    Returns a summary of what was loaded.
+    """
+    from .genome_matrix import get_genome_matrix
+    from .related import get_related_families
+    from .release import current_release
+    from .release_index import get_release_index
+    from .resolver import get_resolver
+    from .taxonomy_index import get_taxonomy_index
+
+    loaded = {'release': current_release()}
+    resolver = get_resolver()
+    loaded['families'] = len(resolver.families)
+    loaded['clans'] = len(resolver.clans)
+    loaded['motifs'] = len(resolver.motifs)
+    for name, getter in (
+        ('release_index', get_release_index),
+        ('taxonomy_index', get_taxonomy_index),
+        ('genome_matrix', get_genome_matrix),
+        ('related_families', get_related_families),
+    ):
+        loaded[name] = getter() is not None
+    return loaded
+
+
+def warm_start():
+    """
+    Load release metadata, entry maps and release indexes.
+
+    Database connections opened while loading are closed afterwards, since a
+    connection must not be shared between forked workers. Everything loaded
+    is then moved out of the garbage collector's reach with `gc.freeze()`, so
+    collections in the workers do not write to (and unshare) those pages.
+    """
+    loaded = {}
+    try:
+        loaded = load_release_data()
+    except Exception:
+        # Workers load whatever is missing on first use.
+        logger.exception('Warm start failed')
+    finally:
+        connections.close_all()
+
+    gc.collect()
+    gc.freeze()
+    return loaded
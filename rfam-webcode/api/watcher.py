@@ -0,0 +1,116 @@
+"""
+Background watcher for new Rfam releases.
+
+Each web process runs one watcher thread, started by
+`ReleaseGenerationMiddleware` on its first request. It loads the first
+generation, then polls `db_version` every RFAM_RELEASE_CHECK_INTERVAL
+seconds; when the release changes it loads the new release's entry maps and
+indexes off the request path, then swaps the new generation in (see
+`api.release`). Requests that arrive before the first generation is loaded,
+or while the database is unreachable, are served without one.
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import connections
+
+from .release import (
+    Generation, activate_generation, current_generation, fetch_release,
+    pin_generation, unpin_generation,
+)
+from .warmup import load_release_data
+
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_watcher = None
+
+
+def load_generation(release):
+    """
+    Load the data for `release` into a new generation and make it current.
+    """
+    generation = Generation(release)
+    token = pin_generation(generation)
+    try:
+        loaded = load_release_data()
+    finally:
+        unpin_generation(token)
+    activate_generation(generation)
+    logger.info('Activated release %s: %s', release, loaded)
+    return generation
+
+
+class ReleaseWatcher(threading.Thread):
+    """
+    Thread polling for a new release and swapping it in.
+    """
+
+    def __init__(self, interval):
+        super().__init__(name='rfam-release-watcher', daemon=True)
+        self.interval = interval
+        self.pid = os.getpid()
+        self.checked_at = None
+        self._stopped = threading.Event()
+
+    def run(self):
+        # The first check loads the first generation straight away
+        wait = 0
+        while not self._stopped.wait(wait):
+            wait = self.interval
+            try:
+                self.check()
+            except Exception:
+                logger.exception('Release check failed')
+            finally:
+                connections.close_all()
+
+    def check(self):
+        release = fetch_release()
+        self.checked_at = datetime.now(timezone.utc)
+        current = current_generation()
+        if current is None or current.release != release:
+            load_generation(release)
+
+    def stop(self):
+        self._stopped.set()
+
+    def as_dict(self):
+        return {
+            'running': self.is_alive(),
+            'interval': self.interval,
+            'checked_at': self.checked_at.isoformat() if self.checked_at else None,
+        }
+
+
+def start_watcher():
+    """
+    Start this process's watcher, once. The watcher loads the first
+    generation itself, so requests never wait for the database here.
+
+    Threads do not survive fork, so a watcher inherited from a preloading
+    parent process is replaced.
+    """
+    global _watcher
+
+    if _watcher is not None and _watcher.pid == os.getpid():
+        return _watcher
+
+    with _lock:
+        if _watcher is None or _watcher.pid != os.getpid():
+            watcher = ReleaseWatcher(settings.RFAM_RELEASE_CHECK_INTERVAL)
+            watcher.start()
+            _watcher = watcher
+    return _watcher
+
+
+def watcher_status():
+    """Describe this process's watcher, or None if it has not started."""
+    watcher = _watcher
+    if watcher is None or watcher.pid != os.getpid():
+        return None
+    return watcher.as_dict()
@@ -0,0 +1,48 @@
+"""
+Gunicorn configuration for the Rfam web application.
+
+The application is preloaded in the master, which loads per-release data
+(release number, entry maps, release indexes) before forking, so workers
+start warm and share those pages copy-on-write. Worker memory is logged as
+each worker starts and exits; /status reports it for the worker answering.
+"""
+import os
+
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', 3))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+accesslog = '-'
+errorlog = '-'
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+
+def _format_memory(usage):
+    return ' '.join(f'{key}={value}kB' for key, value in sorted(usage.items())) or 'unavailable'
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+
+    from api.warmup import memory_usage, warm_start
+
+    before = memory_usage()
+    loaded = warm_start()
+    server.log.info('Warm start loaded %s', loaded)
+    server.log.info(
+        'Master memory before warm start: %s; after: %s',
+        _format_memory(before), _format_memory(memory_usage()),
+    )
+
+
+def post_worker_init(worker):
+    from api.warmup import memory_usage
+
+    worker.log.info('Worker %s started: %s', worker.pid, _format_memory(memory_usage()))
+
+
+def worker_exit(server, worker):
+    from api.warmup import memory_usage
+
+    server.log.info('Worker %s exiting: %s', worker.pid, _format_memory(memory_usage()))
@@ -51,8 +51,11 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'api.middleware.RangeMiddleware',
+    'api.middleware.CompressionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.ReleaseGenerationMiddleware',
 ]
 
 ROOT_URLCONF = 'rfam_web.urls'
@@ -95,6 +98,20 @@ DATABASES = {
     }
 }
 
+# Read-only release snapshot
+# When set, queries are served from a SQLite file written by
+# `manage.py export_snapshot` instead of MySQL. The file is opened immutable,
+# so it must not change while the site is running. MySQL stays available as
+# the 'mysql' database for building snapshots and indexes.
+RFAM_SNAPSHOT_PATH = os.getenv('RFAM_SNAPSHOT_PATH', '')
+
+if RFAM_SNAPSHOT_PATH:
+    DATABASES['mysql'] = DATABASES['default']
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'file:{RFAM_SNAPSHOT_PATH}?mode=ro&immutable=1',
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -153,19 +170,45 @@ STORAGES = {
     },
 }
 
+# Caching
+# Local memory by default; point RFAM_CACHE_BACKEND/RFAM_CACHE_LOCATION at
+# a file-based, memcached or Redis backend to share entries between workers.
+# Keys are versioned by Rfam release (see api/cache.py), so a new release
+# never reads old entries.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('RFAM_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('RFAM_CACHE_LOCATION', 'rfam'),
+        'TIMEOUT': int(os.getenv('RFAM_CACHE_TIMEOUT', 86400)),
+        'KEY_PREFIX': 'rfam',
+    }
+}
+
+# Cache alias used for release data
+RFAM_CACHE_ALIAS = 'default'
+
+# Cache-Control max-age for responses with release validators (ETag and
+# Last-Modified); clients revalidate cheaply after it passes
+RFAM_CACHE_MAX_AGE = int(os.getenv('RFAM_CACHE_MAX_AGE', 3600))
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'api.renderers.RfamJSONRenderer',
         'api.renderers.RfamXMLRenderer',
+        'api.renderers.NDJSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ],
     'DEFAULT_CONTENT_NEGOTIATION_CLASS': 'api.negotiation.RfamContentNegotiation',
 }
 
+# JSON backend for RfamJSONRenderer: 'auto' uses orjson when it is
+# installed, 'stdlib' always uses the json module
+RFAM_JSON_BACKEND = os.getenv('RFAM_JSON_BACKEND', 'auto')
+
 # Email settings
 # For development, use console backend (prints emails to console)
 EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
@@ -183,3 +226,32 @@ DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'noreply@rfam.org')
 
 # Alignment submission email recipient
 ALIGNMENT_SUBMISSION_EMAIL = os.getenv('ALIGNMENT_SUBMISSION_EMAIL', 'rfam-help@ebi.ac.uk')
+
+# Release caches
+# Data derived from the database is cached per Rfam release. The current
+# release is re-read from db_version at most once per check interval.
+RFAM_RELEASE_CHECK_INTERVAL = int(os.getenv('RFAM_RELEASE_CHECK_INTERVAL', 300))
+
+# Poll for new releases in a background thread in each web process and swap
+# in the new release's data without a restart (see api/watcher.py)
+RFAM_RELEASE_WATCHER = os.getenv('RFAM_RELEASE_WATCHER', 'True').lower() == 'true'
+
+# Number of per-sequence hit interval indexes kept in memory per worker
+RFAM_INTERVAL_CACHE_SIZE = int(os.getenv('RFAM_INTERVAL_CACHE_SIZE', 2048))
+
+# Directory for files generated from the database (GFF, exports, ...),
+# kept in one subdirectory per Rfam release
+RFAM_CACHE_DIR = Path(os.getenv('RFAM_CACHE_DIR', BASE_DIR / 'cache'))
+
+# URL prefix of an nginx `internal` location aliased to RFAM_CACHE_DIR.
+# When set, cached files (GFF, exports, proxied alignments and images) are
+# handed to nginx with X-Accel-Redirect instead of being sent by Django.
+RFAM_ACCEL_REDIRECT_PREFIX = os.getenv('RFAM_ACCEL_REDIRECT_PREFIX', '')
+
+# Seconds a response proxied from rfam.org is served from RFAM_CACHE_DIR
+# before it is revalidated upstream with its ETag/Last-Modified
+RFAM_PROXY_TTL = int(os.getenv('RFAM_PROXY_TTL', 3600))
+
+# Directory for indexes built once per release by management commands,
+# kept in one subdirectory per Rfam release
+RFAM_INDEX_DIR = Path(os.getenv('RFAM_INDEX_DIR', BASE_DIR / 'indexes'))
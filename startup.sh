@@ -83,9 +83,5 @@ echo "=== Starting Rfam Django application ==="
 echo "Application will be available at http://localhost:8000"
 
 cd /app
-exec gunicorn rfam_web.wsgi:application \
-    --bind 0.0.0.0:8000 \
-    --workers "${GUNICORN_WORKERS:-3}" \
-    --timeout "${GUNICORN_TIMEOUT:-120}" \
-    --access-logfile - \
-    --error-logfile -
+# Workers, timeout and preloading are configured in gunicorn.conf.py
+exec gunicorn --config gunicorn.conf.py rfam_web.wsgi:application